@@ -0,0 +1,115 @@
+# benchmarks/stock_monitor.py
+"""Measure what the stock monitor adds to each submitted order.
+
+Run from the repository root:
+
+    python -m benchmarks.stock_monitor --orders 2000
+
+Everything is written to a temporary directory; the data files are only read.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from models.StockMonitor import StockMonitor
+from models.StockReservation import StockReservationService
+
+MERCHANDISE_FILE = "data/merchandise.json"
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _report(label, samples):
+    micros = [s * 1e6 for s in samples]
+    print(f"{label:<34} mean {statistics.mean(micros):8.1f} us   "
+          f"p50 {_percentile(micros, .5):8.1f} us   p95 {_percentile(micros, .95):8.1f} us")
+
+
+def _rescan_velocity(orders_file):
+    # What answering the same question from order history would cost per order;
+    # unlike record_sales it grows with the history
+    sold = {}
+    with open(orders_file) as f:
+        for user_data in json.load(f).values():
+            for order in user_data.get("orders", []):
+                for name, quantity, *_ in order.get("items", []):
+                    sold[name] = sold.get(name, 0) + quantity
+    return sold
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000, help="orders to simulate")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with open(MERCHANDISE_FILE) as f:
+        catalog = json.load(f)
+
+    work_dir = tempfile.mkdtemp(prefix="stock-monitor-bench-")
+    try:
+        catalog_file = os.path.join(work_dir, "merchandise.json")
+        for item in catalog:
+            item["merchandiseStock"] = args.orders // 2
+        remaining = {item["merchandiseId"]: args.orders // 2 for item in catalog}
+        with open(catalog_file, "w") as f:
+            json.dump(catalog, f)
+
+        alerts = []
+        monitor = StockMonitor(os.path.join(work_dir, "stock_velocity.json"), notify=alerts.append)
+        stock = StockReservationService(os.path.join(work_dir, "stock"), catalog_file)
+
+        record_times, total_times = [], []
+        start_day = datetime.now() - timedelta(days=14)
+        for n in range(args.orders):
+            item = rng.choice(catalog)
+            quantity = rng.randint(1, 3)
+            # Spread the orders over two weeks so old buckets are dropped along the way
+            now = start_day + timedelta(seconds=n * 14 * 86400 / args.orders)
+
+            # Orders draw the stock down so the monitor crosses its thresholds
+            remaining[item["merchandiseId"]] = left = max(0, remaining[item["merchandiseId"]] - quantity)
+
+            started = time.perf_counter()
+            stock.available(item["merchandiseId"])
+            recorded = time.perf_counter()
+            monitor.record_sales([(item["merchandiseId"], item["merchandiseName"], quantity, left)], now)
+            finished = time.perf_counter()
+
+            record_times.append(finished - recorded)
+            total_times.append(finished - started)
+        monitor.persist()
+
+        orders_file = os.path.join(work_dir, "orders.json")
+        with open(orders_file, "w") as f:
+            json.dump({f"user{n % 500}": {"orders": [
+                {"order_id": str(i), "items": [[rng.choice(catalog)["merchandiseName"], 1, 10.0]]}
+                for i in range(n, args.orders, 500)
+            ]} for n in range(500)}, f)
+
+        rescan_times = []
+        for _ in range(min(args.orders, 50)):
+            started = time.perf_counter()
+            _rescan_velocity(orders_file)
+            rescan_times.append(time.perf_counter() - started)
+
+        print(f"{args.orders} orders, {len(catalog)} items, {len(alerts)} alert notification(s)")
+        _report("record_sales", record_times)
+        _report("record_sales + stock lookup", total_times)
+        _report(f"rescan of {args.orders} orders (baseline)", rescan_times)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/time_parsing.py
+"""Measure what memoized time parsing and formatting saves per request.
+
+Run from the repository root:
+
+    python -m benchmarks.time_parsing --requests 200
+
+A request lists every trip in trips.json for a date, as the admin
+dashboard does, and looks up the departures from one station, as booking
+a trip does. The data files are only read.
+"""
+
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+from models.Trip import Trip
+from models.TripBooking import TripBooking
+from utils import service_time
+
+STATIONS = ("SR12", "SR05", "SM00P", "DM01")
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _report(label, samples):
+    millis = [s * 1e3 for s in samples]
+    print(f"{label:<10} mean {statistics.mean(millis):8.2f} ms   "
+          f"p50 {_percentile(millis, .5):8.2f} ms   p95 {_percentile(millis, .95):8.2f} ms")
+    return statistics.mean(millis)
+
+
+def _request(trip_booking, trip_date, station_id):
+    trips = Trip.load_all_trips(trip_date)
+    # What SystemAdmin.select_and_manage_trip and Trip._format_datetime print
+    for trip in trips:
+        service_time.format_clock(trip.departure_minute)
+        trip._format_datetime(trip.trip_arrival_time)
+    return trip_booking.get_trip_details(station_id, trip_date)
+
+
+def _run(trip_booking, dates, requests):
+    samples = []
+    for n in range(requests):
+        started = time.perf_counter()
+        _request(trip_booking, dates[n % len(dates)], STATIONS[n % len(STATIONS)])
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="requests to time in each mode")
+    parser.add_argument("--days", type=int, default=7, help="distinct dates the requests ask for")
+    args = parser.parse_args()
+
+    trip_booking = TripBooking()
+    dates = [(date.today() + timedelta(days=d)).isoformat() for d in range(args.days)]
+    # Load trips.json once so both modes read it from memory
+    Trip.load_all_trips(dates[0])
+
+    service_time.configure(parse_cache_size=0, format_cache_size=0)
+    uncached = _run(trip_booking, dates, args.requests)
+
+    service_time.configure()
+    cached = _run(trip_booking, dates, args.requests)
+    stats = service_time.cache_stats()
+
+    print(f"{args.requests} requests over {args.days} date(s), {len(Trip.load_all_trips(dates[0]))} trips each")
+    before = _report("uncached", uncached)
+    after = _report("memoized", cached)
+    print(f"saved {before - after:.2f} ms per request ({(before - after) / before:.0%})")
+    for name, cache in stats.items():
+        print(f"  {name:<15} hit rate {cache['hitRate']:6.1%}   {cache['hits']} hits, "
+              f"{cache['misses']} misses, {cache['size']}/{cache['maxSize']} entries")
+
+
+if __name__ == "__main__":
+    main()
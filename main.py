@@ -3,10 +3,18 @@ from models.SystemAdmin import SystemAdmin
 from models.UserService import signup
 from models.User import show_main_menu
 from models.AuthenticationService import AuthenticationService
+from models.PointsLedger import PointsLedger
+from models.UnitOfWork import UnitOfWork
+from models.RefundWorker import RefundWorker
 import getpass
 
 def main():
     auth_service = AuthenticationService()
+    # Finish any checkout that was interrupted before the last shutdown
+    UnitOfWork.recover()
+    PointsLedger.shared().run_daily_expiry()
+    # Pays out refunds for cancelled bookings while the menus stay responsive
+    RefundWorker.shared().start()
     print("=== Welcome to Kuching ART Online System ===")
     
     while True:
@@ -30,13 +38,16 @@ def main():
                     show_main_menu(user)
                 
                 # Get fresh device info for logout
-                ip_address = "127.0.0.1"
+                ip_address = auth_service._get_ip_address()
                 device_info = auth_service._get_device_info()
                 
                 # Handle logout
                 user_type = "admin" if isinstance(user, SystemAdmin) else "user"
                 user_id = user.system_admin_id if isinstance(user, SystemAdmin) else user["userID"]
-                auth_service.handle_logout(user_id, user_type, ip_address, device_info)
+                auth_service.handle_logout(
+                    user_id, user_type, ip_address, device_info,
+                    auth_service.current_session_token
+                )
                 
         elif choice == '3':
             print("Exiting the system. Goodbye!")
@@ -0,0 +1,184 @@
+"""Module for the shared email index used to look up user and admin accounts."""
+
+import atexit
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from utils.json_handler import load_json, save_json
+
+USERS_FILE = "data/users.json"
+ADMINS_FILE = "data/admins.json"
+
+
+# bcrypt releases the GIL while hashing, so a small pool lets concurrent
+# logins use several cores without letting a login burst starve the process.
+BCRYPT_WORKERS = min(4, os.cpu_count() or 1)
+_bcrypt_pool = ThreadPoolExecutor(
+    max_workers=BCRYPT_WORKERS,
+    thread_name_prefix="bcrypt-verify"
+)
+
+
+def verify_password_async(password, stored_hash):
+    """Schedule a bcrypt check on the worker pool.
+
+    Args:
+        password (str): Plaintext password entered by the account holder.
+        stored_hash (str): bcrypt hash stored for the account.
+
+    Returns:
+        Future: Resolves to True when the password matches.
+    """
+    return _bcrypt_pool.submit(
+        bcrypt.checkpw, password.encode(), stored_hash.encode()
+    )
+
+
+def verify_password(password, stored_hash):
+    """Check a password against a bcrypt hash on the worker pool.
+
+    At most BCRYPT_WORKERS checks run at once, however many logins are
+    waiting on them.
+    """
+    try:
+        return verify_password_async(password, stored_hash).result()
+    except ValueError:
+        # Malformed hash in admins.json
+        return False
+
+
+class AccountIndex:
+    """An in-memory email -> account index shared by user and admin login.
+
+    The index is rebuilt only when the underlying file changes on disk, so a
+    login costs one os.stat per file plus a dict lookup instead of a full
+    load and linear scan.
+    """
+
+    def __init__(self, users_file=USERS_FILE, admins_file=ADMINS_FILE):
+        """Initialize an empty index; files are loaded on first lookup."""
+        self.users_file = users_file
+        self.admins_file = admins_file
+        self._lock = threading.Lock()
+        self._users_by_email = {}
+        self._admins_by_email = {}
+        self._signatures = {users_file: None, admins_file: None}
+
+    def _file_signature(self, file_path):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load_file(self, file_path, default):
+        if not os.path.exists(file_path):
+            return default
+        with open(file_path, "r") as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                return default
+
+    def _refresh_if_stale(self):
+        """Rebuild whichever side of the index changed on disk."""
+        users_sig = self._file_signature(self.users_file)
+        if users_sig != self._signatures[self.users_file]:
+            users = self._load_file(self.users_file, {})
+            # Several users may share an email; keep them all, in file order
+            self._users_by_email = {}
+            for user in users.values():
+                self._users_by_email.setdefault(user["userEmail"], []).append(user)
+            self._signatures[self.users_file] = users_sig
+
+        admins_sig = self._file_signature(self.admins_file)
+        if admins_sig != self._signatures[self.admins_file]:
+            admins = self._load_file(self.admins_file, [])
+            # Login has always used the first admin with an email
+            self._admins_by_email = {}
+            for admin in admins:
+                self._admins_by_email.setdefault(admin["systemAdminEmail"], admin)
+            self._signatures[self.admins_file] = admins_sig
+            # Re-apply last-login times that are still waiting to be flushed
+            admin_last_login_batcher.apply_pending(self._admins_by_email)
+
+    def find_users(self, email):
+        """Return the user records for an email, in file order."""
+        with self._lock:
+            self._refresh_if_stale()
+            return list(self._users_by_email.get(email, ()))
+
+    def find_admin(self, email):
+        """Return the admin record for an email, or None."""
+        with self._lock:
+            self._refresh_if_stale()
+            return self._admins_by_email.get(email)
+
+    def add_user(self, user):
+        """Register a newly signed-up user without waiting for a reload."""
+        with self._lock:
+            self._users_by_email.setdefault(user["userEmail"], []).append(user)
+
+
+class LastLoginBatcher:
+    """Buffers admin last-login timestamps and writes them in batches."""
+
+    def __init__(self, admins_file=ADMINS_FILE, batch_size=20, flush_interval=60):
+        """Initialize the batcher.
+
+        Args:
+            admins_file (str): Path of the admins JSON file.
+            batch_size (int): Pending updates that trigger a flush.
+            flush_interval (int): Seconds after which pending updates are flushed.
+        """
+        self.admins_file = admins_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, admin_id, login_time):
+        """Queue a last-login update, flushing if the batch is due."""
+        with self._lock:
+            self._pending[admin_id] = login_time
+            due = (
+                len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def apply_pending(self, admins_by_email):
+        """Overlay queued timestamps onto freshly loaded admin records."""
+        with self._lock:
+            if not self._pending:
+                return
+            for admin in admins_by_email.values():
+                if admin["systemAdminId"] in self._pending:
+                    admin["systemAdminLastLogin"] = self._pending[admin["systemAdminId"]]
+
+    def flush(self):
+        """Write all queued timestamps to the admins file in one pass."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending or not os.path.exists(self.admins_file):
+            return
+
+        admins = load_json(self.admins_file)
+        for admin in admins:
+            if admin["systemAdminId"] in pending:
+                admin["systemAdminLastLogin"] = pending[admin["systemAdminId"]]
+        save_json(self.admins_file, admins)
+
+
+admin_last_login_batcher = LastLoginBatcher()
+account_index = AccountIndex()
+
+atexit.register(admin_last_login_batcher.flush)
@@ -2,6 +2,8 @@ import json
 import os
 from datetime import datetime, timedelta
 from models.enums import AuthenticationServiceStatus
+from models.SessionService import session_cache
+from models.RateLimiter import login_rate_limiter
 from utils.json_handler import load_json, save_json
 import getpass
 import platform
@@ -13,6 +15,7 @@ class AuthenticationService:
         self.lock_file = "data/account_locks.json"
         self.max_attempts = 3
         self.lock_duration = timedelta(minutes=5)  # 5 minute lock
+        self.current_session_token = None
         self._initialize_files()
 
     def _initialize_files(self):
@@ -50,6 +53,8 @@ class AuthenticationService:
             "lockTime": datetime.now().isoformat()
         })
         save_json(self.lock_file, locks)
+        # A locked account must not keep using sessions opened earlier
+        session_cache.revoke_account_sessions(email)
 
     def _get_failed_attempts(self, email, within_minutes=15):
         logs = load_json(self.service_file)
@@ -68,7 +73,13 @@ class AuthenticationService:
         """Central authentication method with account locking"""
         from models.SystemAdmin import SystemAdmin
         from models.UserService import login as user_login
-        
+
+        # Throttle per IP and per account before any file is read or written
+        allowed, retry_after = login_rate_limiter.check(ip_address, email)
+        if not allowed:
+            print(f"Too many login attempts. Please try again in {retry_after} seconds.")
+            return None, AuthenticationServiceStatus.RATE_LIMITED
+
         # Check if account is locked
         is_locked, remaining = self._check_account_lock(email)
         if is_locked:
@@ -92,6 +103,9 @@ class AuthenticationService:
                 "userId": admin.system_admin_id
             })
             self._log_auth_attempt(auth_data)
+            self.current_session_token = session_cache.create_session(
+                admin, "admin", admin.system_admin_id, email
+            )
             return admin, AuthenticationServiceStatus.SUCCESS
 
         # Then try user authentication
@@ -103,6 +117,9 @@ class AuthenticationService:
                 "userId": user["userID"]
             })
             self._log_auth_attempt(auth_data)
+            self.current_session_token = session_cache.create_session(
+                user, "user", user["userID"], email
+            )
             return user, AuthenticationServiceStatus.SUCCESS
 
         # If both fail, log the failed attempt
@@ -119,13 +136,13 @@ class AuthenticationService:
         print(f"Invalid credentials. {remaining_attempts} attempts remaining.")
         return None, AuthenticationServiceStatus.FAILED
 
-    def handle_login(self):
+    def handle_login(self, ip_address=None):
         """Handles the complete login flow"""
         print("\n===== Login =====")
         email = input("Email: ").strip()
         password = getpass.getpass("Password: ").strip()
         
-        ip_address = "127.0.0.1"  # Replace with actual IP detection
+        ip_address = ip_address or self._get_ip_address()
         device_info = self._get_device_info()
         
         user, status = self.authenticate_user(
@@ -137,6 +154,13 @@ class AuthenticationService:
             return user
         return None
 
+    def _get_ip_address(self):
+        """Best-effort address of this client for auth logging and throttling"""
+        try:
+            return socket.gethostbyname(socket.gethostname())
+        except OSError:
+            return "127.0.0.1"
+
     def _get_device_info(self):
         """Get basic device information for auth logging"""
         return {
@@ -144,8 +168,18 @@ class AuthenticationService:
             "hostname": socket.gethostname()
         }
 
-    def handle_logout(self, user_id, user_type, ip_address, device_info):
+    def validate_session(self, session_token):
+        """Return the session for a token, or None if it is invalid or expired"""
+        return session_cache.validate_session(session_token)
+
+    def handle_logout(self, user_id, user_type, ip_address, device_info, session_token=None):
         """Handles the complete logout flow"""
+        session_token = session_token or self.current_session_token
+        if session_token:
+            session_cache.revoke_session(session_token)
+            if session_token == self.current_session_token:
+                self.current_session_token = None
+
         auth_data = {
             "userId": user_id,
             "userType": user_type,
@@ -0,0 +1,136 @@
+"""Module for locating trip bookings inside the order and booking stores."""
+
+import threading
+
+
+class BookingIndex:
+    """Maps tripBookingId to where the booking sits in orders.json and tripbookings.json.
+
+    Orders either embed their bookings or only list their IDs under
+    'trip_booking_ids'. Locations are list positions, so a lookup is a few
+    index operations instead of a walk over every order. The index belongs
+    to one loaded copy of each store and is rebuilt only when the store
+    hands out a different object, i.e. the file changed on disk. The unit
+    of work appliers report the orders and bookings they append, so a miss
+    means the booking really isn't there.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._orders = None
+        self._order_locations = {}
+        self._tripbookings = None
+        self._tripbooking_locations = {}
+
+    def _add_order(self, user_id, order_pos, order):
+        for booking_pos, booking in enumerate(order.get("trip_bookings", [])):
+            self._order_locations[booking["tripBookingId"]] = (user_id, order_pos, booking_pos)
+        for booking_id in order.get("trip_booking_ids", []):
+            self._order_locations[booking_id] = (user_id, order_pos, None)
+
+    def _index_orders(self, orders):
+        self._orders = orders
+        self._order_locations = {}
+        for user_id, user_data in orders.items():
+            for order_pos, order in enumerate(user_data.get("orders", [])):
+                self._add_order(user_id, order_pos, order)
+
+    def _index_tripbookings(self, tripbookings):
+        self._tripbookings = tripbookings
+        self._tripbooking_locations = {}
+        for user_id, bookings in tripbookings.items():
+            for booking_pos, booking in enumerate(bookings):
+                self._tripbooking_locations[booking.get("tripBookingId")] = (user_id, booking_pos)
+
+    def order_added(self, orders, user_id, order_pos):
+        """Record an order appended to a user's order list"""
+        with self._lock:
+            if orders is self._orders:
+                self._add_order(user_id, order_pos, orders[user_id]["orders"][order_pos])
+
+    def bookings_added(self, tripbookings, user_id, first_pos):
+        """Record bookings appended to a user's list from first_pos on"""
+        with self._lock:
+            if tripbookings is self._tripbookings:
+                for booking_pos in range(first_pos, len(tripbookings[user_id])):
+                    booking_id = tripbookings[user_id][booking_pos].get("tripBookingId")
+                    self._tripbooking_locations[booking_id] = (user_id, booking_pos)
+
+    @staticmethod
+    def _order_at(orders, location, booking_id):
+        user_id, order_pos, booking_pos = location
+        try:
+            order = orders[user_id]["orders"][order_pos]
+            if booking_pos is None:
+                return (order, None) if booking_id in order.get("trip_booking_ids", []) else (None, None)
+            booking = order["trip_bookings"][booking_pos]
+        except (KeyError, IndexError):
+            return None, None
+        if booking.get("tripBookingId") != booking_id:
+            return None, None
+        return order, booking
+
+    @staticmethod
+    def _tripbooking_at(tripbookings, location, booking_id):
+        user_id, booking_pos = location
+        try:
+            booking = tripbookings[user_id][booking_pos]
+        except (KeyError, IndexError):
+            return None
+        return booking if booking.get("tripBookingId") == booking_id else None
+
+    def locate_in_orders(self, orders, booking_id, user_id=None):
+        """Find a booking in the orders store.
+
+        Args:
+            orders (dict): Loaded contents of orders.json
+            booking_id (str): tripBookingId to find
+            user_id (str, optional): Only find the booking among this user's orders
+
+        Returns:
+            tuple: (order, booking) dicts; booking is None when the order only
+                references it by ID, and both are None if it isn't there
+        """
+        with self._lock:
+            if orders is not self._orders:
+                self._index_orders(orders)
+            location = self._order_locations.get(booking_id)
+            if location is None or (user_id is not None and location[0] != str(user_id)):
+                return None, None
+            order, booking = self._order_at(orders, location, booking_id)
+            if order is None:
+                # Records moved in place since the index was built
+                self._index_orders(orders)
+                location = self._order_locations.get(booking_id)
+                if location and (user_id is None or location[0] == str(user_id)):
+                    order, booking = self._order_at(orders, location, booking_id)
+            return order, booking
+
+    def locate_in_tripbookings(self, tripbookings, booking_id, user_id=None):
+        """Find a booking in the trip bookings store.
+
+        Args:
+            tripbookings (dict): Loaded contents of tripbookings.json
+            booking_id (str): tripBookingId to find
+            user_id (str, optional): Only find the booking among this user's bookings
+
+        Returns:
+            dict: The booking, or None if it isn't there
+        """
+        with self._lock:
+            if tripbookings is not self._tripbookings:
+                self._index_tripbookings(tripbookings)
+            location = self._tripbooking_locations.get(booking_id)
+            if location is None or (user_id is not None and location[0] != str(user_id)):
+                return None
+            booking = self._tripbooking_at(tripbookings, location, booking_id)
+            if booking is None:
+                # Records moved in place since the index was built
+                self._index_tripbookings(tripbookings)
+                location = self._tripbooking_locations.get(booking_id)
+                if location and (user_id is None or location[0] == str(user_id)):
+                    booking = self._tripbooking_at(tripbookings, location, booking_id)
+            return booking
+
+
+booking_index = BookingIndex()
@@ -0,0 +1,64 @@
+"""Module for reading trip bookings from their single normalized store."""
+
+import threading
+from models.BookingIndex import booking_index
+from utils.json_store import JsonStore
+
+TRIPBOOKINGS_FILE = "data/tripbookings.json"
+
+
+class BookingStore:
+    """tripbookings.json as the one home of every trip booking.
+
+    Orders and receipts keep only a 'trip_booking_ids' list and resolve it
+    here when a reader needs the bookings, so a status change is written
+    once instead of to three copies. Readers get copies of the bookings;
+    changes go through the unit of work.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, file_path=TRIPBOOKINGS_FILE):
+        self._store = JsonStore.get(file_path, dict, 4)
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide booking store"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def get(self, booking_id):
+        """Return a copy of a booking by ID, or None if it doesn't exist"""
+        booking = booking_index.locate_in_tripbookings(self._store.load(), booking_id)
+        return dict(booking) if booking is not None else None
+
+    def resolve(self, booking_ids):
+        """Return copies of the bookings for a list of IDs, skipping any that don't exist"""
+        bookings = self._store.load()
+        resolved = []
+        for booking_id in booking_ids:
+            booking = booking_index.locate_in_tripbookings(bookings, booking_id)
+            if booking is not None:
+                resolved.append(dict(booking))
+        return resolved
+
+    def for_user(self, user_id):
+        """Return copies of every booking of a user"""
+        return [dict(booking) for booking in self._store.load().get(str(user_id), [])]
+
+
+def resolve_trip_bookings(record):
+    """Return the trip bookings of an order or receipt record.
+
+    Records written before bookings were normalized still embed their
+    bookings under 'trip_bookings'; newer ones only list their IDs.
+    """
+    if "trip_bookings" in record:
+        return [dict(booking) for booking in record["trip_bookings"]]
+    booking_ids = record.get("trip_booking_ids")
+    if not booking_ids:
+        return []
+    return BookingStore.shared().resolve(booking_ids)
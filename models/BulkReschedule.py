@@ -0,0 +1,247 @@
+"""Module for shifting many trips of a route by the same offset."""
+
+import uuid
+from bisect import bisect_left
+from models.enums import NotificationType, TripBookingStatus, TripStatus
+from models.BookingStore import resolve_trip_bookings
+from models.Notification import Notification
+from models.RescheduleStore import RescheduleStore
+from models.Trip import Trip
+from models.UnitOfWork import UnitOfWork
+from utils.json_store import JsonStore
+from utils import service_time
+
+MIN_HEADWAY = 5  # minutes; same buffer as Trip.reschedule_has_time_conflict
+SHIFTABLE_STATUSES = {TripStatus.SCHEDULED.value, TripStatus.RESCHEDULED.value}
+
+
+class BulkReschedule:
+    """Shifts every trip of a route departing after a time on one day.
+
+    Trips leaving the same station on the same route share a lane, and
+    no two departures in a lane may be closer than MIN_HEADWAY. plan()
+    moves the selected trips, then sorts the day's departures once and
+    sweeps each lane, reporting every shifted trip that lands too close
+    to its neighbour. With resolve=True the shifted trips are placed in
+    order instead, each delayed past any departure it would crowd; trips
+    that are not being shifted never move. apply() commits a conflict-free
+    plan's reschedules, booking updates and notifications as one unit of
+    work; the shared timetable in trips.json is left alone, and the new
+    times apply to the service date through the reschedule store.
+    """
+
+    def __init__(self):
+        """Initialize the bulk reschedule service."""
+        self._notification = Notification()
+
+    @staticmethod
+    def _trips_on(route_color, service_date):
+        """Return every trip of a route on a date with its schedule in force"""
+        trips = []
+        for trip in JsonStore.get("data/trips.json", list, 2).load():
+            if route_color not in trip["tripId"]:
+                continue
+            time_part = trip["tripId"].split("_")[1]
+            departure = service_time.parse(f"{time_part[:2]}:{time_part[2:]}", service_date)
+            if departure is None:
+                continue
+            trip_data = {
+                "tripId": trip["tripId"],
+                "routeId": trip["routeId"],
+                "departureTime": service_time.format_iso(departure),
+                "startStationId": trip.get("startStationId")
+            }
+            trips.append(Trip(Trip.apply_reschedule(trip_data, service_date), service_date))
+        return trips
+
+    def plan(self, route_color, service_date, after, offset_minutes, resolve=False):
+        """Work out the new schedule of every trip to be shifted.
+
+        Args:
+            route_color (str): BLUE, RED or GREEN
+            service_date (str): 'YYYY-MM-DD' the trips run
+            after (str): 'HH:MM'; trips departing at or after this time are shifted
+            offset_minutes (int): Minutes to move each trip by; negative moves it earlier
+            resolve (bool): Delay crowded trips to the next free slot instead of reporting them
+
+        Returns:
+            dict: 'shifts' (new schedules), 'conflicts' (trips that cannot move
+            as asked) and 'skipped' (trips whose new time has already passed).
+        """
+        start = service_time.parse(after, service_date)
+        end = service_time.day_start(service_date) + service_time.MINUTES_PER_DAY
+        now = service_time.now()
+
+        fixed = {}      # lane -> [(departure, tripId)] of trips keeping their time
+        moving = {}     # lane -> [(new departure, trip)] of trips to shift
+        skipped = []
+        for trip in self._trips_on(route_color, service_date):
+            departure = trip.departure_minute
+            lane = (trip.route_id, trip.start_station_id)
+            selected = start <= departure < end and trip.trip_status in SHIFTABLE_STATUSES
+            if selected and departure + offset_minutes <= now:
+                skipped.append(trip.trip_id)
+                selected = False
+            if selected:
+                moving.setdefault(lane, []).append((departure + offset_minutes, trip))
+            else:
+                fixed.setdefault(lane, []).append((departure, trip.trip_id))
+
+        shifts = []
+        conflicts = []
+        for lane, targets in moving.items():
+            lane_fixed = sorted(fixed.get(lane, []))
+            targets.sort(key=lambda target: target[0])
+            if resolve:
+                placed = self._place(lane_fixed, targets)
+            else:
+                placed = [(target, target) for target, _ in targets]
+                conflicts.extend(self._sweep(lane_fixed, targets))
+            for (target, trip), (new_departure, _) in zip(targets, placed):
+                shifts.append(self._shift(trip, target, new_departure))
+
+        return {
+            "routeColor": route_color,
+            "serviceDate": service_date,
+            "offsetMinutes": offset_minutes,
+            "shifts": shifts,
+            "conflicts": conflicts,
+            "skipped": skipped
+        }
+
+    @staticmethod
+    def _sweep(lane_fixed, targets):
+        """Report shifted trips closer than the headway to the departure before or after them"""
+        events = sorted(
+            [(departure, trip_id, False) for departure, trip_id in lane_fixed] +
+            [(target, trip.trip_id, True) for target, trip in targets]
+        )
+        conflicts = []
+        for (first, first_id, first_moved), (second, second_id, second_moved) in zip(events, events[1:]):
+            if second - first >= MIN_HEADWAY:
+                continue
+            if first_moved:
+                conflicts.append({"tripId": first_id, "conflictsWith": second_id, "departure": service_time.format_iso(first)})
+            if second_moved:
+                conflicts.append({"tripId": second_id, "conflictsWith": first_id, "departure": service_time.format_iso(second)})
+        return conflicts
+
+    @staticmethod
+    def _place(lane_fixed, targets):
+        """Give each shifted trip, in order, the first slot at or after its target clear of the others"""
+        fixed_departures = [departure for departure, _ in lane_fixed]
+        placed = []
+        previous = None
+        for target, trip in targets:
+            departure = target if previous is None else max(target, previous + MIN_HEADWAY)
+            while True:
+                # The fixed departure nearest below departure + headway is the only one that can crowd it
+                i = bisect_left(fixed_departures, departure + MIN_HEADWAY)
+                if i and departure - fixed_departures[i - 1] < MIN_HEADWAY:
+                    departure = fixed_departures[i - 1] + MIN_HEADWAY
+                else:
+                    break
+            placed.append((departure, trip.trip_id))
+            previous = departure
+        return placed
+
+    @staticmethod
+    def _shift(trip, target, new_departure):
+        duration = trip.arrival_minute - trip.departure_minute
+        return {
+            "tripId": trip.trip_id,
+            "routeId": trip.route_id,
+            "originalDeparture": trip.trip_departure_time,
+            "originalArrival": trip.trip_arrival_time,
+            "newDeparture": service_time.format_iso(new_departure),
+            "newArrival": service_time.format_iso(new_departure + duration),
+            "extraDelayMinutes": new_departure - target
+        }
+
+    def apply(self, plan):
+        """Commit a plan's new schedules, booking updates and notifications together.
+
+        Args:
+            plan (dict): A plan from plan() with no conflicts
+
+        Returns:
+            int: Number of trips rescheduled, or 0 if nothing was committed.
+        """
+        if plan["conflicts"] or not plan["shifts"]:
+            return 0
+
+        store = RescheduleStore.shared()
+        unit_of_work = UnitOfWork()
+        batch_key = uuid.uuid4().hex
+        shifts = {shift["tripId"]: shift for shift in plan["shifts"]}
+        for trip_id, shift in shifts.items():
+            entry = store.prepare({
+                "rescheduleId": f"RES_{trip_id}_{batch_key}",
+                "tripId": trip_id,
+                "originalDeparture": shift["originalDeparture"],
+                "originalArrival": shift["originalArrival"],
+                "newDeparture": shift["newDeparture"],
+                "newArrival": shift["newArrival"],
+                "status": "Confirmed"
+            })
+            unit_of_work.stage("reschedules", "append", entry)
+
+        by_user = self._stage_booking_updates(unit_of_work, plan["serviceDate"], shifts)
+        notifs = self._stage_notifications(unit_of_work, plan, batch_key, by_user)
+        if not unit_of_work.commit():
+            return 0
+        store.compact_if_due()
+        print(f"✉️ {len(notifs)} reschedule notification(s) sent")
+        return len(shifts)
+
+    @staticmethod
+    def _stage_booking_updates(unit_of_work, service_date, shifts):
+        """Move the bookings of shifted trips on the service date to their new departure"""
+        by_user = {}
+        orders = JsonStore.get("data/orders.json", dict, 4).load()
+        for user_id, user_data in orders.items():
+            for order in user_data.get("orders", []):
+                for booking in resolve_trip_bookings(order):
+                    shift = shifts.get(booking.get("tripId"))
+                    if shift is None or booking.get("bookingStatus") == TripBookingStatus.CANCELLED.value:
+                        continue
+                    # Bookings not yet dated by the normalize-times migration can't be placed on a day
+                    departure = service_time.parse(booking.get("departureTime", ""))
+                    if departure is None or service_time.service_date(departure) != service_date:
+                        continue
+
+                    change = {
+                        "userId": user_id,
+                        "tripBookingId": booking["tripBookingId"],
+                        "bookingStatus": TripBookingStatus.RESCHEDULED.value,
+                        "departureTime": shift["newDeparture"]
+                    }
+                    unit_of_work.stage("orders", "set_booking_status", change)
+                    unit_of_work.stage("tripbookings", "set_status", change)
+                    by_user.setdefault(user_id, []).append((booking["tripBookingId"], shift))
+        return by_user
+
+    def _stage_notifications(self, unit_of_work, plan, batch_key, by_user):
+        messages = [(
+            f"{len(plan['shifts'])} {plan['routeColor']} trip(s) on {plan['serviceDate']} "
+            f"moved by {plan['offsetMinutes']} min",
+            NotificationType.SYSTEM_ALERT, "admin", None
+        )]
+        for user_id, bookings in by_user.items():
+            content = "; ".join(
+                f"Your trip {shift['tripId']} has been rescheduled from "
+                f"{service_time.format_display(service_time.parse(shift['originalDeparture']))} to "
+                f"{service_time.format_display(service_time.parse(shift['newDeparture']))}. "
+                f"Booking ID: {booking_id}"
+                for booking_id, shift in bookings
+            )
+            messages.append((content, NotificationType.ORDER_UPDATE, "user", user_id))
+
+        notifs = []
+        for content, notification_type, recipient_type, recipient_id in messages:
+            notif = self._notification.build_notification(content, notification_type, recipient_type, recipient_id)
+            # One notification per recipient, even if the commit is replayed
+            notif["notificationId"] = str(uuid.uuid5(uuid.NAMESPACE_URL, f"reschedule:{batch_key}:{recipient_id}"))
+            unit_of_work.stage("notifications", "append", notif)
+            notifs.append(notif)
+        return notifs
@@ -0,0 +1,234 @@
+"""Module for fulfilling paid merchandise orders in batched pick-lists."""
+
+import threading
+import uuid
+from datetime import datetime, timedelta
+from models.enums import FulfillmentStatus, NotificationType, OrderStatus
+from models.FulfillmentStore import FULFILLMENT_FILE, fulfillment_index
+from models.Notification import Notification
+from models.RouteMap import RouteMap
+from models.UnitOfWork import UnitOfWork
+from utils.json_store import JsonStore
+from utils.json_stream import iter_items
+
+ORDERS_FILE = "data/orders.json"
+DEFAULT_COLLECTION_STATION = "SR05"  # Kuching Sentral
+BATCH_SIZE = 5000
+PAID_STATUSES = {OrderStatus.CONFIRMED.value, OrderStatus.COMPLETED.value}
+BACKFILL_WINDOW = timedelta(days=30)  # older paid orders were handed over before fulfillment existed
+
+
+class FulfillmentService:
+    """Moves merchandise orders through queued -> picked -> ready -> collected.
+
+    Paid orders are queued in the same unit of work that submits them. A
+    batch takes the oldest queued orders from the status index and turns
+    them into one pick-list per collection station, totalled per item, so
+    staff pick each item once per station instead of once per order. Every
+    transition of a batch is one unit of work that also appends a single
+    ORDER_UPDATE notification per user, however many of their orders the
+    batch holds.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, fulfillment_file=FULFILLMENT_FILE, orders_file=ORDERS_FILE, batch_size=BATCH_SIZE):
+        """Initialize the service.
+
+        Args:
+            fulfillment_file (str): File holding fulfillment records and batches.
+            orders_file (str): Orders scanned for paid orders not yet queued.
+            batch_size (int): Most orders put on one set of pick-lists.
+        """
+        self._store = JsonStore.get(fulfillment_file, dict, 2)
+        self.orders_file = orders_file
+        self.batch_size = batch_size
+        self._notification = Notification()
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide fulfillment service"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @staticmethod
+    def stage_order(unit_of_work, user_id, order_id, items, station_id=None):
+        """Stage queuing a paid order for fulfillment.
+
+        Args:
+            unit_of_work (UnitOfWork): Unit of work that submits the order
+            user_id (str): Customer collecting the order
+            order_id (str): The order
+            items (list): (item name, quantity, price) tuples
+            station_id (str, optional): Collection station; defaults to DEFAULT_COLLECTION_STATION
+        """
+        unit_of_work.stage("fulfillment", "enqueue", {
+            "orderId": order_id,
+            "userId": str(user_id),
+            "stationId": station_id or DEFAULT_COLLECTION_STATION,
+            "items": [[name, quantity] for name, quantity, *_ in items],
+            "queuedAt": datetime.now().isoformat()
+        })
+
+    def get(self, order_id):
+        """Return the fulfillment record of an order, or None"""
+        return self._store.load().get("orders", {}).get(order_id)
+
+    def get_batch(self, batch_id):
+        return self._store.load().get("batches", {}).get(batch_id)
+
+    def count(self, status):
+        """Return the number of orders in a FulfillmentStatus"""
+        status = status.value if isinstance(status, FulfillmentStatus) else status
+        return fulfillment_index.count(self._store.load(), status)
+
+    def station_name(self, station_id):
+        return RouteMap.shared().station_name(station_id)
+
+    def enqueue_paid_orders(self, since=None):
+        """Queue recent paid merchandise orders that have no fulfillment record yet.
+
+        orders.json is streamed one user at a time, so orders placed before
+        fulfillment existed are picked up without loading the whole file.
+        Only orders placed within BACKFILL_WINDOW are queued; older ones
+        were handed over before fulfillment existed.
+
+        Args:
+            since (datetime, optional): Earliest order time to queue;
+                defaults to BACKFILL_WINDOW ago.
+
+        Returns:
+            int: Number of orders queued.
+        """
+        since = (since or datetime.now() - BACKFILL_WINDOW).isoformat()
+        known = self._store.load().get("orders", {})
+        unit_of_work = UnitOfWork()
+        queued = 0
+        for user_id, user_data in iter_items(self.orders_file):
+            for order in user_data.get("orders", []):
+                if (order.get("items") and order.get("status") in PAID_STATUSES
+                        and (order.get("timestamp") or "") >= since
+                        and order.get("order_id") not in known):
+                    self.stage_order(unit_of_work, user_id, order["order_id"], order["items"])
+                    queued += 1
+        unit_of_work.commit()
+        return queued
+
+    def create_pick_lists(self, limit=None):
+        """Put the oldest queued orders on a new batch of pick-lists.
+
+        Returns:
+            dict: The batch, or None if nothing is queued.
+        """
+        data = self._store.load()
+        order_ids = fulfillment_index.order_ids(data, FulfillmentStatus.QUEUED.value, limit or self.batch_size)
+        if not order_ids:
+            return None
+
+        stations = {}
+        for order_id in order_ids:
+            record = data["orders"][order_id]
+            pick_list = stations.setdefault(record["stationId"], {"items": {}, "orderIds": []})
+            pick_list["orderIds"].append(order_id)
+            for name, quantity in record["items"]:
+                pick_list["items"][name] = pick_list["items"].get(name, 0) + quantity
+
+        batch = {
+            "batchId": str(uuid.uuid4()),
+            "status": FulfillmentStatus.PICKED.value,
+            "createdAt": datetime.now().isoformat(),
+            "orderIds": order_ids,
+            "pickLists": stations
+        }
+        unit_of_work = UnitOfWork()
+        unit_of_work.stage("fulfillment", "add_batch", batch)
+        notifs = self._stage_notifications(unit_of_work, batch["batchId"], "picked", [
+            (data["orders"][order_id], "is being packed") for order_id in order_ids
+        ])
+        if not unit_of_work.commit():
+            return None
+        self._send(notifs)
+        return batch
+
+    def mark_ready(self, batch_id):
+        """Mark every picked order of a batch ready for collection.
+
+        Returns:
+            int: Number of orders now ready.
+        """
+        data = self._store.load()
+        batch = data.get("batches", {}).get(batch_id)
+        if batch is None:
+            return 0
+        records = [
+            data["orders"][order_id] for order_id in batch["orderIds"]
+            if data["orders"][order_id]["status"] == FulfillmentStatus.PICKED.value
+        ]
+        return self._advance(records, FulfillmentStatus.READY.value, batch_id, batch_id, "ready", [
+            (record, f"is ready for collection at {self.station_name(record['stationId'])}")
+            for record in records
+        ])
+
+    def mark_collected(self, order_ids):
+        """Mark ready orders as collected.
+
+        Returns:
+            int: Number of orders now collected.
+        """
+        data = self._store.load()
+        records = [
+            data["orders"][order_id] for order_id in order_ids
+            if data.get("orders", {}).get(order_id, {}).get("status") == FulfillmentStatus.READY.value
+        ]
+        key = ",".join(sorted(record["orderId"] for record in records))
+        return self._advance(records, FulfillmentStatus.COLLECTED.value, None, key, "collected", [
+            (record, "has been collected") for record in records
+        ])
+
+    def _advance(self, records, status, batch_id, notify_key, step, messages):
+        if not records:
+            return 0
+        unit_of_work = UnitOfWork()
+        unit_of_work.stage("fulfillment", "set_status", {
+            "orderIds": [record["orderId"] for record in records],
+            "status": status,
+            "batchId": batch_id,
+            "at": datetime.now().isoformat()
+        })
+        notifs = self._stage_notifications(unit_of_work, notify_key, step, messages)
+        if not unit_of_work.commit():
+            return 0
+        self._send(notifs)
+        return len(records)
+
+    def _stage_notifications(self, unit_of_work, key, step, messages):
+        by_user = {}
+        for record, text in messages:
+            by_user.setdefault(record["userId"], []).append((record["orderId"], text))
+
+        notifs = []
+        for user_id, user_messages in by_user.items():
+            content = "; ".join(f"Merchandise order #{order_id} {text}" for order_id, text in user_messages)
+            notif = self._notification.build_notification(
+                content, NotificationType.ORDER_UPDATE, "user", user_id
+            )
+            # One notification per user and step, even if the step is replayed
+            notif["notificationId"] = str(uuid.uuid5(uuid.NAMESPACE_URL, f"fulfillment:{key}:{step}:{user_id}"))
+            unit_of_work.stage("notifications", "append", notif)
+            notifs.append(notif)
+        return notifs
+
+    def _send(self, notifs):
+        if notifs:
+            print(f"✉️ {len(notifs)} order update notification(s) sent")
+
+    def print_pick_lists(self, batch):
+        """Print the pick-lists of a batch, one per collection station"""
+        print(f"\n📋 Pick-lists for batch {batch['batchId']} ({len(batch['orderIds'])} orders)")
+        for station_id, pick_list in sorted(batch["pickLists"].items()):
+            print(f"\n📍 {self.station_name(station_id)} ({station_id}) - {len(pick_list['orderIds'])} order(s)")
+            for name, quantity in sorted(pick_list["items"].items()):
+                print(f"   {name:<20} x {quantity}")
@@ -0,0 +1,121 @@
+"""Module for the merchandise fulfillment records and their status index."""
+
+import threading
+from datetime import datetime
+from models.enums import FulfillmentStatus
+
+FULFILLMENT_FILE = "data/fulfillment.json"
+
+# status -> the status an order must be in to move to it
+PREVIOUS_STATUS = {
+    FulfillmentStatus.PICKED.value: FulfillmentStatus.QUEUED.value,
+    FulfillmentStatus.READY.value: FulfillmentStatus.PICKED.value,
+    FulfillmentStatus.COLLECTED.value: FulfillmentStatus.READY.value,
+}
+
+
+class FulfillmentIndex:
+    """Fulfillment order IDs grouped by status, oldest first.
+
+    Each status maps to an insertion-ordered dict of order IDs, so taking
+    the next batch of queued orders reads only that batch instead of
+    scanning every order ever fulfilled. The unit of work appliers report
+    each change; the index is rebuilt only when the store reloads the file
+    after another process changed it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._by_status = {}
+
+    def _rebuild(self, data):
+        self._data = data
+        self._by_status = {}
+        for order_id, record in data.get("orders", {}).items():
+            self._by_status.setdefault(record["status"], {})[order_id] = None
+
+    def added(self, data, order_id, status):
+        with self._lock:
+            if data is self._data:
+                self._by_status.setdefault(status, {})[order_id] = None
+
+    def moved(self, data, order_id, old_status, new_status):
+        with self._lock:
+            if data is self._data:
+                self._by_status.get(old_status, {}).pop(order_id, None)
+                self._by_status.setdefault(new_status, {})[order_id] = None
+
+    def order_ids(self, data, status, limit=None):
+        """Return up to limit order IDs with a status, oldest first"""
+        with self._lock:
+            if data is not self._data:
+                self._rebuild(data)
+            ids = self._by_status.get(status, {})
+            if limit is None:
+                return list(ids)
+            result = []
+            for order_id in ids:
+                if len(result) == limit:
+                    break
+                result.append(order_id)
+            return result
+
+    def count(self, data, status):
+        with self._lock:
+            if data is not self._data:
+                self._rebuild(data)
+            return len(self._by_status.get(status, {}))
+
+
+fulfillment_index = FulfillmentIndex()
+
+
+def _move(data, order_id, status, at, batch_id=None):
+    record = data.get("orders", {}).get(order_id)
+    if record is None or record["status"] != PREVIOUS_STATUS[status]:
+        # Already moved (a replayed change) or not in the right state
+        return False
+    old_status = record["status"]
+    record["status"] = status
+    record["history"].append({"status": status, "at": at})
+    if batch_id:
+        record["batchId"] = batch_id
+    fulfillment_index.moved(data, order_id, old_status, status)
+    return True
+
+
+def enqueue_order(data, payload):
+    """Unit of work applier: queue a paid order for fulfillment"""
+    orders = data.setdefault("orders", {})
+    if payload["orderId"] in orders:
+        return
+    orders[payload["orderId"]] = {
+        "orderId": payload["orderId"],
+        "userId": payload["userId"],
+        "stationId": payload["stationId"],
+        "items": payload["items"],
+        "status": FulfillmentStatus.QUEUED.value,
+        "batchId": None,
+        "history": [{"status": FulfillmentStatus.QUEUED.value, "at": payload.get("queuedAt") or datetime.now().isoformat()}]
+    }
+    fulfillment_index.added(data, payload["orderId"], FulfillmentStatus.QUEUED.value)
+
+
+def add_batch(data, payload):
+    """Unit of work applier: save a pick-list batch and mark its orders picked"""
+    batches = data.setdefault("batches", {})
+    if payload["batchId"] in batches:
+        return
+    batches[payload["batchId"]] = payload
+    for order_id in payload["orderIds"]:
+        _move(data, order_id, FulfillmentStatus.PICKED.value, payload["createdAt"], payload["batchId"])
+
+
+def set_status(data, payload):
+    """Unit of work applier: move orders (and optionally their batch) to a status"""
+    for order_id in payload["orderIds"]:
+        _move(data, order_id, payload["status"], payload["at"])
+    batch = data.get("batches", {}).get(payload.get("batchId"))
+    if batch is not None:
+        batch["status"] = payload["status"]
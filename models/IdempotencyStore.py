@@ -0,0 +1,130 @@
+"""Module for remembering the results of operations keyed by client request keys."""
+
+import hashlib
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+from utils.json_store import JsonStore
+from utils.ttl_cache import TTLCache
+
+IDEMPOTENCY_FILE = "data/idempotency_keys.json"
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+
+class IdempotencyStore:
+    """Deduplicates retried operations by their client-supplied request key.
+
+    Recent results are served from a bounded in-memory TTL cache. Every
+    result is also written to a persisted dedupe index, normally as part of
+    the same unit of work as the operation itself, so a retry after a
+    restart still finds it.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, index_file=IDEMPOTENCY_FILE, max_cached=10000):
+        """Initialize the store.
+
+        Args:
+            index_file (str): Path of the persisted dedupe index.
+            max_cached (int): Results kept in the in-memory cache.
+        """
+        self._index = JsonStore.get(index_file, dict, 2)
+        self._cache = TTLCache(max_cached, IDEMPOTENCY_TTL.total_seconds())
+        self._lock = threading.Lock()
+        self._pending_checkouts = {}  # cart digest -> request key
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide idempotency store"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @staticmethod
+    def make_key(scope, user_id, request_key):
+        """Combine an operation, its user and the client key into one index key"""
+        return f"{scope}:{user_id}:{request_key}"
+
+    @staticmethod
+    def _cart_digest(user_id, cart):
+        return hashlib.sha256(json.dumps([str(user_id), cart], default=str).encode()).hexdigest()
+
+    def checkout_key(self, user_id, cart):
+        """Return the request key for checking out a cart.
+
+        Retrying the same cart reuses the key of the attempt before it, so a
+        payment or order that attempt already recorded is found rather than
+        made again. Once the checkout is submitted the key is forgotten, so
+        buying the same cart later is a new request.
+
+        Args:
+            user_id (str): The user checking out
+            cart (list): JSON-serializable description of what is being bought
+        """
+        with self._lock:
+            return self._pending_checkouts.setdefault(
+                self._cart_digest(user_id, cart), str(uuid.uuid4())
+            )
+
+    def checkout_finished(self, user_id, cart):
+        """Forget a cart's request key after its order was submitted"""
+        with self._lock:
+            self._pending_checkouts.pop(self._cart_digest(user_id, cart), None)
+
+    def get(self, key):
+        """Return the recorded result for a key, or None if it has not run.
+
+        Returns:
+            dict: The result recorded the first time the operation ran.
+        """
+        result = self._cache.get(key)
+        if result is not None:
+            return result
+
+        record = self._index.load().get(key)
+        if not record or record["expiresAt"] <= datetime.now().isoformat():
+            return None
+        self._cache.put(key, record["result"])
+        return record["result"]
+
+    def build_record(self, result):
+        """Wrap a result with its expiry for the persisted index"""
+        now = datetime.now()
+        return {
+            "result": result,
+            "createdAt": now.isoformat(),
+            "expiresAt": (now + IDEMPOTENCY_TTL).isoformat()
+        }
+
+    def remember(self, key, result):
+        """Cache a result that has been (or is about to be) persisted"""
+        self._cache.put(key, result)
+
+    def put(self, key, result):
+        """Persist and cache a result outside of a unit of work"""
+        record = self.build_record(result)
+        self._index.update(lambda index: put_record(index, {"key": key, "record": record}))
+        self.remember(key, result)
+
+
+def put_record(index, payload):
+    """Add a record to the dedupe index and drop records past their expiry.
+
+    Records share one TTL and are kept in the order they were put, so the
+    expired ones are always at the front and the sweep stops at the first
+    record still live.
+    """
+    now = datetime.now().isoformat()
+    expired = []
+    for key, record in index.items():
+        if record["expiresAt"] > now:
+            break
+        expired.append(key)
+    for key in expired:
+        del index[key]
+    index.pop(payload["key"], None)
+    index[payload["key"]] = payload["record"]
@@ -1,62 +1,55 @@
-import json
-import os
+from models.MerchandiseCatalog import MerchandiseCatalog
+from models.StockReservation import StockReservationService
 
 MERCHANDISE_FILE = "data/merchandise.json"
-USERS_FILE = "data/users.json"
 
 
 class Merchandise:
     def __init__(self):
-        self.users = self.load_users()
-        raw_list = self.load_merchandise()
-        self.merchandise = {item["merchandiseName"]: item for item in raw_list}
+        self.catalog = MerchandiseCatalog.shared()
+        self.stock_service = StockReservationService.shared()
+        self.reservation_ids = []
+
+    @property
+    def merchandise(self):
+        """Items keyed by display name"""
+        return {item["merchandiseName"]: item for item in self.catalog.items()}
 
     def load_merchandise(self):
-        if not os.path.exists(MERCHANDISE_FILE):
-            return []
-        with open(MERCHANDISE_FILE, "r") as f:
-            return json.load(f)
+        return self.catalog.items()
 
     def save_merchandise(self):
-        with open(MERCHANDISE_FILE, "w") as f:
-            json.dump(list(self.merchandise.values()), f, indent=4)
-
-    def load_users(self):
-        if not os.path.exists(USERS_FILE):
-            return {}
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-
-    def save_users(self):
-        with open(USERS_FILE, "w") as f:
-            json.dump(self.users, f, indent=4)
+        """Write only the items changed through the catalog"""
+        return self.catalog.save()
 
     def prompt_merchandise_selection(self):
         print("\n🛍️ Available Merchandise:")
-        for idx, (name, item) in enumerate(self.merchandise.items(), start=1):
-            stock = item["merchandiseStock"]
+        items = self.catalog.items()
+        for idx, item in enumerate(items, start=1):
+            name = item["merchandiseName"]
+            stock = self.catalog.stock(item["merchandiseId"])
             price = item["merchandisePrice"]
             stock_display = "⚠️ Low stock!" if stock < 10 else ""
             print(f"{idx}. {name} (RM{price:.2f}) {stock_display}")
 
         selected_items = []
+        self.reservation_ids = []
         while True:
             choice = input(
                 "Enter the item number to buy (or 'done' to finish, 'cancel' to abort): "
             ).strip().lower()
             if choice == "cancel":
+                self.release_reservations()
                 print("❌ Order cancelled. Returning to main menu...")
                 return []
             if choice == "done":
                 break
-            if not choice.isdigit() or int(choice) not in range(1, len(self.merchandise) + 1):
+            if not choice.isdigit() or int(choice) not in range(1, len(items) + 1):
                 print("❌ Invalid selection. Try again.")
                 continue
 
-            idx = int(choice) - 1
-            item_name = list(self.merchandise.keys())[idx]
-            item_data = self.merchandise[item_name]
-            stock = item_data["merchandiseStock"]
+            item_data = items[int(choice) - 1]
+            item_name = item_data["merchandiseName"]
             price = item_data["merchandisePrice"]
 
             qty_input = input(
@@ -73,12 +66,20 @@ class Merchandise:
             if quantity <= 0:
                 print("❌ Quantity must be greater than 0.")
                 continue
-            if quantity > stock:
+            # Hold the stock until the order is paid or abandoned
+            reservation_id = self.stock_service.reserve(item_data["merchandiseId"], quantity)
+            if not reservation_id:
+                stock = self.stock_service.available(item_data["merchandiseId"])
                 print(f"❌ Not enough stock. Only {stock} available.")
                 continue
 
             selected_items.append((item_name, quantity, price))
-            # Reserve stock
-            self.merchandise[item_name]["merchandiseStock"] -= quantity
+            self.reservation_ids.append(reservation_id)
+
+        return selected_items
 
-        return selected_items
\ No newline at end of file
+    def release_reservations(self):
+        """Release the stock held for the current selection"""
+        for reservation_id in self.reservation_ids:
+            self.stock_service.release(reservation_id)
+        self.reservation_ids = []
\ No newline at end of file
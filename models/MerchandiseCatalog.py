@@ -0,0 +1,124 @@
+"""Module for the cached, indexed merchandise catalog."""
+
+import threading
+from models.StockReservation import StockReservationService
+from utils.json_store import JsonStore
+
+MERCHANDISE_FILE = "data/merchandise.json"
+
+
+class MerchandiseCatalog:
+    """merchandise.json loaded once and indexed by ID, name and category.
+
+    The indexes are rebuilt only when the file changes on disk. Edits are
+    tracked per item and stay out of the loaded items until save() merges
+    just the changed items into the current file under its lock, so it
+    never overwrites another session's changes to other items.
+    Stock comes from the stock reservation service, which owns the live
+    counts.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, catalog_file=MERCHANDISE_FILE, stock_service=None):
+        self._store = JsonStore.get(catalog_file, list, 4)
+        self._stock_service = stock_service or StockReservationService.shared()
+        self._lock = threading.RLock()
+        self._data = None
+        self._items = []
+        self._by_id = {}
+        self._by_name = {}
+        self._by_category = {}
+        self._dirty = {}
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide catalog"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _ensure(self):
+        data = self._store.load()
+        if data is self._data:
+            return
+        self._data = data
+        self._items = list(data)
+        self._by_id = {item["merchandiseId"]: item for item in data}
+        self._by_name = {item["merchandiseName"].lower(): item for item in data}
+        self._by_category = {}
+        for item in data:
+            self._by_category.setdefault(item.get("merchandiseCategory"), []).append(item)
+
+    def items(self):
+        """Return every item in catalog order"""
+        with self._lock:
+            self._ensure()
+            return list(self._items)
+
+    def get(self, item_id):
+        """Return an item by its merchandiseId, or None"""
+        with self._lock:
+            self._ensure()
+            return self._by_id.get(item_id)
+
+    def find_by_name(self, name):
+        """Return an item by its display name (case-insensitive), or None"""
+        with self._lock:
+            self._ensure()
+            return self._by_name.get(name.strip().lower())
+
+    def by_category(self, category):
+        """Return the items of one category"""
+        with self._lock:
+            self._ensure()
+            return list(self._by_category.get(category, []))
+
+    def categories(self):
+        with self._lock:
+            self._ensure()
+            return list(self._by_category)
+
+    def price_view(self):
+        """Return {merchandiseId: price}"""
+        with self._lock:
+            self._ensure()
+            return {item_id: item["merchandisePrice"] for item_id, item in self._by_id.items()}
+
+    def stock(self, item_id):
+        """Return the stock available to buy right now"""
+        return self._stock_service.available(item_id)
+
+    def stock_view(self):
+        """Return {merchandiseId: available stock}"""
+        return {item["merchandiseId"]: self.stock(item["merchandiseId"]) for item in self.items()}
+
+    def update_item(self, item_id, **fields):
+        """Change fields of an item; they are written on the next save()"""
+        with self._lock:
+            self._ensure()
+            if item_id not in self._by_id:
+                raise KeyError(item_id)
+            self._dirty.setdefault(item_id, {}).update(fields)
+
+    def save(self):
+        """Write the changed items into the catalog file.
+
+        Returns:
+            int: Number of items written.
+        """
+        with self._lock:
+            if not self._dirty:
+                return 0
+            dirty = self._dirty
+
+            def merge(items):
+                for item in items:
+                    if item.get("merchandiseId") in dirty:
+                        item.update(dirty[item["merchandiseId"]])
+
+            self._store.update(merge)
+            self._dirty = {}
+            return len(dirty)
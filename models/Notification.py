@@ -1,8 +1,15 @@
 import datetime
 import uuid
-from utils.json_handler import load_json, save_json
+from utils.json_store import JsonStore
 from models.enums import NotificationType  # Updated import
 
+NOTIFICATIONS_FILE = "data/notifications.json"
+
+
+def _notifications_store():
+    # Shared with UnitOfWork, so every writer takes the same file lock
+    return JsonStore.get(NOTIFICATIONS_FILE, list, 2)
+
 class Notification:
     def create_notification(self, content, notification_type, recipient_type, recipient_id=None):
         """Create a notification for either admin or user.
@@ -16,6 +23,13 @@ class Notification:
         Returns:
             dict: Created notification data
         """
+        notif = self.build_notification(content, notification_type, recipient_type, recipient_id)
+        self.save_notification(notif)
+        self.send_notification(notif)
+        return notif
+
+    def build_notification(self, content, notification_type, recipient_type, recipient_id=None):
+        """Build a notification record without saving or sending it."""
         notif = {
             "notificationId": str(uuid.uuid4()),
             "notificationType": notification_type.value if isinstance(notification_type, NotificationType) else notification_type,
@@ -31,15 +45,26 @@ class Notification:
                 notif["recipientUserIds"] = [recipient_id] if not isinstance(recipient_id, list) else recipient_id
             elif recipient_type == "admin":
                 notif["recipientAdminIds"] = [recipient_id] if not isinstance(recipient_id, list) else recipient_id
-        
-        self.save_notification(notif)
-        self.send_notification(notif)
         return notif
+
+    def create_notifications(self, notifications):
+        """Create several notifications with a single write of the notifications file.
+        
+        Args:
+            notifications (list): (content, notification_type, recipient_type, recipient_id) tuples
+            
+        Returns:
+            list: Created notification data
+        """
+        notifs = [self.build_notification(*args) for args in notifications]
+        if notifs:
+            _notifications_store().update(lambda data: data.extend(notifs))
+            for notif in notifs:
+                self.send_notification(notif)
+        return notifs
     
     def save_notification(self, notif):
-        data = load_json("data/notifications.json")
-        data.append(notif)
-        save_json("data/notifications.json", data)
+        _notifications_store().update(lambda data: data.append(notif))
 
     def send_notification(self, notif):
         print("\n[Notification Sent]")
@@ -54,11 +79,18 @@ class Notification:
             print("Recipient: All Administrators")
             
     def get_user_notifications(self, user_id):
-        data = load_json("data/notifications.json")
+        data = _notifications_store().load()
         return [n for n in data if n.get('recipientType') == 'user' and str(user_id) in n.get('recipientUserIds', [])]
     
     def get_admin_notifications(self, admin_id=None):
-        data = load_json("data/notifications.json")
+        data = _notifications_store().load()
         if admin_id:
             return [n for n in data if n.get('recipientType') == 'admin' and str(admin_id) in n.get('recipientAdminIds', [])]
-        return [n for n in data if n.get('recipientType') == 'admin']
\ No newline at end of file
+        return [n for n in data if n.get('recipientType') == 'admin']
+
+    def mark_user_notifications_read(self, user_id):
+        def mark_read(data):
+            for n in data:
+                if n.get('recipientType') == 'user' and str(user_id) in n.get('recipientUserIds', []):
+                    n["notificationStatus"] = "Read"
+        _notifications_store().update(mark_read)
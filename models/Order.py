@@ -2,8 +2,6 @@
 """Module for handling order creation and management."""
 
 import uuid
-import json
-import os
 from datetime import datetime
 from models.PaymentAttempt import PaymentAttempt
 from models.PointsLedger import PointsLedger
@@ -12,16 +10,31 @@ from models.enums import NotificationType
 from models.Receipt import Receipt
 from models.enums import TripBookingStatus
 from models.enums import OrderStatus
+from models.UnitOfWork import UnitOfWork
+from models.IdempotencyStore import IdempotencyStore
+from models.StockReservation import StockReservationService
+from models.Fulfillment import FulfillmentService
+from utils import service_time
 
 ORDERS_FILE = "data/orders.json"
 
 class Order:
     """A class representing a customer order with payment processing."""
 
-    def __init__(self, user_id):
-        """Initialize a new order."""
+    def __init__(self, user_id, idempotency_key=None):
+        """Initialize a new order.
+        
+        Args:
+            user_id (str): ID of the ordering user
+            idempotency_key (str, optional): Client request key; retries that
+                reuse it get the same order ID and the original result
+        """
         self._user_id = user_id
-        self._order_id = str(uuid.uuid4())
+        self._idempotency_key = idempotency_key
+        if idempotency_key:
+            self._order_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"order:{user_id}:{idempotency_key}"))
+        else:
+            self._order_id = str(uuid.uuid4())
         self._merchandise_list = []
         self._trip_bookings = []
         self._total_amount = 0.0
@@ -29,17 +42,29 @@ class Order:
         self._payment_method = None
         self._payment_status = "PENDING"
         self._order_status = "CREATED"
-        self._points_ledger = PointsLedger()
+        self._points_ledger = PointsLedger.shared()
         self._payment_attempt = PaymentAttempt()
         self._notification = Notification()
         self._points_redeemed = 0.0
+        self._points_reservation_id = None
+        self._stock_reservations = []
+        self._receipt_data = None
+        self._idempotency = IdempotencyStore.shared()
 
     def create_order(self):
         """Initialize a new order."""
         print(f"📝 Order {self._order_id} created for user {self._user_id}.")
 
-    def request_add_trip_booking(self, trip_booking_obj, from_station, to_station, ticket_count, fare_override, trip_date, departure_time=None):
+    def request_add_trip_booking(self, trip_booking_obj, from_station, to_station, ticket_count, fare_override, trip_date, departure_time=None, idempotency_key=None):
         """Add a trip booking to the order"""
+        if idempotency_key:
+            booking_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"booking:{self._order_id}:{idempotency_key}"))
+            if any(b["tripBookingId"] == booking_id for b in self._trip_bookings):
+                print("ℹ️ Trip booking already added to this order")
+                return True
+        else:
+            booking_id = str(uuid.uuid4())
+
         trips = trip_booking_obj.get_trip_details(from_station, trip_date)
         if not trips:
             print("❌ No available trips found.")
@@ -63,7 +88,7 @@ class Order:
         total_fare = fare * ticket_count
 
         trip_booking = {
-            "tripBookingId": str(uuid.uuid4()),
+            "tripBookingId": booking_id,
             "tripId": selected_trip["tripId"],
             "userId": self._user_id,
             "orderId": self._order_id,
@@ -83,16 +108,19 @@ class Order:
         print(f"⏰ Departure Time: {selected_trip['departureTime']}")  # Debug print
         return True
         
-    def request_add_merchandise(self, item_name, quantity, price):
+    def request_add_merchandise(self, item_name, quantity, price, reservation_id=None):
         """Add item to order with validation.
         
         Args:
             item_name (str): Name of the item
             quantity (int): Quantity to order
             price (float): Price per unit
+            reservation_id (str, optional): Stock reservation holding the items
         """
         self._validate_merchandise(item_name, quantity, price)
         self._merchandise_list.append((item_name, quantity, price))
+        if reservation_id:
+            self._stock_reservations.append((reservation_id, item_name, quantity))
         self.calculate_total_amount()
         print(f"🛍️ Added {quantity} x {item_name} @ RM{price:.2f}")
 
@@ -107,7 +135,7 @@ class Order:
         if not self._validate_redemption_conditions():
             return False
         
-        points = self._points_ledger.get_points(self._user_id)
+        points = self._points_ledger.get_available_points(self._user_id)
         
         if points <= 0:
             print("⚠️ No points available to redeem.")
@@ -124,7 +152,12 @@ class Order:
             
         redeem_amount = self._calculate_redeemable_amount(points)
         if redeem_amount > 0:
-            if self._points_ledger.deduct_points(self._user_id, redeem_amount):
+            # Hold the points now; they are only deducted once payment succeeds
+            reservation_id = self._points_ledger.reserve_points(
+                self._user_id, redeem_amount, self._order_id
+            )
+            if reservation_id:
+                self._points_reservation_id = reservation_id
                 self._points_redeemed = redeem_amount
                 self._final_amount = max(0, self._total_amount - redeem_amount)
                 print(f"💰 Redeemed {redeem_amount} points. New total: RM{self._final_amount:.2f}")
@@ -163,18 +196,43 @@ class Order:
         }.get(method.value, method.value)
         print(f"💳 Payment method set to {display_name}")
 
-    def request_process_payment(self):
+    def request_process_payment(self, idempotency_key=None):
         """Handle payment processing"""
+        idempotency_key = idempotency_key or (
+            f"{self._idempotency_key}:payment" if self._idempotency_key else None
+        )
+        if idempotency_key:
+            payment_key = IdempotencyStore.make_key("payment", self._user_id, idempotency_key)
+            previous = self._idempotency.get(payment_key)
+            if previous:
+                # This payment already went through; don't charge again
+                print("ℹ️ Payment already processed for this request")
+                self._final_amount = previous["amount"]
+                self.update_payment_status("PAID")
+                return True
+
         for attempt in range(3):
             if not self._payment_method and not self.request_select_payment_method():
-                return False
-                
+                break
+
+            # Never charge for merchandise whose hold lapsed and has sold out since
+            if not self._renew_stock_reservations():
+                break
+
             if self._process_payment_attempt():
+                if idempotency_key:
+                    self._idempotency.put(payment_key, {
+                        "orderId": self._order_id,
+                        "amount": self._final_amount,
+                        "paymentMethod": self._payment_method.value if self._payment_method else None
+                    })
                 return True
                 
             if not self._handle_payment_failure(attempt):
-                return False
-                
+                break
+
+        self._release_points_reservation()
+        self._release_stock_reservations()
         return False
 
     def update_payment_status(self, status):
@@ -188,22 +246,49 @@ class Order:
         """Finalize and submit order"""
         if not self._validate_submission():
             return False
+
+        submit_key = None
+        if self._idempotency_key:
+            submit_key = IdempotencyStore.make_key("submit_order", self._user_id, self._idempotency_key)
+            previous = self._idempotency.get(submit_key)
+            if previous:
+                # A retried checkout: return the original result without writing anything
+                self._release_points_reservation()
+                self._release_stock_reservations()
+                self._order_status = previous["orderStatus"]
+                self._receipt_data = previous["receipt"]
+                print(f"ℹ️ Order {previous['orderId']} was already submitted")
+                return True
+
+        # Every file touched by checkout is staged here and committed together
+        unit_of_work = UnitOfWork()
+        if self._points_reservation_id:
+            unit_of_work.stage("points", "commit_reservation", {
+                "reservationId": self._points_reservation_id,
+                "userId": self._user_id,
+                "points": self._points_redeemed,
+                "orderId": self._order_id
+            })
             
         # Update all trip bookings to COMPLETED status
         for booking in self._trip_bookings:
             booking["bookingStatus"] = TripBookingStatus.CONFIRMED.value
         
         self.update_order_status(OrderStatus.CONFIRMED.value)
-        self.save_to_orders_file()
+        self.save_to_orders_file(unit_of_work)
         
         # Calculate points based on FINAL amount (RM10 = 1 point)
+        points_earned = 0
         try:
             final_amount = float(self._final_amount)
             points_earned = int(final_amount // 10)
             
             if points_earned > 0:
-                actual_earned = self._points_ledger.earn_points(self._user_id, points_earned)
-                print(f"🎉 Earned {actual_earned} points for this purchase!")
+                unit_of_work.stage("points", "earn", {
+                    "userId": self._user_id,
+                    "points": points_earned,
+                    "orderId": self._order_id
+                })
             else:
                 print(f"ℹ️ No points earned (minimum RM10 needed, spent RM{final_amount:.2f})")
         except Exception as e:
@@ -227,30 +312,99 @@ class Order:
             message = f"Order #{self._order_id} confirmed"
             notification_type = NotificationType.ORDER_UPDATE
         
-        self._notification.create_notification(
+        notif = self._notification.build_notification(
             message,
             notification_type,
             "user",
             self._user_id
         )
-        
+        unit_of_work.stage("notifications", "append", notif)
+
+        self._receipt_data = Receipt(self).build_receipt_data()
+        unit_of_work.stage("receipts", "append", self._receipt_data)
+
+        self._stage_stock_reservations(unit_of_work)
+
+        if self._merchandise_list:
+            # Queued together with the order, so a paid order is never left unfulfilled
+            FulfillmentService.stage_order(
+                unit_of_work, self._user_id, self._order_id,
+                self._merchandise_list, self._collection_station()
+            )
+
+        if submit_key:
+            submit_result = {
+                "orderId": self._order_id,
+                "orderStatus": self._order_status,
+                "pointsEarned": points_earned,
+                "receipt": self._receipt_data
+            }
+            unit_of_work.stage("idempotency", "put", {
+                "key": submit_key,
+                "record": self._idempotency.build_record(submit_result)
+            })
+
+        if not unit_of_work.commit():
+            if unit_of_work.pending:
+                # recover() completes the order on the next start, so its holds must stay
+                self._points_reservation_id = None
+                self._stock_reservations = []
+                print(f"⏳ Order {self._order_id} is pending and will be completed when the system restarts")
+                return False
+            self._release_points_reservation()
+            self._receipt_data = None
+            self._release_stock_reservations()
+            print(f"❌ Order {self._order_id} could not be submitted")
+            return False
+        self._points_reservation_id = None
+        self._stock_reservations = []
+        if submit_key:
+            self._idempotency.remember(submit_key, submit_result)
+
+        if points_earned > 0:
+            print(f"🎉 Earned {points_earned} points for this purchase!")
+        self._notification.send_notification(notif)
         print("✉️ Notification sent")
         print(f"✅ Order {self._order_id} submitted")
         return True
     
+    def abandon_order(self):
+        """Release anything held for an order that will not be submitted"""
+        self._release_points_reservation()
+        self._release_stock_reservations()
+
     def update_order_status(self, status):
         """Update order status"""
         self._order_status = status
         print(f"📦 Status updated to {status}")
     
     def process_merchandise_order(self):
-        """Process order fulfillment"""
-        print("🚚 Processing merchandise order...")
+        """Show where the order stands in fulfillment"""
+        if not self._merchandise_list:
+            return
+        fulfillment = FulfillmentService.shared()
+        record = fulfillment.get(self._order_id)
+        if record is None:
+            print("⚠️ Merchandise order is not queued for fulfillment")
+            return
+        print(f"🚚 Merchandise order {record['status'].lower()} for collection at "
+              f"{fulfillment.station_name(record['stationId'])}")
+
+    def _collection_station(self):
+        # Travellers collect at the station their first trip departs from
+        for booking in self._trip_bookings:
+            if booking.get("fromStationId"):
+                return booking["fromStationId"]
+        return None
 
     def request_receipt_generation(self):
         """Generate order receipt"""
         receipt = Receipt(self)
-        receipt.generate_receipt()
+        if self._receipt_data:
+            # Already saved together with the order in submit_order
+            receipt.print_receipt(self._receipt_data)
+        else:
+            receipt.generate_receipt()
         print("🧾 Receipt generated")
 
     def view_order_details(self):
@@ -277,53 +431,33 @@ class Order:
             "points_redeemed": self._points_redeemed
         }
 
-    def save_to_orders_file(self):
-        """Save order to file"""
+    def save_to_orders_file(self, unit_of_work=None):
+        """Save order to file, or stage it on the given unit of work"""
         order_data = self._prepare_order_data()
+        commit_now = unit_of_work is None
+        unit_of_work = unit_of_work or UnitOfWork()
         
         try:
             # Save to orders.json
-            existing = self._load_existing_orders()
-            if self._user_id not in existing:
-                existing[self._user_id] = {"orders": []}
-            existing[self._user_id]["orders"].append(order_data)
-            
-            with open(ORDERS_FILE, "w") as f:
-                json.dump(existing, f, indent=4)
+            unit_of_work.stage("orders", "append_order", {
+                "userId": self._user_id,
+                "order": order_data
+            })
             
             # Save trip bookings to tripbookings.json if they exist
             if self._trip_bookings:
-                self._save_trip_bookings()
+                unit_of_work.stage("tripbookings", "append_bookings", {
+                    "userId": self._user_id,
+                    "bookings": self._trip_bookings
+                })
             
+            if commit_now:
+                return unit_of_work.commit()
             return True
         except Exception as e:
             print(f"❌ Failed to save order: {str(e)}")
             return False
 
-    def _save_trip_bookings(self):
-        """Save trip bookings to separate file"""
-        trips_file = "data/tripbookings.json"
-        try:
-            # Load existing trips
-            existing_trips = {}
-            if os.path.exists(trips_file):
-                with open(trips_file, "r") as f:
-                    existing_trips = json.load(f)
-            
-            # Initialize user's trip bookings if not exists
-            if self._user_id not in existing_trips:
-                existing_trips[self._user_id] = []
-            
-            # Add new trip bookings
-            existing_trips[self._user_id].extend(self._trip_bookings)
-            
-            # Save back to file
-            with open(trips_file, "w") as f:
-                json.dump(existing_trips, f, indent=4)
-                
-        except Exception as e:
-            print(f"⚠️ Warning: Could not save trip bookings: {str(e)}")
-
     # Protected helper methods
     def _validate_merchandise(self, item_name, quantity, price):
         if quantity <= 0:
@@ -346,12 +480,50 @@ class Order:
 
     def _process_payment_attempt(self):
         """Process a payment attempt using the payment attempt object."""
-        if self._payment_attempt.process_payment(self._final_amount):
+        if self._payment_attempt.process_payment(
+            self._final_amount,
+            reference=f"{self._order_id}:{self._payment_method.value}",
+            payment_method=self._payment_method
+        ):
             self.update_payment_status("PAID")
             return True
         self.update_payment_status("FAILED")
         return False
     
+    def _release_points_reservation(self):
+        """Return held points to the user when the order is not paid."""
+        if self._points_reservation_id:
+            self._points_ledger.release_reservation(self._points_reservation_id)
+            self._points_reservation_id = None
+            self._points_redeemed = 0.0
+            self._final_amount = self._total_amount
+
+    def _release_stock_reservations(self):
+        """Put held merchandise back on sale when the order is not paid."""
+        stock_service = StockReservationService.shared()
+        for reservation_id, _, _ in self._stock_reservations:
+            stock_service.release(reservation_id)
+        self._stock_reservations = []
+
+    def _renew_stock_reservations(self):
+        """Extend the merchandise holds before charging; False if an item sold out."""
+        stock_service = StockReservationService.shared()
+        for reservation_id, item_name, quantity in self._stock_reservations:
+            if not stock_service.renew(reservation_id, quantity):
+                print(f"❌ {item_name} sold out while paying; you have not been charged")
+                return False
+        return True
+
+    def _stage_stock_reservations(self, unit_of_work):
+        """Stage taking the held merchandise out of stock with the order."""
+        for reservation_id, item_name, quantity in self._stock_reservations:
+            unit_of_work.stage("stock", "commit", {
+                "reservationId": reservation_id,
+                "itemName": item_name,
+                "quantity": quantity,
+                "orderId": self._order_id
+            })
+
     def _handle_payment_failure(self, attempt):
         if attempt >= 2:
             print("❌ Max attempts reached")
@@ -374,7 +546,8 @@ class Order:
         return {
             "order_id": self._order_id,
             "user_id": self._user_id,
-            "trip_bookings": self._trip_bookings,
+            # The bookings themselves live in tripbookings.json
+            "trip_booking_ids": [booking["tripBookingId"] for booking in self._trip_bookings],
             "items": self._merchandise_list,
             "total": self._total_amount,
             "final_amount": self._final_amount,
@@ -384,56 +557,28 @@ class Order:
             "points_redeemed": self._points_redeemed
         }
 
-    def _load_existing_orders(self):
-        if not os.path.exists(ORDERS_FILE):
-            return {}
-            
-        try:
-            with open(ORDERS_FILE, "r") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-
-    def get_active_trip_bookings(self):
-        """Retrieve all trip bookings for this user (including cancelled ones)"""
-        if not os.path.exists("data/orders.json"):
-            return []
-
-        with open("data/orders.json", "r") as f:
-            all_orders = json.load(f)
-
-        user_orders = all_orders.get(str(self._user_id), {}).get("orders", [])
-        if not user_orders:
-            return []
+    def cancel_trip_booking(self, booking_id, departure_minute):
+        """Cancel a specific trip booking and update order status.
 
-        all_trip_bookings = []
-        for order in user_orders:
-            if "trip_bookings" in order:
-                all_trip_bookings.extend(order["trip_bookings"])
-
-        return all_trip_bookings  # Return all bookings, not just active ones
-
-    def cancel_trip_booking(self, booking_id, dep_datetime):
-        """Cancel a specific trip booking and update order status"""
-        # Load existing orders
-        with open("data/orders.json", "r") as f:
-            all_orders = json.load(f)
-
-        user_orders = all_orders.get(str(self._user_id), {}).get("orders", [])
-        
-        # Update booking and order status
-        for order in user_orders:
-            if "trip_bookings" in order:
-                for booking in order["trip_bookings"]:
-                    if booking["tripBookingId"] == booking_id:
-                        booking["bookingStatus"] = TripBookingStatus.CANCELLED.value
-                        order["status"] = (
-                            OrderStatus.REFUNDED.value 
-                            if (dep_datetime - datetime.now()).total_seconds() > 86400
-                            else OrderStatus.REFUNDED_FAIL.value
-                        )
-                        break
-
-        # Save changes
-        with open("data/orders.json", "w") as f:
-            json.dump(all_orders, f, indent=4)
\ No newline at end of file
+        Args:
+            booking_id (str): The booking to cancel
+            departure_minute (int): Its departure in epoch minutes (see utils.service_time)
+        """
+        # Both stores change together; the booking is found through the booking index
+        unit_of_work = UnitOfWork()
+        unit_of_work.stage("orders", "set_booking_status", {
+            "userId": str(self._user_id),
+            "tripBookingId": booking_id,
+            "bookingStatus": TripBookingStatus.CANCELLED.value,
+            "status": (
+                OrderStatus.REFUND_REQUESTED.value
+                if departure_minute - service_time.now() > 24 * 60
+                else OrderStatus.REFUNDED_FAIL.value
+            )
+        })
+        unit_of_work.stage("tripbookings", "set_status", {
+            "userId": str(self._user_id),
+            "tripBookingId": booking_id,
+            "bookingStatus": TripBookingStatus.CANCELLED.value
+        })
+        return unit_of_work.commit()
\ No newline at end of file
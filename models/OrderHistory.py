@@ -0,0 +1,129 @@
+"""Module for paging through a user's order and trip booking history."""
+
+from models.BookingStore import resolve_trip_bookings
+from models.enums import TripBookingStatus
+from utils.json_store import JsonStore
+
+ORDERS_FILE = "data/orders.json"
+TRIPS_FILE = "data/trips.json"
+DEFAULT_PAGE_SIZE = 10
+
+
+def _encode_cursor(order_pos, booking_pos=0):
+    return f"{order_pos}:{booking_pos}"
+
+
+def _decode_cursor(cursor):
+    order_pos, booking_pos = cursor.split(":")
+    return int(order_pos), int(booking_pos)
+
+
+class OrderHistory:
+    """Newest-first history of one user's orders and trip bookings.
+
+    Orders are only ever appended, so a position in the user's order list
+    is a stable cursor. Generators walk backwards from the newest order
+    (or from a cursor) and stop as soon as the caller has enough, so the
+    first page costs the same however long the history is.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = str(user_id)
+        self._orders = JsonStore.get(ORDERS_FILE, dict, 4)
+        self._trips = JsonStore.get(TRIPS_FILE, list, 2)
+        self._route_by_trip = None
+        self._trips_data = None
+
+    def _user_orders(self):
+        return self._orders.load().get(self.user_id, {}).get("orders", [])
+
+    def _route_of(self, trip_id):
+        trips = self._trips.load()
+        if trips is not self._trips_data:
+            self._trips_data = trips
+            self._route_by_trip = {trip["tripId"]: trip.get("routeId") for trip in trips}
+        return self._route_by_trip.get(trip_id)
+
+    @staticmethod
+    def _in_range(timestamp, since, until):
+        # Departure times saved as bare "HH:MM" carry no date to compare
+        if (since or until) and (not timestamp or "T" not in timestamp):
+            return False
+        if since and timestamp[:len(since)] < since:
+            return False
+        if until and timestamp[:len(until)] > until:
+            return False
+        return True
+
+    def iter_orders(self, cursor=None, status=None, since=None, until=None):
+        """Yield (cursor, order) pairs, newest first.
+
+        Args:
+            cursor (str, optional): Start at this cursor instead of the newest order
+            status (str, optional): Only orders with this status
+            since (str, optional): Earliest order date, e.g. '2025-06-01'
+            until (str, optional): Latest order date, inclusive
+
+        The cursor yielded with an order resumes right after it.
+        """
+        orders = self._user_orders()
+        order_pos = len(orders) - 1 if cursor is None else _decode_cursor(cursor)[0]
+        while order_pos >= 0:
+            order = orders[order_pos]
+            order_pos -= 1
+            if status and order.get("status") != status:
+                continue
+            if not self._in_range(order.get("timestamp"), since, until):
+                continue
+            yield _encode_cursor(order_pos), order
+
+    def iter_bookings(self, cursor=None, active_only=False, since=None, until=None, route_id=None):
+        """Yield (cursor, booking) pairs, newest order first.
+
+        Args:
+            cursor (str, optional): Resume from a cursor returned earlier
+            active_only (bool): Skip cancelled bookings
+            since (str, optional): Earliest departure date, e.g. '2025-06-01'
+            until (str, optional): Latest departure date, inclusive
+            route_id (str, optional): Only trips on this route
+        """
+        orders = self._user_orders()
+        order_pos, booking_pos = (len(orders) - 1, 0) if cursor is None else _decode_cursor(cursor)
+        while order_pos >= 0:
+            bookings = resolve_trip_bookings(orders[order_pos])
+            while booking_pos < len(bookings):
+                booking = bookings[booking_pos]
+                booking_pos += 1
+                next_cursor = (
+                    _encode_cursor(order_pos, booking_pos) if booking_pos < len(bookings)
+                    else _encode_cursor(order_pos - 1)
+                )
+                if active_only and booking.get("bookingStatus") == TripBookingStatus.CANCELLED.value:
+                    continue
+                if not self._in_range(booking.get("departureTime"), since, until):
+                    continue
+                if route_id and self._route_of(booking.get("tripId")) != route_id:
+                    continue
+                yield next_cursor, booking
+            order_pos -= 1
+            booking_pos = 0
+
+    @staticmethod
+    def _page(items, limit):
+        page = []
+        next_cursor = None
+        for cursor, item in items:
+            if len(page) == limit:
+                # Only hand out a cursor when there really is another page
+                return page, next_cursor
+            page.append(item)
+            next_cursor = cursor
+        return page, None
+
+    def orders_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, **filters):
+        """Return up to limit orders and the cursor of the next page (None on the last page)"""
+        return self._page(self.iter_orders(cursor, **filters), limit)
+
+    def bookings_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, **filters):
+        """Return up to limit bookings and the cursor of the next page (None on the last page)"""
+        return self._page(self.iter_bookings(cursor, **filters), limit)
@@ -0,0 +1,183 @@
+"""Module for looking up orders by ID, status and date without scanning every user."""
+
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from utils.json_store import JsonStore
+
+ORDERS_FILE = "data/orders.json"
+
+
+def _as_timestamp(value):
+    if value is None:
+        return None
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class OrderIndex:
+    """Secondary indexes over orders.json.
+
+    - by ID: order_id -> (user ID, position in that user's order list)
+    - by status: status -> (timestamp, order_id) pairs kept sorted
+    - by date: every (timestamp, order_id) pair kept sorted
+
+    The sorted lists answer date-range queries with two binary searches, so
+    a lookup costs O(log n + k). The unit of work appliers note every new
+    order and status change, and the index takes them in once the store has
+    been saved, keeping it current without a rebuild; it is only rebuilt
+    when the store reloads the file after another process changed it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._orders = None
+        self._by_id = {}
+        self._by_status = {}
+        self._by_time = []
+        self._pending = []  # (orders, change) noted but not yet saved
+
+    def _add(self, user_id, order_pos, order_id, timestamp, status):
+        # Already there if the index was rebuilt from the data after the change
+        if not order_id or self._by_id.get(order_id) == (user_id, order_pos):
+            return
+        key = (timestamp or "", order_id)
+        self._by_id[order_id] = (user_id, order_pos)
+        insort(self._by_time, key)
+        insort(self._by_status.setdefault(status, []), key)
+
+    def _move(self, key, old_status, status):
+        old_keys = self._by_status.get(old_status, [])
+        pos = bisect_left(old_keys, key)
+        if pos < len(old_keys) and old_keys[pos] == key:
+            del old_keys[pos]
+        new_keys = self._by_status.setdefault(status, [])
+        pos = bisect_left(new_keys, key)
+        if pos == len(new_keys) or new_keys[pos] != key:
+            new_keys.insert(pos, key)
+
+    def _rebuild(self, orders):
+        self._orders = orders
+        self._by_id = {}
+        self._by_status = {}
+        self._by_time = []
+        keys = []
+        for user_id, user_data in orders.items():
+            for order_pos, order in enumerate(user_data.get("orders", [])):
+                order_id = order.get("order_id")
+                if not order_id:
+                    continue
+                key = (order.get("timestamp") or "", order_id)
+                self._by_id[order_id] = (user_id, order_pos)
+                self._by_status.setdefault(order.get("status"), []).append(key)
+                keys.append(key)
+        self._by_time = sorted(keys)
+        for status_keys in self._by_status.values():
+            status_keys.sort()
+
+    def _ensure(self, orders):
+        if orders is not self._orders:
+            self._rebuild(orders)
+
+    def _resolve(self, orders, order_id):
+        location = self._by_id.get(order_id)
+        if location is None:
+            return None, None
+        user_id, order_pos = location
+        try:
+            order = orders[user_id]["orders"][order_pos]
+        except (KeyError, IndexError):
+            return None, None
+        return (user_id, order) if order.get("order_id") == order_id else (None, None)
+
+    @staticmethod
+    def _range(keys, since, until):
+        # Bounds match as prefixes, so a date-only 'until' takes in that whole day
+        start = 0 if since is None else bisect_left(keys, (since, ""))
+        end = len(keys) if until is None else bisect_right(keys, (until + "\uffff",))
+        return keys[start:end]
+
+    def order_added(self, orders, user_id, order_pos):
+        """Note an order appended to a user's order list; indexed by saved()"""
+        order = orders[user_id]["orders"][order_pos]
+        with self._lock:
+            self._pending.append((orders, ("added", user_id, order_pos, order.get("order_id"),
+                                           order.get("timestamp"), order.get("status"))))
+
+    def status_changed(self, orders, order, old_status):
+        """Note an order's status was changed in place; indexed by saved()"""
+        if old_status == order.get("status"):
+            return
+        key = (order.get("timestamp") or "", order.get("order_id"))
+        with self._lock:
+            self._pending.append((orders, ("moved", key, old_status, order.get("status"))))
+
+    def saved(self, orders):
+        """Take in the changes noted for orders now that they are on disk"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if orders is not self._orders:
+                return
+            for changed, change in pending:
+                if changed is not orders:
+                    continue
+                if change[0] == "added":
+                    self._add(*change[1:])
+                else:
+                    self._move(*change[1:])
+
+    def discard(self):
+        """Forget the changes noted for a save that failed"""
+        with self._lock:
+            self._pending = []
+
+    def find(self, orders, order_id):
+        """Return (user ID, order) for an order ID, or (None, None)"""
+        with self._lock:
+            self._ensure(orders)
+            user_id, order = self._resolve(orders, order_id)
+            if order is None and order_id in self._by_id:
+                # Positions moved under us; start again from the data
+                self._rebuild(orders)
+                user_id, order = self._resolve(orders, order_id)
+            return user_id, order
+
+    def query(self, orders, status=None, since=None, until=None):
+        """Return (user ID, order) pairs, oldest first.
+
+        Args:
+            orders (dict): Loaded contents of orders.json
+            status (str, optional): Only orders with this status
+            since (datetime|str, optional): Earliest timestamp, inclusive
+            until (datetime|str, optional): Latest timestamp, inclusive
+        """
+        with self._lock:
+            self._ensure(orders)
+            keys = self._by_time if status is None else self._by_status.get(status, [])
+            matches = self._range(keys, _as_timestamp(since), _as_timestamp(until))
+            results = []
+            for _, order_id in matches:
+                user_id, order = self._resolve(orders, order_id)
+                if order is not None and (status is None or order.get("status") == status):
+                    results.append((user_id, order))
+            return results
+
+
+order_index = OrderIndex()
+
+
+def find_order(order_id):
+    """Look up an order by its ID.
+
+    Returns:
+        tuple: (user ID, order dict), or (None, None) if there is no such order
+    """
+    return order_index.find(JsonStore.get(ORDERS_FILE, dict, 4).load(), order_id)
+
+
+def find_orders(status=None, since=None, until=None):
+    """List orders by status and/or timestamp range, oldest first.
+
+    Returns:
+        list: (user ID, order dict) pairs
+    """
+    return order_index.query(JsonStore.get(ORDERS_FILE, dict, 4).load(), status, since, until)
@@ -1,17 +1,24 @@
 """Module for handling payment attempts and processing."""
 
-import random
 from models.enums import PaymentMethod
+from models.PaymentGateway import payment_pipeline
 
 
 class PaymentAttempt:
     """A class representing a payment attempt for an order."""
 
-    def __init__(self):
-        """Initialize a new payment attempt."""
+    def __init__(self, pipeline=None):
+        """Initialize a new payment attempt.
+
+        Args:
+            pipeline (PaymentPipeline, optional): Pipeline that charges the
+                payment; defaults to the shared one
+        """
         self._payment_method = None
         self._payment_status = "PENDING"
         self._amount_to_pay = 0.0
+        self._pipeline = pipeline or payment_pipeline
+        self._transaction_id = None
 
     @property
     def payment_method(self):
@@ -23,6 +30,11 @@ class PaymentAttempt:
         """Get the current payment status."""
         return self._payment_status
 
+    @property
+    def transaction_id(self):
+        """Get the gateway transaction ID of the last successful payment."""
+        return self._transaction_id
+
     def calculate_total_amount(self, order_items):
         """Calculate total amount from order items.
         
@@ -75,28 +87,34 @@ class PaymentAttempt:
         self._payment_attempt.update_payment_method(method)
         print(f"💳 Payment method updated to {method.value.replace('_', '-')}")
 
-    def process_payment(self, amount):
-        """Simulate payment processing with 80% success rate.
+    def process_payment(self, amount, reference=None, payment_method=None):
+        """Charge the payment through the payment pipeline.
         
         Args:
             amount (float): The amount to process
+            reference (str, optional): Charge reference; retries reuse it
+            payment_method (PaymentMethod, optional): Overrides the selected method
             
         Returns:
             bool: True if payment succeeded, False otherwise
         """
         print("\nProcessing payment...")
         self._amount_to_pay = amount
+        payment_method = payment_method or self._payment_method or PaymentMethod.CREDIT_CARD
+
+        result = self._pipeline.process_sync(payment_method, amount, reference)
         
-        # Simulate payment processing with 80% success rate
-        success = random.choices([True, False], weights=[80, 20])[0]
-        
-        if success:
+        if result["status"] == "PAID":
+            self._transaction_id = result["transactionId"]
             self._update_payment_status("PAID")
             print("✅ Payment successful.")
             return True
         
         self._update_payment_status("FAILED")
-        print("❌ Payment failed.")
+        if result["status"] == "DECLINED":
+            print("❌ Payment declined.")
+        else:
+            print(f"❌ Payment failed: {result['error']}")
         return False
 
     def _update_payment_status(self, status):
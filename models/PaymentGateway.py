@@ -0,0 +1,377 @@
+"""Module for charging payments through a pluggable asynchronous gateway."""
+
+import abc
+import asyncio
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+
+class PaymentGatewayError(Exception):
+    """Raised by a gateway for a transient failure that is worth retrying."""
+
+
+class PaymentDeclined(Exception):
+    """Raised by a gateway when the payment was refused; retrying won't help."""
+
+
+class CircuitOpenError(Exception):
+    """Raised when a payment method's circuit breaker is rejecting calls."""
+
+
+class PaymentGateway(abc.ABC):
+    """Interface for payment gateways used by the payment pipeline."""
+
+    @abc.abstractmethod
+    async def charge(self, payment_method, amount, reference):
+        """Charge an amount and return the gateway's transaction ID.
+
+        Args:
+            payment_method (PaymentMethod): Method selected by the user.
+            amount (float): Amount to charge.
+            reference (str): Caller's reference; charging the same reference
+                twice must not take the money twice.
+
+        Raises:
+            PaymentDeclined: The payment was refused.
+            PaymentGatewayError: A transient failure; the charge did not happen.
+        """
+
+    @abc.abstractmethod
+    async def refund(self, payment_method, amount, reference):
+        """Return money to the payment method and return the gateway's transaction ID.
+
+        Refunding the same reference twice must not pay the money back twice.
+        Raises the same exceptions as charge().
+        """
+
+
+class SimulatedPaymentGateway(PaymentGateway):
+    """A local gateway that behaves like a remote one.
+
+    Every call sleeps for a random latency. Outcomes follow a configurable
+    distribution: most succeed, some are declined, some fail transiently,
+    and some hang until the caller's timeout gives up on them.
+    """
+
+    def __init__(self, latency_range=(0.05, 0.3), decline_rate=0.15, error_rate=0.04,
+                 hang_rate=0.01, hang_seconds=30.0, rng=None):
+        """Initialize the simulator.
+
+        Args:
+            latency_range (tuple): Min and max seconds a call takes.
+            decline_rate (float): Share of calls that are declined.
+            error_rate (float): Share of calls that fail transiently.
+            hang_rate (float): Share of calls that never answer in time.
+            hang_seconds (float): How long a hanging call sleeps.
+            rng (random.Random, optional): Source of randomness, for repeatable runs.
+        """
+        self.latency_range = latency_range
+        self.decline_rate = decline_rate
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self._rng = rng or random.Random()
+        self._charges = {}
+        self._refunds = {}
+        self._lock = threading.Lock()
+
+    async def charge(self, payment_method, amount, reference):
+        return await self._simulate(self._charges, reference)
+
+    async def refund(self, payment_method, amount, reference):
+        return await self._simulate(self._refunds, reference)
+
+    async def _simulate(self, completed, reference):
+        with self._lock:
+            if reference in completed:
+                return completed[reference]
+            roll = self._rng.random()
+            latency = self._rng.uniform(*self.latency_range)
+
+        if roll < self.hang_rate:
+            await asyncio.sleep(self.hang_seconds)
+            raise PaymentGatewayError("Gateway did not respond")
+
+        await asyncio.sleep(latency)
+        roll -= self.hang_rate
+        if roll < self.error_rate:
+            raise PaymentGatewayError("Gateway temporarily unavailable")
+        roll -= self.error_rate
+        if roll < self.decline_rate:
+            raise PaymentDeclined("Payment declined by issuer")
+
+        transaction_id = str(uuid.uuid4())
+        with self._lock:
+            completed[reference] = transaction_id
+        return transaction_id
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency until it has had time to recover.
+
+    After failure_threshold consecutive failures the breaker opens and
+    rejects calls for reset_timeout seconds. It then lets one trial call
+    through; success closes it again, failure reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Return True if a call may go ahead now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                return True
+            # Only one trial call at a time while half open
+            return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_abandoned(self):
+        """Note a call that ended without an answer, e.g. because it was cancelled.
+
+        A trial call that was abandoned says nothing about the dependency,
+        so the breaker goes back to open with its timeout already spent and
+        the next call becomes the new trial.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+
+class PaymentMetrics:
+    """Per-method call counts and recent latencies."""
+
+    def __init__(self, window=1000):
+        self._window = window
+        self._lock = threading.Lock()
+        self._methods = {}
+
+    def record(self, method, outcome, latency):
+        """Record one gateway call.
+
+        Args:
+            method (str): Payment method value.
+            outcome (str): 'paid', 'refunded', 'declined', 'error', 'timeout' or 'rejected'.
+            latency (float): Seconds the call took.
+        """
+        with self._lock:
+            stats = self._methods.setdefault(method, {
+                "counts": {},
+                "latencies": deque(maxlen=self._window)
+            })
+            stats["counts"][outcome] = stats["counts"].get(outcome, 0) + 1
+            if outcome != "rejected":
+                stats["latencies"].append(latency)
+
+    def summary(self):
+        """Return counts and p50/p95/max latency in milliseconds per method"""
+        with self._lock:
+            result = {}
+            for method, stats in self._methods.items():
+                latencies = sorted(stats["latencies"])
+                entry = {"counts": dict(stats["counts"]), "calls": len(latencies)}
+                if latencies:
+                    entry["p50Ms"] = round(latencies[len(latencies) // 2] * 1000, 1)
+                    entry["p95Ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1)
+                    entry["maxMs"] = round(latencies[-1] * 1000, 1)
+                result[method] = entry
+            return result
+
+
+class PaymentPipeline:
+    """Runs payments against a gateway with bounded concurrency.
+
+    At most max_in_flight charges are outstanding at once; synchronous
+    callers all run their payments on one event loop owned by the pipeline,
+    so they share that limit. Each call is
+    capped by a timeout; timeouts and transient gateway errors are retried
+    with jittered exponential backoff under the same reference, while
+    declines are returned straight away. Each payment method has its own
+    circuit breaker so one failing provider doesn't slow down the others.
+    """
+
+    def __init__(self, gateway, max_in_flight=8, timeout_seconds=5.0, max_retries=2,
+                 backoff_base=0.2, backoff_cap=2.0, breaker_factory=CircuitBreaker):
+        """Initialize the pipeline.
+
+        Args:
+            gateway (PaymentGateway): Gateway that performs the charges.
+            max_in_flight (int): Maximum concurrent gateway calls.
+            timeout_seconds (float): Per-call timeout.
+            max_retries (int): Retries after a timeout or transient error.
+            backoff_base (float): First backoff delay in seconds.
+            backoff_cap (float): Largest backoff delay in seconds.
+            breaker_factory (callable): Creates a circuit breaker per method.
+        """
+        self.gateway = gateway
+        self.max_in_flight = max_in_flight
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.metrics = PaymentMetrics()
+        self._breaker_factory = breaker_factory
+        self._breakers = {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def _event_loop(self):
+        # One long-lived loop on a daemon thread serves every synchronous caller
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="payment-loop", daemon=True).start()
+            return self._loop
+
+    def _run_sync(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._event_loop()).result()
+
+    def _semaphore(self):
+        # asyncio primitives belong to one event loop, so keep one per loop
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for known in [l for l in self._semaphores if l.is_closed()]:
+                del self._semaphores[known]
+            if loop not in self._semaphores:
+                self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+            return self._semaphores[loop]
+
+    def breaker(self, method):
+        """Return the circuit breaker for a payment method"""
+        with self._lock:
+            if method not in self._breakers:
+                self._breakers[method] = self._breaker_factory()
+            return self._breakers[method]
+
+    def _backoff(self, attempt):
+        # Full jitter keeps retries from many checkouts from arriving together
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    async def process(self, payment_method, amount, reference=None):
+        """Charge one payment.
+
+        Returns:
+            dict: 'status' is PAID, DECLINED or FAILED, with 'transactionId',
+                'attempts' and 'error' where they apply.
+        """
+        return await self._run("charge", payment_method, amount, reference)
+
+    async def refund(self, payment_method, amount, reference=None):
+        """Reverse a payment back to its method.
+
+        Returns:
+            dict: 'status' is REFUNDED, DECLINED or FAILED, as for process().
+        """
+        return await self._run("refund", payment_method, amount, reference)
+
+    async def _run(self, operation, payment_method, amount, reference):
+        reference = reference or str(uuid.uuid4())
+        method = payment_method.value if hasattr(payment_method, "value") else str(payment_method)
+        gateway_call = getattr(self.gateway, operation)
+        success_status, success_outcome = {
+            "charge": ("PAID", "paid"),
+            "refund": ("REFUNDED", "refunded"),
+        }[operation]
+        metrics_key = method if operation == "charge" else f"{method}:{operation}"
+        breaker = self.breaker(method)
+        semaphore = self._semaphore()
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self._backoff(attempt - 1))
+            if not breaker.allow_request():
+                self.metrics.record(metrics_key, "rejected", 0.0)
+                error = CircuitOpenError(f"{method} payments are temporarily unavailable")
+                break
+
+            await semaphore.acquire()
+            started = time.monotonic()
+            settled = False
+            try:
+                transaction_id = await asyncio.wait_for(
+                    gateway_call(payment_method, amount, reference),
+                    self.timeout_seconds
+                )
+            except PaymentDeclined as e:
+                # The gateway answered, so it is healthy
+                breaker.record_success()
+                settled = True
+                self.metrics.record(metrics_key, "declined", time.monotonic() - started)
+                return {"status": "DECLINED", "reference": reference, "attempts": attempt + 1, "error": str(e)}
+            except asyncio.TimeoutError:
+                breaker.record_failure()
+                settled = True
+                self.metrics.record(metrics_key, "timeout", time.monotonic() - started)
+                error = PaymentGatewayError("Gateway timed out")
+            except PaymentGatewayError as e:
+                breaker.record_failure()
+                settled = True
+                self.metrics.record(metrics_key, "error", time.monotonic() - started)
+                error = e
+            else:
+                breaker.record_success()
+                settled = True
+                self.metrics.record(metrics_key, success_outcome, time.monotonic() - started)
+                return {"status": success_status, "reference": reference, "attempts": attempt + 1,
+                        "transactionId": transaction_id}
+            finally:
+                if not settled:
+                    # Cancelled or an unexpected error; don't leave a trial call outstanding
+                    breaker.record_abandoned()
+                semaphore.release()
+
+        return {"status": "FAILED", "reference": reference, "attempts": attempt + 1, "error": str(error)}
+
+    async def process_many(self, payments):
+        """Charge several payments concurrently.
+
+        Args:
+            payments (list): (payment_method, amount, reference) tuples.
+
+        Returns:
+            list: Results in the same order as payments.
+        """
+        return await asyncio.gather(*(self.process(*payment) for payment in payments))
+
+    async def refund_many(self, refunds):
+        """Reverse several payments concurrently; takes the same tuples as process_many"""
+        return await asyncio.gather(*(self.refund(*refund) for refund in refunds))
+
+    def process_sync(self, payment_method, amount, reference=None):
+        """Charge one payment from synchronous code"""
+        return self._run_sync(self.process(payment_method, amount, reference))
+
+    def refund_many_sync(self, refunds):
+        """Reverse several payments concurrently from synchronous code"""
+        return self._run_sync(self.refund_many(refunds))
+
+
+payment_pipeline = PaymentPipeline(SimulatedPaymentGateway())
@@ -1,57 +1,506 @@
+import heapq
 import json
 import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from models.enums import NotificationType, PointsTransactionType
+from utils.file_lock import FileLock
+
+LEDGER_FILE = 'data/points_ledger.json'
+TRANSACTIONS_FILE = 'data/points_transactions.jsonl'
+SNAPSHOT_INTERVAL = 100
+RESERVATION_TTL = 15 * 60  # seconds a checkout may hold points before paying
+POINTS_VALIDITY = timedelta(days=365)
+
 
 class PointsLedger:
-    def __init__(self, ledger_file='data/points_ledger.json'):
+    """Loyalty points kept as an append-only transaction log.
+
+    Every change is one JSON line appended to the transaction log; balances
+    are materialized in memory by replaying the log. The ledger file holds a
+    periodic snapshot of the balances plus the log offset it covers, so
+    startup only replays entries written after the last snapshot.
+
+    Points redeemed at checkout are first reserved, then committed once the
+    payment succeeds or released if it fails. Checking the available balance
+    and appending to the log happen under one file lock, so two sessions can
+    never spend the same points.
+
+    Each grant of points is a lot with its own expiry date. Redemptions and
+    expiries consume a user's lots oldest first, and a min-heap ordered by
+    expiry date lets the daily expiry run visit only the lots that are due.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, ledger_file=LEDGER_FILE, transactions_file=TRANSACTIONS_FILE):
         self.ledger_file = ledger_file
-        self.ledger = self.load_ledger()
+        self.transactions_file = transactions_file
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(transactions_file)
+        self._log_offset = 0
+        self._entries_since_snapshot = 0
+        self._needs_snapshot = False
+        self._reservations = {}
+        self._held_by_user = {}
+        self._reservation_expiry = []
+        self._lots = {}
+        self._lots_by_id = {}
+        self._lot_expiry = []
+        self._last_expiry_run = None
+        with self._file_lock:
+            self.ledger = self.load_ledger()
+            self._catch_up()
+        if self._needs_snapshot:
+            self.save_ledger()
+
+    @classmethod
+    def shared(cls, ledger_file=LEDGER_FILE, transactions_file=TRANSACTIONS_FILE):
+        """Return the process-wide ledger for the given files"""
+        key = (ledger_file, transactions_file)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(ledger_file, transactions_file)
+            return cls._instances[key]
 
     def load_ledger(self):
+        """Load the latest snapshot of balances and open reservations."""
         if not os.path.exists(self.ledger_file):
             return {}
         with open(self.ledger_file, 'r') as file:
             try:
-                return json.load(file)
+                snapshot = json.load(file)
             except json.JSONDecodeError:
                 return {}
 
+        if "balances" in snapshot and "logOffset" in snapshot:
+            self._log_offset = snapshot["logOffset"]
+            self._last_expiry_run = snapshot.get("lastExpiryRun")
+            for reservation_id, hold in snapshot.get("reservations", {}).items():
+                self._add_hold(reservation_id, hold)
+            if "lots" in snapshot:
+                for user_id_str, lots in snapshot["lots"].items():
+                    for lot_id, remaining, expires_at in lots:
+                        self._add_lot(user_id_str, lot_id, remaining, expires_at)
+            else:
+                # Snapshot written before lots were tracked: one non-expiring lot per user
+                for user_id_str, balance in snapshot["balances"].items():
+                    self._add_lot(user_id_str, f"snapshot-{user_id_str}", balance, None)
+            return snapshot["balances"]
+
+        # Pre-log ledger format: a flat {userID: balance} map. Carry the
+        # balances into the log as opening entries so history is complete.
+        self._needs_snapshot = True
+        if not os.path.exists(self.transactions_file) or os.path.getsize(self.transactions_file) == 0:
+            for user_id_str, balance in snapshot.items():
+                if balance:
+                    self._append_entry(
+                        user_id_str, PointsTransactionType.OPENING, int(balance),
+                        lotExpiresAt=self._lot_expiry_date()
+                    )
+        return {}
+
     def save_ledger(self):
-        with open(self.ledger_file, 'w') as file:
-            json.dump(self.ledger, file, indent=4)
+        """Write a snapshot of the materialized balances."""
+        with self._lock:
+            snapshot = {
+                "logOffset": self._log_offset,
+                "snapshotTime": datetime.now().isoformat(),
+                "balances": self.ledger,
+                "reservations": self._reservations,
+                "lots": {
+                    user_id_str: [list(lot) for lot in lots]
+                    for user_id_str, lots in self._lots.items() if lots
+                },
+                "lastExpiryRun": self._last_expiry_run
+            }
+            tmp_file = f"{self.ledger_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w') as file:
+                json.dump(snapshot, file, indent=4)
+            os.replace(tmp_file, self.ledger_file)
+            self._entries_since_snapshot = 0
+
+    def _append_entry(self, user_id_str, entry_type, points, reference_type=None, reference_id=None,
+                      entry_id=None, **extra):
+        """Append one transaction to the log and return it."""
+        entry = {
+            "entryId": entry_id or str(uuid.uuid4()),
+            "userId": user_id_str,
+            "type": entry_type.value,
+            "points": points,
+            "referenceType": reference_type,
+            "referenceId": reference_id,
+            "timestamp": datetime.now().isoformat()
+        }
+        entry.update(extra)
+        with open(self.transactions_file, 'a') as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        return entry
+
+    def _lot_expiry_date(self, granted_at=None):
+        return ((granted_at or datetime.now()) + POINTS_VALIDITY).isoformat()
+
+    def _add_lot(self, user_id_str, lot_id, points, expires_at):
+        if points <= 0:
+            return
+        lot = [lot_id, points, expires_at]
+        self._lots.setdefault(user_id_str, deque()).append(lot)
+        self._lots_by_id[lot_id] = (user_id_str, lot)
+        if expires_at:
+            heapq.heappush(self._lot_expiry, (expires_at, lot_id))
+
+    def _consume_lots(self, user_id_str, points, lot_id=None):
+        """Take points from a specific lot, or from the user's oldest lots."""
+        if lot_id:
+            _, lot = self._lots_by_id.get(lot_id, (None, None))
+            if lot:
+                lot[1] -= min(points, lot[1])
+            points = 0
+
+        lots = self._lots.get(user_id_str)
+        while lots and points > 0:
+            taken = min(points, lots[0][1])
+            lots[0][1] -= taken
+            points -= taken
+            if lots[0][1] <= 0:
+                self._lots_by_id.pop(lots.popleft()[0], None)
+
+        # Drop lots emptied by a targeted expiry from the front of the queue
+        while lots and lots[0][1] <= 0:
+            self._lots_by_id.pop(lots.popleft()[0], None)
+
+    def _add_hold(self, reservation_id, hold):
+        self._reservations[reservation_id] = hold
+        user_id_str = hold["userId"]
+        self._held_by_user[user_id_str] = self._held_by_user.get(user_id_str, 0) + hold["points"]
+        heapq.heappush(self._reservation_expiry, (hold["expiresAt"], reservation_id))
+
+    def _drop_hold(self, reservation_id):
+        hold = self._reservations.pop(reservation_id, None)
+        if hold:
+            user_id_str = hold["userId"]
+            self._held_by_user[user_id_str] -= hold["points"]
+            if self._held_by_user[user_id_str] <= 0:
+                del self._held_by_user[user_id_str]
+        return hold
+
+    def _expire_holds(self, now=None):
+        """Drop reservations whose time-to-live has passed.
+
+        Expiry is derived from the expiresAt stamp in the log, so every
+        process reaches the same answer without writing a release entry.
+        """
+        now = time.time() if now is None else now
+        while self._reservation_expiry and self._reservation_expiry[0][0] <= now:
+            _, reservation_id = heapq.heappop(self._reservation_expiry)
+            self._drop_hold(reservation_id)
+
+    def _apply(self, entry):
+        """Fold one log entry into the in-memory balances and holds."""
+        user_id_str = entry["userId"]
+        entry_type = entry["type"]
+        reservation_id = entry.get("reservationId")
+
+        if entry_type == PointsTransactionType.RESERVE.value:
+            self._add_hold(reservation_id, {
+                "userId": user_id_str,
+                "points": entry["heldPoints"],
+                "expiresAt": entry["expiresAt"],
+                "referenceId": entry.get("referenceId")
+            })
+            return
+        if entry_type == PointsTransactionType.RELEASE.value:
+            self._drop_hold(reservation_id)
+            return
+        if reservation_id:
+            self._drop_hold(reservation_id)
+        self.ledger[user_id_str] = self.ledger.get(user_id_str, 0) + entry["points"]
+        if entry["points"] > 0:
+            self._add_lot(user_id_str, entry["entryId"], entry["points"], entry.get("lotExpiresAt"))
+        elif entry["points"] < 0:
+            self._consume_lots(user_id_str, -entry["points"], entry.get("lotId"))
+
+    def _catch_up(self):
+        """Apply any entries appended to the log since our last read."""
+        with self._lock:
+            if not os.path.exists(self.transactions_file):
+                return
+            if os.path.getsize(self.transactions_file) == self._log_offset:
+                return
+            with open(self.transactions_file, 'rb') as file:
+                file.seek(self._log_offset)
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        break  # Partially written line; pick it up next time
+                    self._log_offset += len(line)
+                    if line.strip():
+                        self._apply(json.loads(line))
+                        self._entries_since_snapshot += 1
+            if self._entries_since_snapshot >= SNAPSHOT_INTERVAL:
+                self.save_ledger()
+
+    def _record(self, userID, entry_type, points, reference_type=None, reference_id=None, entry_id=None, **extra):
+        entry = self._append_entry(
+            str(userID), entry_type, points, reference_type, reference_id, entry_id, **extra
+        )
+        self._catch_up()
+        return entry
+
+    def _available(self, user_id_str):
+        self._expire_holds()
+        return self.ledger.get(user_id_str, 0) - self._held_by_user.get(user_id_str, 0)
 
     def get_points(self, userID):
+        self._catch_up()
         return self.ledger.get(str(userID), 0)
 
-    def earn_points(self, userID, points_to_earn):
-        """Add points to user's balance (1 point per RM10 spent)"""
+    def get_available_points(self, userID):
+        """Return the balance minus points held by unpaid checkouts"""
+        with self._lock:
+            self._catch_up()
+            return self._available(str(userID))
+
+    def earn_points(self, userID, points_to_earn, reference_type="order", reference_id=None,
+                    entry_type=PointsTransactionType.EARN, entry_id=None, quiet=False):
+        """Add points to user's balance (1 point per RM10 spent); quiet skips the console message"""
         try:
             user_id_str = str(userID)
             points = int(points_to_earn)  # Ensure we're working with integers
-            
+
             if points <= 0:
                 return 0
-                
-            current_points = self.ledger.get(user_id_str, 0)
-            new_balance = current_points + points
-            self.ledger[user_id_str] = new_balance
-            self.save_ledger()
-            
-            print(f"⭐ Points updated: +{points} (New balance: {new_balance})")
+
+            with self._lock, self._file_lock:
+                self._record(
+                    user_id_str, entry_type, points, reference_type, reference_id, entry_id,
+                    lotExpiresAt=self._lot_expiry_date()
+                )
+                new_balance = self.ledger.get(user_id_str, 0)
+
+            if not quiet:
+                print(f"⭐ Points updated: +{points} (New balance: {new_balance})")
             return points
-            
+
         except Exception as e:
+            if quiet:
+                raise
             print(f"❌ Error updating points: {str(e)}")
             return 0
-        
-    def deduct_points(self, userID, amount_to_deduct):
-        user_id_str = str(userID)
-        current_points = self.ledger.get(user_id_str, 0)
 
-        if current_points < amount_to_deduct:
-            print("❌ Not enough points to deduct.")
-            return False
+    def refund_points(self, userID, points_to_refund, reference_type="booking", reference_id=None,
+                      entry_id=None, quiet=False):
+        """Credit points back to a user for a cancelled order or booking"""
+        return self.earn_points(
+            userID, points_to_refund, reference_type, reference_id,
+            entry_type=PointsTransactionType.REFUND, entry_id=entry_id, quiet=quiet
+        )
 
-        self.ledger[user_id_str] = current_points - int(amount_to_deduct)
-        self.save_ledger()
+    def deduct_points(self, userID, amount_to_deduct, reference_type="order", reference_id=None,
+                      entry_type=PointsTransactionType.REDEEM, entry_id=None):
+        user_id_str = str(userID)
+        with self._lock, self._file_lock:
+            # Compare and append under the file lock so no other writer can
+            # spend the same points between the check and the write
+            self._catch_up()
+            if self._available(user_id_str) < amount_to_deduct:
+                print("❌ Not enough points to deduct.")
+                return False
+
+            self._record(
+                user_id_str, entry_type, -int(amount_to_deduct), reference_type, reference_id, entry_id
+            )
         print(f"🔻 Deducted {int(amount_to_deduct)} points from user {user_id_str}.")
-        return True
\ No newline at end of file
+        return True
+
+    def expire_points(self, userID, points_to_expire, reference_type=None, reference_id=None):
+        """Remove expired points from a user's balance"""
+        return self.deduct_points(
+            userID, points_to_expire, reference_type, reference_id,
+            entry_type=PointsTransactionType.EXPIRE
+        )
+
+    def reserve_points(self, userID, amount_to_reserve, order_id, ttl_seconds=RESERVATION_TTL):
+        """Hold points for an order until its payment completes.
+
+        Args:
+            userID (str): ID of the user redeeming points.
+            amount_to_reserve (int|float): Points to hold.
+            order_id (str): Order the points are held for.
+            ttl_seconds (int): Seconds before an unpaid hold lapses.
+
+        Returns:
+            str: Reservation ID, or None if not enough points are available.
+        """
+        user_id_str = str(userID)
+        points = int(amount_to_reserve)
+        if points <= 0:
+            return None
+
+        with self._lock, self._file_lock:
+            self._catch_up()
+            if self._available(user_id_str) < points:
+                print("❌ Not enough points available to reserve.")
+                return None
+
+            reservation_id = str(uuid.uuid4())
+            self._record(
+                user_id_str, PointsTransactionType.RESERVE, 0, "order", order_id,
+                reservationId=reservation_id,
+                heldPoints=points,
+                expiresAt=time.time() + ttl_seconds
+            )
+        print(f"🔒 Reserved {points} points for order {order_id}.")
+        return reservation_id
+
+    def commit_reservation(self, reservation_id, entry_id=None):
+        """Turn a held reservation into a redemption.
+
+        Returns:
+            bool: False if the reservation was released or has expired.
+        """
+        with self._lock, self._file_lock:
+            self._catch_up()
+            self._expire_holds()
+            hold = self._reservations.get(reservation_id)
+            if not hold:
+                print("❌ Points reservation has expired.")
+                return False
+
+            self._record(
+                hold["userId"], PointsTransactionType.REDEEM, -hold["points"],
+                "order", hold.get("referenceId"), entry_id,
+                reservationId=reservation_id
+            )
+        print(f"🔻 Deducted {hold['points']} points from user {hold['userId']}.")
+        return True
+
+    def release_reservation(self, reservation_id):
+        """Give held points back to the available balance.
+
+        Returns:
+            bool: True if the reservation was still held.
+        """
+        with self._lock, self._file_lock:
+            self._catch_up()
+            self._expire_holds()
+            hold = self._reservations.get(reservation_id)
+            if not hold:
+                return False
+
+            self._record(
+                hold["userId"], PointsTransactionType.RELEASE, 0,
+                "order", hold.get("referenceId"),
+                reservationId=reservation_id
+            )
+        print(f"🔓 Released {hold['points']} reserved points.")
+        return True
+
+    def get_expiring_points(self, userID):
+        """Return (points, expiry ISO string) of the user's next expiring lot, or None"""
+        with self._lock:
+            self._catch_up()
+            for _, remaining, expires_at in self._lots.get(str(userID), ()):
+                if remaining > 0 and expires_at:
+                    return remaining, expires_at
+            return None
+
+    def run_expiry(self, now=None):
+        """Expire every lot whose expiry date has passed.
+
+        Only lots at the top of the expiry heap are visited, so the cost is
+        O(expiring lots * log n) rather than a scan of every member.
+
+        Returns:
+            dict: Points expired per user ID.
+        """
+        now_str = (now or datetime.now()).isoformat()
+        expired_by_user = {}
+
+        with self._lock, self._file_lock:
+            self._catch_up()
+            self._expire_holds()
+            deferred = []
+            while self._lot_expiry and self._lot_expiry[0][0] <= now_str:
+                expires_at, lot_id = heapq.heappop(self._lot_expiry)
+                user_id_str, lot = self._lots_by_id.get(lot_id, (None, None))
+                if not lot or lot[1] <= 0:
+                    continue
+
+                # Points held by an unpaid checkout are left for that checkout
+                expirable = min(lot[1], self._available(user_id_str))
+                if expirable < lot[1]:
+                    deferred.append((expires_at, lot_id))
+                if expirable <= 0:
+                    continue
+
+                self._record(
+                    user_id_str, PointsTransactionType.EXPIRE, -expirable,
+                    "lot", lot_id, lotId=lot_id
+                )
+                expired_by_user[user_id_str] = expired_by_user.get(user_id_str, 0) + expirable
+
+            for item in deferred:
+                heapq.heappush(self._lot_expiry, item)
+            self._last_expiry_run = now_str[:10]
+            self.save_ledger()
+
+        if expired_by_user:
+            from models.Notification import Notification
+            Notification().create_notifications([
+                (
+                    f"{points} loyalty points have expired. "
+                    f"New balance: {self.ledger.get(user_id_str, 0)}",
+                    NotificationType.POINTS_UPDATE,
+                    "user",
+                    user_id_str
+                )
+                for user_id_str, points in expired_by_user.items()
+            ])
+        return expired_by_user
+
+    def run_daily_expiry(self):
+        """Run the expiry job at most once per calendar day"""
+        with self._lock:
+            self._catch_up()
+            if self._last_expiry_run == datetime.now().date().isoformat():
+                return {}
+        return self.run_expiry()
+
+    def log_size(self):
+        """Return the current size of the transaction log in bytes"""
+        if not os.path.exists(self.transactions_file):
+            return 0
+        return os.path.getsize(self.transactions_file)
+
+    def entry_ids_since(self, offset):
+        """Return the IDs of entries written at or after a log offset"""
+        entry_ids = set()
+        if not os.path.exists(self.transactions_file):
+            return entry_ids
+        with open(self.transactions_file, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                if line.endswith(b"\n") and line.strip():
+                    entry_ids.add(json.loads(line)["entryId"])
+        return entry_ids
+
+    def get_history(self, userID):
+        """Return every transaction for a user, oldest first"""
+        user_id_str = str(userID)
+        if not os.path.exists(self.transactions_file):
+            return []
+        history = []
+        with open(self.transactions_file, 'r') as file:
+            for line in file:
+                if not line.endswith("\n") or not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["userId"] == user_id_str:
+                    history.append(entry)
+        return history
@@ -0,0 +1,142 @@
+"""Module for in-memory token-bucket rate limiting of login attempts."""
+
+import atexit
+import threading
+import time
+from utils.json_handler import load_json, save_json
+
+RATE_LIMITS_FILE = "data/rate_limits.json"
+
+
+class TokenBucketLimiter:
+    """A set of token buckets keyed by an arbitrary string.
+
+    Buckets live in memory and are only written to disk every
+    persist_interval seconds, so a check never waits on file I/O.
+    """
+
+    def __init__(self, capacity, refill_per_second, state=None):
+        """Initialize the limiter.
+
+        Args:
+            capacity (int): Maximum burst size of each bucket.
+            refill_per_second (float): Tokens added back per second.
+            state (dict, optional): Previously persisted buckets.
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._buckets = {}
+        for key, bucket in (state or {}).items():
+            self._buckets[key] = [float(bucket["tokens"]), float(bucket["updated"])]
+
+    def _refill(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(self.capacity), now]
+            self._buckets[key] = bucket
+            return bucket
+        elapsed = max(0.0, now - bucket[1])
+        bucket[0] = min(self.capacity, bucket[0] + elapsed * self.refill_per_second)
+        bucket[1] = now
+        return bucket
+
+    def peek(self, key, now=None):
+        """Return seconds until a token is available for key (0 if one is)."""
+        now = time.time() if now is None else now
+        bucket = self._refill(key, now)
+        if bucket[0] >= 1:
+            return 0
+        return (1 - bucket[0]) / self.refill_per_second
+
+    def consume(self, key, now=None):
+        """Take one token from key's bucket.
+
+        Returns:
+            bool: True if a token was available.
+        """
+        now = time.time() if now is None else now
+        bucket = self._refill(key, now)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        return False
+
+    def export_state(self, now=None):
+        """Return the buckets that are not full, ready to be persisted."""
+        now = time.time() if now is None else now
+        state = {}
+        for key in list(self._buckets):
+            tokens, _ = self._refill(key, now)
+            if tokens < self.capacity:
+                state[key] = {"tokens": round(tokens, 3), "updated": now}
+            else:
+                # A full bucket is the same as no bucket
+                del self._buckets[key]
+        return state
+
+
+class LoginRateLimiter:
+    """Per-IP and per-email token buckets evaluated before authentication."""
+
+    def __init__(self, state_file=RATE_LIMITS_FILE, persist_interval=30):
+        """Initialize the limiter from its persisted state."""
+        self.state_file = state_file
+        self.persist_interval = persist_interval
+        self._lock = threading.Lock()
+
+        state = load_json(state_file)
+        if not isinstance(state, dict):
+            state = {}
+        # 20 attempts per IP burst, refilled at 1 every 3 seconds
+        self.ip_limiter = TokenBucketLimiter(20, 1 / 3, state.get("ip"))
+        # 5 attempts per account burst, refilled at 1 per minute
+        self.email_limiter = TokenBucketLimiter(5, 1 / 60, state.get("email"))
+        self._last_persist = time.monotonic()
+        self._dirty = False
+
+    def check(self, ip_address, email):
+        """Consume a login token for both the IP and the email.
+
+        Args:
+            ip_address (str): Client IP address.
+            email (str): Account email being tried.
+
+        Returns:
+            tuple: (allowed: bool, retry_after_seconds: int)
+        """
+        now = time.time()
+        with self._lock:
+            # Check both before consuming so a rejection doesn't drain the other bucket
+            wait = max(
+                self.ip_limiter.peek(ip_address, now),
+                self.email_limiter.peek(email, now)
+            )
+            if wait > 0:
+                return False, int(wait) + 1
+
+            self.ip_limiter.consume(ip_address, now)
+            self.email_limiter.consume(email, now)
+            self._dirty = True
+            persist_due = time.monotonic() - self._last_persist >= self.persist_interval
+
+        if persist_due:
+            self.persist()
+        return True, 0
+
+    def persist(self):
+        """Write the non-full buckets to the state file."""
+        with self._lock:
+            if not self._dirty:
+                return
+            state = {
+                "ip": self.ip_limiter.export_state(),
+                "email": self.email_limiter.export_state()
+            }
+            self._dirty = False
+            self._last_persist = time.monotonic()
+        save_json(self.state_file, state)
+
+
+login_rate_limiter = LoginRateLimiter()
+
+atexit.register(login_rate_limiter.persist)
@@ -1,9 +1,19 @@
 """Module for generating order receipts."""
 
-import json
-import os
 from datetime import datetime
 import uuid
+from models.BookingStore import resolve_trip_bookings
+from models.ReceiptStore import ReceiptStore
+from models.RouteMap import RouteMap
+
+PAYMENT_DISPLAY_NAMES = {
+    "CREDIT_CARD": "Credit Card",
+    "DEBIT_CARD": "Debit Card",
+    "PAYPAL": "PayPal",
+    "BANK_TRANSFER": "Bank Transfer",
+    "CASH_ON_DELIVERY": "Cash On Delivery",
+    "E_WALLET": "E-Wallet"
+}
 
 class Receipt:
     """A class to handle receipt generation for orders."""
@@ -12,10 +22,10 @@ class Receipt:
         """Initialize the Receipt with an order.
         
         Args:
-            order (Order): The order to generate receipt for
+            order (Order): The order to generate receipt for, or None to
+                render stored receipts
         """
         self.order = order
-        self.receipts_file = "data/receipts.json"
 
     def request_view_order_details(self):
         """Request order details from the associated order.
@@ -26,23 +36,8 @@ class Receipt:
         return self.order.view_order_details()
 
     def _save_receipt(self, receipt_data):
-        """Save receipt data to receipts.json"""
-        try:
-            # Load existing receipts
-            if os.path.exists(self.receipts_file):
-                with open(self.receipts_file, 'r') as f:
-                    receipts = json.load(f)
-            else:
-                receipts = []
-            
-            # Add new receipt
-            receipts.append(receipt_data)
-            
-            # Save back to file
-            with open(self.receipts_file, 'w') as f:
-                json.dump(receipts, f, indent=4)
-        except Exception as e:
-            print(f"⚠️ Could not save receipt: {str(e)}")
+        """Append receipt data to the receipt store"""
+        ReceiptStore.shared().append(receipt_data)
 
     def _format_trip_details(self, trip_bookings):
         """Format trip booking details for receipt"""
@@ -56,23 +51,18 @@ class Receipt:
         ticket_count = booking.get('ticketCount', 0)
         departure_time = booking.get('departureTime', 'Unknown')
         
-        # Try to get route information (you'll need to implement this in TripBooking)
+        # Route metadata is cached, so reprints don't re-read stations or routes
         route_info = ""
-        try:
-            from models.TripBooking import TripBooking
-            tb = TripBooking()
-            connection = tb.validate_connection(from_station, to_station)
-            if connection:
-                if connection["type"] == "direct":
-                    route_info = f"ℹ️ Direct trip on {connection['route_name']} route\n"
-                else:
-                    route_info = (
-                        f"ℹ️ Interchange trip:\n"
-                        f"  - First leg: {connection['from_route_name']} route\n"
-                        f"  - Second leg: {connection['to_route_name']} route\n"
-                    )
-        except:
-            pass
+        connection = RouteMap.shared().connection(from_station, to_station)
+        if connection:
+            if connection["type"] == "direct":
+                route_info = f"ℹ️ Direct trip on {connection['route_name']} route\n"
+            else:
+                route_info = (
+                    f"ℹ️ Interchange trip:\n"
+                    f"  - First leg: {connection['from_route_name']} route\n"
+                    f"  - Second leg: {connection['to_route_name']} route\n"
+                )
             
         return (
             f"{route_info}"
@@ -83,18 +73,20 @@ class Receipt:
         )
 
     def generate_receipt(self):
-        """Generate and print a formatted receipt for the order."""
-        order_details = self.request_view_order_details()
+        """Generate, print and save a formatted receipt for the order."""
+        receipt_data = self.build_receipt_data()
+        self.print_receipt(receipt_data)
+
+        # Save the receipt
+        self._save_receipt(receipt_data)
+
+    def build_receipt_data(self):
+        """Build the receipt record for the order without printing or saving it.
         
-        # Create a mapping of payment method values to display names
-        payment_display_names = {
-            "CREDIT_CARD": "Credit Card",
-            "DEBIT_CARD": "Debit Card",
-            "PAYPAL": "PayPal",
-            "BANK_TRANSFER": "Bank Transfer",
-            "CASH_ON_DELIVERY": "Cash On Delivery",
-            "E_WALLET": "E-Wallet"
-        }
+        Returns:
+            dict: The receipt record
+        """
+        order_details = self.request_view_order_details()
 
         # Prepare receipt data for saving
         receipt_data = {
@@ -103,7 +95,8 @@ class Receipt:
             "user_id": order_details['user_id'],
             "timestamp": datetime.now().isoformat(),
             "items": [],
-            "trip_bookings": order_details.get('trip_bookings', []),
+            # Resolved from tripbookings.json when printed, so the status is never stale
+            "trip_booking_ids": [booking["tripBookingId"] for booking in order_details.get('trip_bookings', [])],
             "total_amount": order_details['total_amount'],
             "final_amount": order_details['final_amount'],
             "payment_method": order_details['payment_method'].value if hasattr(order_details['payment_method'], 'value') else order_details['payment_method'],
@@ -112,14 +105,8 @@ class Receipt:
             "points_redeemed": order_details.get('points_redeemed', 0)
         }
 
-        print("\n🧾 --- Receipt ---")
-        print(f"Order ID: {order_details['order_id']}")
-        print(f"User ID: {order_details['user_id']}")
-        
         # Handle trip bookings
         if order_details.get('trip_bookings'):
-            print("\nTrip Details:")
-            print(self._format_trip_details(order_details['trip_bookings']))
             # Add trip bookings to receipt data
             for booking in order_details['trip_bookings']:
                 receipt_data['items'].append({
@@ -131,10 +118,8 @@ class Receipt:
                 })
         # Handle merchandise
         elif order_details.get('items'):
-            print("\nItems:")
             for item, quantity in order_details["items"].items():
                 price = order_details["merchandise_prices"].get(item, 0)
-                print(f"- {item} x {quantity} @ RM{price:.2f} each")
                 receipt_data['items'].append({
                     'type': 'merchandise',
                     'description': item,
@@ -142,24 +127,56 @@ class Receipt:
                     'price': price,
                     'total': quantity * price
                 })
+
+        return receipt_data
+
+    def render_receipt(self, receipt_data):
+        """Format a receipt record as text.
+        
+        Args:
+            receipt_data (dict): Record built by build_receipt_data
+            
+        Returns:
+            str: The receipt text
+        """
+        lines = ["", "🧾 --- Receipt ---"]
+        lines.append(f"Order ID: {receipt_data['order_id']}")
+        lines.append(f"User ID: {receipt_data['user_id']}")
         
-        print(f"\nTotal Amount: RM{order_details['total_amount']:.2f}")
-        print(f"Points Redeemed: {order_details.get('points_redeemed', 0):.1f}")
-        print(f"Final Amount: RM{order_details['final_amount']:.2f}")
+        # Handle trip bookings
+        trip_bookings = resolve_trip_bookings(receipt_data)
+        if not trip_bookings and receipt_data.get('trip_booking_ids') and self.order is not None:
+            # Receipt printed before the order's bookings were saved
+            trip_bookings = self.request_view_order_details().get('trip_bookings', [])
+        if trip_bookings:
+            lines.append("\nTrip Details:")
+            lines.append(self._format_trip_details(trip_bookings))
+        # Handle merchandise
+        elif receipt_data.get('items'):
+            lines.append("\nItems:")
+            for item in receipt_data['items']:
+                lines.append(f"- {item['description']} x {item['quantity']} @ RM{item['price']:.2f} each")
+        
+        lines.append(f"\nTotal Amount: RM{receipt_data['total_amount']:.2f}")
+        lines.append(f"Points Redeemed: {receipt_data.get('points_redeemed', 0):.1f}")
+        lines.append(f"Final Amount: RM{receipt_data['final_amount']:.2f}")
         
         # Handle payment method display
-        payment_method = order_details['payment_method']
+        payment_method = receipt_data['payment_method']
         if payment_method:
-            if isinstance(payment_method, str):
-                print(f"Payment Method: {payment_display_names.get(payment_method, payment_method)}")
-            elif hasattr(payment_method, 'value'):
-                print(f"Payment Method: {payment_display_names.get(payment_method.value, payment_method.value)}")
+            lines.append(f"Payment Method: {PAYMENT_DISPLAY_NAMES.get(payment_method, payment_method)}")
         else:
-            print("Payment Method: Not specified")
+            lines.append("Payment Method: Not specified")
             
-        print(f"Payment Status: {order_details['payment_status']}")
-        print(f"Order Status: {order_details['order_status']}")
-        print("--------------------\n")
+        lines.append(f"Payment Status: {receipt_data['payment_status']}")
+        lines.append(f"Order Status: {receipt_data['order_status']}")
+        lines.append("--------------------\n")
+        return "\n".join(lines)
 
-        # Save the receipt
-        self._save_receipt(receipt_data)
\ No newline at end of file
+    def print_receipt(self, receipt_data):
+        """Print a formatted receipt from a receipt record.
+        
+        Args:
+            receipt_data (dict): Record built by build_receipt_data
+        """
+        print(self.render_receipt(receipt_data))
@@ -0,0 +1,194 @@
+"""Module for storing receipts as an append-only log with lookup indexes."""
+
+import json
+import os
+import threading
+from utils.file_lock import FileLock
+from utils.json_store import JsonStore
+from utils.json_stream import iter_items
+
+RECEIPTS_LOG = "data/receipts.jsonl"
+LEGACY_RECEIPTS_FILE = "data/receipts.json"
+
+
+class ReceiptStore:
+    """Receipts kept one compact JSON line each, indexed by receipt, order and user.
+
+    Appending a receipt writes its line to the log and one short line to a
+    sidecar index ('<receipt_id> <order_id> <user_id> <offset> <length>'),
+    so nothing already stored is rewritten. A lookup reads the index once
+    per process, then seeks straight to the records it needs. Index lines
+    written by other processes are picked up from where the last read
+    stopped, and log lines whose index line was lost in a crash are
+    re-indexed from the log.
+
+    Receipts still in the old receipts.json are found there until they are
+    imported with 'python -m utils.migrations import-receipts'.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, log_file=RECEIPTS_LOG, legacy_file=LEGACY_RECEIPTS_FILE):
+        """Initialize the store.
+
+        Args:
+            log_file (str): JSON lines file holding the receipts.
+            legacy_file (str): Old receipts.json consulted for receipts not in the log.
+        """
+        self.log_file = log_file
+        self.index_file = f"{os.path.splitext(log_file)[0]}.idx"
+        self.legacy_file = legacy_file
+        self._lock = FileLock(log_file)
+        self._index_pos = 0
+        self._indexed_end = 0
+        self._by_id = {}
+        self._by_order = {}
+        self._by_user = {}
+        self._legacy = None
+        self._legacy_by_order = {}
+        self._legacy_by_user = {}
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide receipt store"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _remember(self, receipt_id, order_id, user_id, offset, length):
+        location = (offset, length)
+        self._by_id[receipt_id] = location
+        self._by_order.setdefault(order_id, []).append(location)
+        self._by_user.setdefault(user_id, []).append(location)
+        self._indexed_end = max(self._indexed_end, offset + length)
+
+    def _catch_up(self):
+        """Read index lines added since the last call and index any log lines they miss"""
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "r") as f:
+                f.seek(self._index_pos)
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    self._index_pos += len(line.encode())
+                    receipt_id, order_id, user_id, offset, length = line.split()
+                    self._remember(receipt_id, order_id, user_id, int(offset), int(length))
+
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > self._indexed_end:
+            missing = []
+            with open(self.log_file, "rb") as f:
+                f.seek(self._indexed_end)
+                offset = self._indexed_end
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    record = json.loads(line)
+                    missing.append((record["receipt_id"], record["order_id"], record["user_id"], offset, len(line)))
+                    offset += len(line)
+            if missing:
+                self._write_index(missing)
+
+    def _write_index(self, entries):
+        lines = "".join(f"{' '.join(str(value) for value in entry)}\n" for entry in entries)
+        with open(self.index_file, "a") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._index_pos += len(lines.encode())
+        for entry in entries:
+            self._remember(*entry)
+
+    def append(self, record):
+        """Store a receipt unless one with its receipt_id is already stored.
+
+        Returns:
+            bool: True if the receipt was added.
+        """
+        with self._lock:
+            self._catch_up()
+            if record["receipt_id"] in self._by_id:
+                return False
+            line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+            if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > self._indexed_end:
+                # Half a line left by a crashed append; it was never committed
+                os.truncate(self.log_file, self._indexed_end)
+            with open(self.log_file, "ab") as f:
+                offset = f.tell()
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._write_index([(record["receipt_id"], record["order_id"], record["user_id"], offset, len(line))])
+            return True
+
+    def _read(self, locations):
+        records = []
+        with open(self.log_file, "rb") as f:
+            for offset, length in locations:
+                f.seek(offset)
+                records.append(json.loads(f.read(length)))
+        return records
+
+    def _lookup(self, index, key):
+        with self._lock:
+            self._catch_up()
+            locations = list(index.get(key, []))
+        return self._read(locations) if locations else []
+
+    def get(self, receipt_id):
+        """Return a receipt by its ID, or None"""
+        with self._lock:
+            self._catch_up()
+            location = self._by_id.get(receipt_id)
+        if location is None:
+            return next((r for r in self._legacy_receipts() if r.get("receipt_id") == receipt_id), None)
+        return self._read([location])[0]
+
+    def for_order(self, order_id):
+        """Return the latest receipt of an order, or None"""
+        receipts = self._lookup(self._by_order, order_id)
+        if receipts:
+            return receipts[-1]
+        self._legacy_receipts()
+        return self._legacy_by_order.get(order_id)
+
+    def for_user(self, user_id):
+        """Return a user's receipts, newest first"""
+        receipts = self._lookup(self._by_user, str(user_id))
+        stored = {receipt["receipt_id"] for receipt in receipts}
+        self._legacy_receipts()
+        older = [r for r in self._legacy_by_user.get(str(user_id), []) if r["receipt_id"] not in stored]
+        return list(reversed(older + receipts))
+
+    def iter_receipts(self):
+        """Yield every receipt, oldest first, reading one record at a time"""
+        with self._lock:
+            self._catch_up()
+            end = self._indexed_end
+        if os.path.exists(self.legacy_file):
+            for receipt in iter_items(self.legacy_file):
+                # Skip receipts an interrupted import already copied to the log
+                if receipt.get("receipt_id") not in self._by_id:
+                    yield receipt
+        if not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, "rb") as f:
+            offset = 0
+            for line in f:
+                offset += len(line)
+                if offset > end:
+                    break
+                yield json.loads(line)
+
+    def _legacy_receipts(self):
+        if not os.path.exists(self.legacy_file):
+            return []
+        receipts = JsonStore.get(self.legacy_file, list, 4).load()
+        if receipts is not self._legacy:
+            self._legacy = receipts
+            self._legacy_by_order = {r.get("order_id"): r for r in receipts}
+            self._legacy_by_user = {}
+            for receipt in receipts:
+                self._legacy_by_user.setdefault(str(receipt.get("user_id")), []).append(receipt)
+        return receipts
@@ -0,0 +1,336 @@
+"""Module for refunding cancelled trip bookings in the background."""
+
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from models.enums import NotificationType, OrderStatus, PaymentMethod, TripBookingStatus
+from models.Notification import Notification
+from models.PaymentGateway import payment_pipeline
+from models.BookingStore import resolve_trip_bookings
+from models.OrderIndex import find_orders
+from models.PointsLedger import PointsLedger
+from models.UnitOfWork import UnitOfWork
+from utils.file_lock import FileLock
+from utils.json_store import JsonStore
+
+REFUND_QUEUE_FILE = "data/refund_queue.jsonl"
+REFUND_CHECKPOINT_FILE = "data/refund_queue_checkpoint.json"
+REFUND_LOG_FILE = "data/refund_worker.log"
+BATCH_SIZE = 200
+POLL_INTERVAL = 5  # seconds between checks when nobody wakes the worker
+
+
+class RefundWorker:
+    """Drains a persisted queue of refund jobs in batches.
+
+    Jobs are appended as JSON lines to the queue file; the checkpoint file
+    holds the byte offset up to which jobs have been refunded. Before a
+    batch is processed its end offset is written to the checkpoint as
+    'pending', so after a crash the same batch is redone: payment reversals
+    are keyed by job ID at the gateway, points refunds are skipped if their
+    ledger entry already exists, and order, booking and notification
+    updates go through one unit of work keyed by record ID.
+
+    The worker thread shares the console with the menus, so it writes what
+    it has to report to REFUND_LOG_FILE instead of printing.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, queue_file=REFUND_QUEUE_FILE, checkpoint_file=REFUND_CHECKPOINT_FILE,
+                 batch_size=BATCH_SIZE, pipeline=None, log_file=REFUND_LOG_FILE):
+        """Initialize the worker.
+
+        Args:
+            queue_file (str): JSON lines file holding the jobs.
+            checkpoint_file (str): File recording how far the queue was drained.
+            batch_size (int): Jobs refunded per unit of work.
+            pipeline (PaymentPipeline, optional): Pipeline used to reverse payments.
+            log_file (str): File the worker thread reports to.
+        """
+        self.queue_file = queue_file
+        self.batch_size = batch_size
+        self.log_file = log_file
+        self._pipeline = pipeline or payment_pipeline
+        self._queue_lock = FileLock(queue_file)
+        self._checkpoint = JsonStore.get(checkpoint_file, dict, 2)
+        # Held for a whole batch, so two processes never drain at once
+        self._drain_lock = FileLock(f"{checkpoint_file}.drain")
+        self._logger = logging.getLogger(f"{__name__}.{os.path.basename(queue_file)}")
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide refund worker"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @staticmethod
+    def build_job(user_id, order_id, booking, points=0, payment_amount=0.0, payment_method=None, reason=""):
+        """Build a refund job for one cancelled trip booking.
+
+        Args:
+            user_id (str): Owner of the booking
+            order_id (str): Order that contains the booking
+            booking (dict): The cancelled trip booking
+            points (int): Points to credit back
+            payment_amount (float): Amount to reverse to the payment method
+            payment_method (str, optional): PaymentMethod value the order was paid with
+            reason (str): Why the booking was cancelled
+
+        Returns:
+            dict: The job; its ID is derived from the booking so a booking is only refunded once
+        """
+        return {
+            "jobId": str(uuid.uuid5(uuid.NAMESPACE_URL, f"refund:{booking['tripBookingId']}")),
+            "userId": str(user_id),
+            "orderId": order_id,
+            "tripBookingId": booking["tripBookingId"],
+            "points": int(points),
+            "paymentAmount": round(float(payment_amount), 2),
+            "paymentMethod": payment_method,
+            "reason": reason,
+            "createdAt": datetime.now().isoformat()
+        }
+
+    @classmethod
+    def build_order_jobs(cls, user_id, order, bookings, reason=""):
+        """Build refund jobs for bookings of one order cancelled by the operator.
+
+        The part of each fare that was paid with money goes back to the
+        order's payment method; the part paid with redeemed points is
+        credited back as points.
+        """
+        paid_left = float(order.get("final_amount") or 0) if order.get("payment_method") else 0.0
+        jobs = []
+        for booking in bookings:
+            fare_total = float(booking.get("totalFare", booking.get("fare", 0)))
+            paid = min(fare_total, paid_left)
+            paid_left -= paid
+            jobs.append(cls.build_job(
+                user_id, order["order_id"], booking,
+                points=int(fare_total - paid),
+                payment_amount=paid,
+                payment_method=order.get("payment_method"),
+                reason=reason
+            ))
+        return jobs
+
+    def enqueue(self, jobs):
+        """Append jobs to the queue and wake the worker.
+
+        Jobs already waiting in the queue are not added twice.
+
+        Returns:
+            int: Number of jobs added.
+        """
+        with self._queue_lock:
+            queued = {job["jobId"] for job in self._read_jobs(self._checkpoint.load().get("offset", 0))[0]}
+            lines = []
+            for job in jobs:
+                if job["jobId"] not in queued:
+                    queued.add(job["jobId"])
+                    lines.append(json.dumps(job) + "\n")
+            if lines:
+                with open(self.queue_file, "a") as f:
+                    f.write("".join(lines))
+                    f.flush()
+                    os.fsync(f.fileno())
+        if lines:
+            self._wake.set()
+        return len(lines)
+
+    def enqueue_outstanding(self):
+        """Queue cancelled bookings of REFUND_REQUESTED orders that have no job yet"""
+        jobs = []
+        for user_id, order in find_orders(status=OrderStatus.REFUND_REQUESTED.value):
+            cancelled = [
+                booking for booking in resolve_trip_bookings(order)
+                if booking.get("bookingStatus") == TripBookingStatus.CANCELLED.value
+            ]
+            jobs.extend(self.build_order_jobs(user_id, order, cancelled, reason="outstanding"))
+        return self.enqueue(jobs)
+
+    def pending_count(self):
+        """Return the number of jobs waiting to be refunded"""
+        with self._checkpoint.lock:
+            return len(self._read_jobs(self._checkpoint.load().get("offset", 0))[0])
+
+    def start(self):
+        """Start draining the queue on a daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        if not self._logger.handlers:
+            handler = logging.FileHandler(self.log_file)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            self._logger.addHandler(handler)
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+        self.enqueue_outstanding()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="refund-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Ask the worker thread to finish its current batch and exit"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Make the worker check the queue now instead of at its next poll"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                refunded = self.drain()
+                if refunded:
+                    self._logger.info("Refunded %d job(s)", refunded)
+            except Exception:
+                self._logger.exception("Refund worker error")
+            self._wake.wait(POLL_INTERVAL)
+
+    def drain(self):
+        """Refund every queued job, one batch at a time.
+
+        Returns:
+            int: Number of jobs refunded.
+        """
+        total = 0
+        while not self._stop.is_set():
+            refunded = self.drain_batch()
+            if not refunded:
+                break
+            total += refunded
+        return total
+
+    def drain_batch(self):
+        """Refund the next batch of queued jobs.
+
+        Returns:
+            int: Number of jobs in the batch.
+        """
+        with self._drain_lock:
+            with self._checkpoint.lock:
+                checkpoint = self._checkpoint.load()
+                offset = checkpoint.get("offset", 0)
+                pending = checkpoint.get("pending")
+                if pending:
+                    jobs, end = self._read_jobs(offset, end=pending["end"])
+                else:
+                    jobs, end = self._read_jobs(offset, limit=self.batch_size)
+                    if not jobs:
+                        return 0
+                    pending = {"end": end, "pointsLogOffset": PointsLedger.shared().log_size()}
+                    self._checkpoint.save(dict(checkpoint, pending=pending))
+
+            # Reversals wait on the gateway; enqueue() only needs the checkpoint lock
+            self._refund(jobs, offset, pending)
+
+            with self._checkpoint.lock:
+                self._checkpoint.save({
+                    "offset": end,
+                    "refunded": self._checkpoint.load().get("refunded", 0) + len(jobs),
+                    "updatedAt": datetime.now().isoformat()
+                })
+            return len(jobs)
+
+    def _read_jobs(self, offset, end=None, limit=None):
+        jobs = []
+        if not os.path.exists(self.queue_file):
+            return jobs, offset
+        with open(self.queue_file, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partially written line; pick it up next time
+                if end is not None and offset >= end:
+                    break
+                if limit is not None and len(jobs) >= limit:
+                    break
+                offset += len(line)
+                if line.strip():
+                    jobs.append(json.loads(line))
+        return jobs, offset
+
+    def _reverse_payments(self, jobs):
+        reversals = [job for job in jobs if job["paymentAmount"] > 0 and job["paymentMethod"]]
+        if not reversals:
+            return
+        results = self._pipeline.refund_many_sync([
+            (PaymentMethod(job["paymentMethod"]), job["paymentAmount"], job["jobId"])
+            for job in reversals
+        ])
+        for job, result in zip(reversals, results):
+            if result["status"] == "REFUNDED":
+                job["reversed"] = job["paymentAmount"]
+            else:
+                # The money can't go back to the card; credit it as points instead
+                job["points"] += int(job["paymentAmount"])
+
+    def _refund(self, jobs, offset, pending):
+        ledger = PointsLedger.shared()
+        already_credited = ledger.entry_ids_since(pending["pointsLogOffset"])
+        self._reverse_payments(jobs)
+
+        unit_of_work = UnitOfWork(log=self._logger.warning)
+        by_user = {}
+        for job in jobs:
+            if job["points"] > 0 and job["jobId"] not in already_credited:
+                unit_of_work.stage("points", "refund", {
+                    "userId": job["userId"],
+                    "points": job["points"],
+                    "tripBookingId": job["tripBookingId"],
+                    "entryId": job["jobId"]
+                })
+            unit_of_work.stage("orders", "set_booking_status", {
+                "userId": job["userId"],
+                "orderId": job["orderId"],
+                "tripBookingId": job["tripBookingId"],
+                "status": OrderStatus.REFUNDED.value,
+                "bookingStatus": TripBookingStatus.CANCELLED.value
+            })
+            unit_of_work.stage("tripbookings", "set_status", {
+                "userId": job["userId"],
+                "tripBookingId": job["tripBookingId"],
+                "bookingStatus": TripBookingStatus.CANCELLED.value
+            })
+            by_user.setdefault(job["userId"], []).append(job)
+
+        notification = Notification()
+        for user_id, user_jobs in by_user.items():
+            notif = notification.build_notification(
+                self._describe_refund(user_jobs),
+                NotificationType.REFUND_STATUS,
+                "user",
+                user_id
+            )
+            # Redoing this batch after a crash must not notify the user twice
+            notif["notificationId"] = str(uuid.uuid5(uuid.NAMESPACE_URL, f"refund:{offset}:{user_id}"))
+            unit_of_work.stage("notifications", "append", notif)
+
+        if not unit_of_work.commit():
+            raise RuntimeError(f"Refund batch at offset {offset} was not committed; it will be retried")
+
+    @staticmethod
+    def _describe_refund(jobs):
+        reversed_amount = sum(job.get("reversed", 0) for job in jobs)
+        points = sum(job["points"] for job in jobs)
+        parts = []
+        if reversed_amount:
+            parts.append(f"RM{reversed_amount:.2f} returned to your payment method")
+        if points:
+            parts.append(f"{points} points credited")
+        booking_ids = ", ".join(job["tripBookingId"] for job in jobs)
+        return f"Refund processed for cancelled booking(s) {booking_ids}: {' and '.join(parts) or 'nothing due'}"
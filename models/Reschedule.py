@@ -1,7 +1,7 @@
 """Module for handling trip rescheduling operations."""
 
-from datetime import datetime, timedelta
-from utils.json_handler import load_json, save_json
+from models.RescheduleStore import RescheduleStore
+from utils import service_time
 import uuid
 
 class Reschedule:
@@ -14,7 +14,7 @@ class Reschedule:
             trip (Trip, optional): The trip to be rescheduled. Defaults to None.
         """
         if trip:
-            self.reschedule_id = f"RES_{trip.trip_id}_{uuid.uuid4().hex[:4]}"
+            self.reschedule_id = f"RES_{trip.trip_id}_{uuid.uuid4().hex}"
             self.trip_id = trip.trip_id
             self.original_departure = trip.trip_departure_time
             self.original_arrival = trip.trip_arrival_time
@@ -42,15 +42,9 @@ class Reschedule:
             dt_str (str): Datetime string to parse.
             
         Returns:
-            datetime: Parsed datetime object or None if parsing fails.
+            int: Epoch minutes, or None if parsing fails.
         """
-        try:
-            return datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-        except ValueError:
-            try:
-                return datetime.strptime(dt_str, "%Y-%m-%dT%H:%M:%S")
-            except ValueError:
-                return None
+        return service_time.parse(dt_str)
 
     def set_new_date(self, new_departure):
         """Set new departure date and calculate corresponding arrival time.
@@ -62,32 +56,30 @@ class Reschedule:
             tuple: (success: bool, message: str)
         """
         new_date = self.parse_datetime(new_departure)
-        if not new_date:
+        if new_date is None:
             return False, "Invalid format. Use YYYY-MM-DD HH:MM or YYYY-MM-DDTHH:MM:SS."
 
         original_departure = self.parse_datetime(self.original_departure)
-        if not original_departure:
+        if original_departure is None:
             return False, "Original trip time is invalid."
 
-        if new_date <= datetime.now():
+        if new_date <= service_time.now():
             return False, "New time must be in the future."
 
         if new_date == original_departure:
             return False, "New time must differ from the original schedule."
 
         original_arrival = self.parse_datetime(self.original_arrival)
-        if not original_arrival:
+        if original_arrival is None:
             return False, "Original arrival time is invalid."
 
         duration = original_arrival - original_departure
-        self.new_departure = new_date.strftime("%Y-%m-%dT%H:%M:%S")
-        self.new_arrival = (new_date + duration).strftime("%Y-%m-%dT%H:%M:%S")
+        self.new_departure = service_time.format_iso(new_date)
+        self.new_arrival = service_time.format_iso(new_date + duration)
 
         self.status = "Confirmed"
         return True, "Reschedule successful."
 
     def save_reschedule(self):
-        """Save the reschedule data to JSON file."""
-        data = load_json("data/reschedules.json")
-        data.append(self.__dict__)
-        save_json("data/reschedules.json", data)
\ No newline at end of file
+        """Save the reschedule data to the reschedule store."""
+        RescheduleStore.shared().record(self.__dict__)
@@ -0,0 +1,242 @@
+"""Module for looking up the effective schedule of rescheduled trips."""
+
+import threading
+from bisect import bisect_left, bisect_right, insort
+from utils.json_store import JsonStore
+from utils import service_time
+
+RESCHEDULES_FILE = "data/reschedules.json"
+COMPACT_MIN_SUPERSEDED = 50  # superseded entries tolerated before compacting
+
+
+def normalize_entry(row):
+    """Return a reschedule row in the store's format.
+
+    Older rows were saved with snake_case keys and 'YYYY-MM-DD HH:MM'
+    times; both are accepted. The service date is the date the trip was
+    originally due to run.
+    """
+    def field(camel, snake):
+        return row.get(camel, row.get(snake))
+
+    original_departure = service_time.normalize(field("originalDeparture", "original_departure"))
+    return {
+        "rescheduleId": field("rescheduleId", "reschedule_id"),
+        "tripId": field("tripId", "trip_id"),
+        "serviceDate": row.get("serviceDate") or (original_departure or "")[:10],
+        "originalDeparture": original_departure,
+        "originalArrival": service_time.normalize(field("originalArrival", "original_arrival")),
+        "newDeparture": service_time.normalize(field("newDeparture", "new_departure")),
+        "newArrival": service_time.normalize(field("newArrival", "new_arrival")),
+        "status": row.get("status"),
+        "superseded": row.get("superseded", 0),
+    }
+
+
+class RescheduleStore:
+    """Reschedules keyed by (tripId, service date), in the order they were made.
+
+    The newest confirmed entry for a key is the trip's effective schedule
+    for that day; earlier ones are kept as its history until compacted.
+    A sorted list of (service date, tripId) keys answers per-date queries
+    with binary search. Compaction keeps only the effective entry of each
+    key, normalized, and records how many it replaced.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, file_path=RESCHEDULES_FILE):
+        self._store = JsonStore.get(file_path, list, 4)
+        self._lock = threading.Lock()
+        self._rows = None
+        self._history = {}
+        self._keys = []
+        self._by_new_departure = {}
+        self._ids = set()
+        self._superseded = 0
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide reschedule store"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _ensure(self, rows):
+        # rows is loaded before taking self._lock, which the store's update() takes after its own
+        if rows is self._rows:
+            return
+        self._rows = rows
+        self._history = {}
+        self._keys = []
+        self._by_new_departure = {}
+        self._ids = set()
+        self._superseded = 0
+        for row in rows:
+            self._add(normalize_entry(row))
+
+    def _add(self, entry):
+        if not (entry["tripId"] and entry["serviceDate"]):
+            return
+        self._ids.add(entry["rescheduleId"])
+        key = (entry["tripId"], entry["serviceDate"])
+        if key in self._history:
+            self._superseded += 1
+        else:
+            self._history[key] = []
+            insort(self._keys, (entry["serviceDate"], entry["tripId"]))
+        self._history[key].append(entry)
+        if entry["status"] == "Confirmed" and entry["newDeparture"]:
+            self._by_new_departure[(entry["tripId"], entry["newDeparture"])] = key
+
+    @staticmethod
+    def _effective(entries):
+        for entry in reversed(entries):
+            if entry["status"] == "Confirmed" and entry["newDeparture"]:
+                return entry
+        return None
+
+    def effective(self, trip_id, service_date):
+        """Return the schedule in force for a trip on a date, or None if it was never rescheduled.
+
+        Args:
+            trip_id (str): The trip
+            service_date (str): 'YYYY-MM-DD' the trip was originally due to run
+        """
+        rows = self._store.load()
+        with self._lock:
+            self._ensure(rows)
+            return self._effective(self._history.get((trip_id, service_date), []))
+
+    def history(self, trip_id, service_date):
+        """Return every reschedule of a trip on a date, oldest first"""
+        rows = self._store.load()
+        with self._lock:
+            self._ensure(rows)
+            return list(self._history.get((trip_id, service_date), []))
+
+    def for_dates(self, since, until=None):
+        """Return the effective reschedules for service dates in [since, until]"""
+        rows = self._store.load()
+        with self._lock:
+            self._ensure(rows)
+            start = bisect_left(self._keys, (since, ""))
+            end = bisect_right(self._keys, (until or since, "\uffff"))
+            results = []
+            for service_date, trip_id in self._keys[start:end]:
+                entry = self._effective(self._history[(trip_id, service_date)])
+                if entry:
+                    results.append(entry)
+            return results
+
+    def record(self, reschedule):
+        """Save a confirmed reschedule.
+
+        Args:
+            reschedule (dict): Reschedule fields in either key style
+
+        Returns:
+            dict: The stored entry
+        """
+        entry = self.prepare(reschedule)
+        self._store.update(lambda rows: self.append(rows, entry))
+        self.compact_if_due()
+        return entry
+
+    def prepare(self, reschedule):
+        """Return a reschedule as it will be stored, without saving it.
+
+        A trip rescheduled again on the same day keeps the departure it
+        was first due at as its originalDeparture.
+
+        Args:
+            reschedule (dict): Reschedule fields in either key style
+
+        Returns:
+            dict: The entry to append
+        """
+        entry = normalize_entry(reschedule)
+        rows = self._store.load()
+        with self._lock:
+            self._ensure(rows)
+            previous = self._effective(self._history.get((entry["tripId"], entry["serviceDate"]), []))
+        if previous is None and entry["originalDeparture"]:
+            # The trip may be moving away from a date it was already moved to
+            previous = self._find_by_new_departure(entry["tripId"], entry["originalDeparture"])
+        if previous is not None:
+            entry.update(
+                serviceDate=previous["serviceDate"],
+                originalDeparture=previous["originalDeparture"],
+                originalArrival=previous["originalArrival"]
+            )
+        return entry
+
+    def append(self, rows, entry):
+        """Append a prepared entry to the loaded rows unless it is already there.
+
+        Called while the store is being updated; the store changes its
+        cached list in place, so the entry is indexed here as well.
+
+        Returns:
+            bool: True if the entry was added.
+        """
+        with self._lock:
+            self._ensure(rows)
+            if entry["rescheduleId"] in self._ids:
+                return False
+            rows.append(entry)
+            self._add(entry)
+            return True
+
+    def compact_if_due(self):
+        """Compact once enough superseded entries have built up.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        rows = self._store.load()
+        with self._lock:
+            self._ensure(rows)
+            due = self._superseded >= COMPACT_MIN_SUPERSEDED
+        return self.compact() if due else 0
+
+    def _find_by_new_departure(self, trip_id, departure):
+        rows = self._store.load()
+        with self._lock:
+            self._ensure(rows)
+            key = self._by_new_departure.get((trip_id, departure))
+            return self._effective(self._history[key]) if key else None
+
+    def compact(self):
+        """Rewrite the file with only the effective entry of each trip and date.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        def keep_effective(rows):
+            by_key = {}
+            for row in rows:
+                entry = normalize_entry(row)
+                if not (entry["tripId"] and entry["serviceDate"]):
+                    continue
+                key = (entry["tripId"], entry["serviceDate"])
+                if entry["status"] == "Confirmed" and entry["newDeparture"]:
+                    replaced = by_key.get(key)
+                    entry["superseded"] += (replaced["superseded"] + 1) if replaced else 0
+                    # Re-inserted so the file stays in the order reschedules were made
+                    by_key.pop(key, None)
+                    by_key[key] = entry
+            removed = len(rows) - len(by_key)
+            rows[:] = list(by_key.values())
+            with self._lock:
+                self._rows = None
+            return removed
+
+        return self._store.update(keep_effective)
+
+
+def append_reschedule(rows, payload):
+    """Unit of work applier: append a prepared reschedule entry"""
+    RescheduleStore.shared().append(rows, payload)
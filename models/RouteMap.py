@@ -0,0 +1,91 @@
+"""Module for cached station and route metadata."""
+
+import threading
+from utils.json_store import JsonStore
+
+STATIONS_FILE = "data/stations.json"
+ROUTES_FILE = "data/routes.json"
+
+
+class RouteMap:
+    """Station names and route connections, built once per data change.
+
+    stations.json and routes.json are read through their JSON stores, so
+    they are only parsed again when they change on disk. Connections are
+    worked out the same way as TripBooking.validate_connection and
+    remembered per station pair.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, stations_file=STATIONS_FILE, routes_file=ROUTES_FILE):
+        self._stations_store = JsonStore.get(stations_file, list, 2)
+        self._routes_store = JsonStore.get(routes_file, list, 2)
+        self._lock = threading.Lock()
+        self._sources = (None, None)
+        self._station_names = {}
+        self._routes = []
+        self._connections = {}
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide route map"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _ensure(self):
+        lines = self._stations_store.load()
+        routes = self._routes_store.load()
+        if self._sources[0] is lines and self._sources[1] is routes:
+            return
+        self._sources = (lines, routes)
+        self._station_names = {
+            station["stationId"]: station["stationName"]
+            for line in lines
+            for station in line.get("stations", [])
+        }
+        self._routes = [
+            (route["routeName"], set(route["stopsSequence"]), route["basePrice"])
+            for route in routes
+        ]
+        self._connections = {}
+
+    def station_name(self, station_id):
+        """Return a station's display name, or the ID if it is unknown"""
+        with self._lock:
+            self._ensure()
+            return self._station_names.get(station_id, station_id)
+
+    def connection(self, from_station, to_station):
+        """Return connection details between two stations, or None.
+
+        The dict has the same shape as TripBooking.validate_connection returns.
+        """
+        with self._lock:
+            self._ensure()
+            key = (from_station, to_station)
+            if key not in self._connections:
+                self._connections[key] = self._find_connection(from_station, to_station)
+            return self._connections[key]
+
+    def _find_connection(self, from_station, to_station):
+        for name, stops, fare in self._routes:
+            if from_station in stops and to_station in stops:
+                return {"type": "direct", "route_name": name, "fare": fare, "valid": True}
+
+        for name1, stops1, fare1 in self._routes:
+            if from_station not in stops1:
+                continue
+            for name2, stops2, fare2 in self._routes:
+                if name2 != name1 and to_station in stops2 and stops1 & stops2:
+                    return {
+                        "type": "interchange",
+                        "from_route_name": name1,
+                        "to_route_name": name2,
+                        "fare": fare1 + fare2,
+                        "valid": True
+                    }
+        return None
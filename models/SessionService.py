@@ -0,0 +1,127 @@
+"""Module for login sessions backed by an in-memory LRU/TTL cache."""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+class SessionCache:
+    """An LRU cache of opaque session tokens with idle and absolute expiry.
+
+    Validating a token is a dict lookup: the authenticated account is kept
+    in the session, so neither users.json nor admins.json is read again.
+    """
+
+    def __init__(self, max_sessions=10000, idle_timeout=30 * 60, absolute_timeout=12 * 60 * 60):
+        """Initialize the session cache.
+
+        Args:
+            max_sessions (int): Sessions kept before the least recently used is evicted.
+            idle_timeout (int): Seconds a session may go unused.
+            absolute_timeout (int): Seconds a session may live regardless of use.
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.absolute_timeout = absolute_timeout
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._tokens_by_email = {}
+
+    def create_session(self, account, account_type, account_id, email):
+        """Start a session for an authenticated account.
+
+        Args:
+            account (dict|SystemAdmin): The authenticated account.
+            account_type (str): 'user' or 'admin'.
+            account_id (str): ID of the account.
+            email (str): Email used to log in.
+
+        Returns:
+            str: The opaque session token.
+        """
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        session = {
+            "account": account,
+            "accountType": account_type,
+            "accountId": account_id,
+            "email": email,
+            "createdAt": datetime.now().isoformat(),
+            "_created": now,
+            "_lastSeen": now
+        }
+
+        with self._lock:
+            self._sessions[token] = session
+            self._tokens_by_email.setdefault(email, set()).add(token)
+            while len(self._sessions) > self.max_sessions:
+                evicted_token, evicted = self._sessions.popitem(last=False)
+                self._forget_token(evicted_token, evicted)
+        return token
+
+    def validate_session(self, token):
+        """Return the session for a live token, or None if unknown or expired."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(token)
+            if not session:
+                return None
+            if (now - session["_lastSeen"] > self.idle_timeout
+                    or now - session["_created"] > self.absolute_timeout):
+                del self._sessions[token]
+                self._forget_token(token, session)
+                return None
+            session["_lastSeen"] = now
+            self._sessions.move_to_end(token)
+            return session
+
+    def revoke_session(self, token):
+        """Invalidate a single session token.
+
+        Returns:
+            bool: True if the token was live.
+        """
+        with self._lock:
+            session = self._sessions.pop(token, None)
+            if not session:
+                return False
+            self._forget_token(token, session)
+            return True
+
+    def revoke_account_sessions(self, email):
+        """Invalidate every session opened with the given email.
+
+        Returns:
+            int: Number of sessions revoked.
+        """
+        with self._lock:
+            tokens = self._tokens_by_email.pop(email, set())
+            for token in tokens:
+                self._sessions.pop(token, None)
+            return len(tokens)
+
+    def purge_expired(self):
+        """Drop expired sessions; returns how many were removed."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                (token, session) for token, session in self._sessions.items()
+                if now - session["_lastSeen"] > self.idle_timeout
+                or now - session["_created"] > self.absolute_timeout
+            ]
+            for token, session in expired:
+                del self._sessions[token]
+                self._forget_token(token, session)
+            return len(expired)
+
+    def _forget_token(self, token, session):
+        tokens = self._tokens_by_email.get(session["email"])
+        if tokens:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_email[session["email"]]
+
+
+session_cache = SessionCache()
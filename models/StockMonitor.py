@@ -0,0 +1,217 @@
+"""Module for watching merchandise sales velocity and warning before items sell out."""
+
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta
+from models.enums import NotificationType
+from models.Notification import Notification
+from utils.json_store import JsonStore
+
+STOCK_MONITOR_FILE = "data/stock_velocity.json"
+WINDOW_DAYS = 7
+LOW_STOCK_THRESHOLD = 10
+STOCKOUT_DAYS_THRESHOLD = 3.0
+ALERT_COALESCE_SECONDS = 15 * 60
+PERSIST_BATCH_SIZE = 50  # queued orders that trigger a write
+PERSIST_INTERVAL = 60  # seconds after which queued orders are written
+
+# Alert levels; an item is only reported again when its level gets worse
+OK, LOW, STOCKOUT_SOON, SOLD_OUT = 0, 1, 2, 3
+LEVEL_LABELS = {LOW: "low stock", STOCKOUT_SOON: "selling out soon", SOLD_OUT: "sold out"}
+
+
+class StockMonitor:
+    """Rolling per-item sales counters with days-to-stockout projection.
+
+    Each submitted order adds its quantities to a per-day bucket of the
+    items it bought; buckets older than the window are dropped as they are
+    passed, so the monitor never rereads order history. Orders are queued
+    in memory and written in batches, so the state file is rewritten once
+    per batch rather than once per order; a crash loses at most one batch
+    of advisory counts. Velocity is the
+    units sold per day over the window, and stock divided by velocity is
+    the projected days to stockout.
+
+    Alerts are raised when an item crosses into a worse level (low stock,
+    selling out soon, sold out) and re-armed once a restock improves it.
+    They are held and sent to admins as a single SYSTEM_ALERT at most once
+    per coalescing period, so a burst of sales produces one notification.
+    The orders counted within the window are remembered, so recording an
+    order's sales again counts nothing.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, state_file=STOCK_MONITOR_FILE, window_days=WINDOW_DAYS,
+                 coalesce_seconds=ALERT_COALESCE_SECONDS, notify=None,
+                 batch_size=PERSIST_BATCH_SIZE, persist_interval=PERSIST_INTERVAL):
+        """Initialize the monitor.
+
+        Args:
+            state_file (str): File holding the counters and pending alerts.
+            window_days (int): Days of sales the velocity is averaged over.
+            coalesce_seconds (int): Shortest gap between two alert notifications.
+            notify (callable, optional): Called with the alert text; defaults to
+                an admin SYSTEM_ALERT notification.
+            batch_size (int): Queued orders that trigger a write.
+            persist_interval (int): Seconds after which queued orders are written.
+        """
+        self._store = JsonStore.get(state_file, dict, 2)
+        self.window_days = window_days
+        self.coalesce_seconds = coalesce_seconds
+        self._notify = notify or self._notify_admins
+        self.batch_size = batch_size
+        self.persist_interval = persist_interval
+        self._lock = threading.Lock()
+        self._queued = []  # (order ID, sales, time of sale) not yet written
+        self._last_persist = time.monotonic()
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide stock monitor"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+                atexit.register(cls._instance.persist)
+            return cls._instance
+
+    @staticmethod
+    def _notify_admins(content):
+        Notification().create_notification(content, NotificationType.SYSTEM_ALERT, "admin")
+
+    def _velocity(self, counters, today):
+        oldest = (today - timedelta(days=self.window_days - 1)).isoformat()
+        sold = sum(qty for day, qty in counters["days"].items() if day >= oldest)
+        # Items first sold recently are averaged over the days they have been on sale
+        first = max(counters["since"], oldest)
+        days = (today - datetime.fromisoformat(first).date()).days + 1
+        return sold / days
+
+    def _level(self, stock, days_left):
+        if stock <= 0:
+            return SOLD_OUT
+        if days_left is not None and days_left <= STOCKOUT_DAYS_THRESHOLD:
+            return STOCKOUT_SOON
+        if stock < LOW_STOCK_THRESHOLD:
+            return LOW
+        return OK
+
+    def record_sales(self, sales, now=None, order_id=None):
+        """Queue the items of one submitted order, writing the queue if it is due.
+
+        Args:
+            sales (list): (merchandise ID, item name, quantity, stock left) tuples
+            now (datetime, optional): Time of the sale
+            order_id (str, optional): The order sold; an order already
+                counted is skipped
+
+        Returns:
+            str: The alert text sent, or None if nothing was sent
+        """
+        with self._lock:
+            self._queued.append((order_id, sales, now or datetime.now()))
+            due = (
+                len(self._queued) >= self.batch_size
+                or time.monotonic() - self._last_persist >= self.persist_interval
+            )
+        return self.persist() if due else None
+
+    def persist(self, force_alert=False, now=None):
+        """Write the queued orders to the state file in one update.
+
+        Args:
+            force_alert (bool): Send any held alerts, ignoring the coalescing period
+            now (datetime, optional): Time to send alerts at; defaults to the
+                last queued sale, else the current time
+
+        Returns:
+            str: The alert text sent, or None if nothing was sent
+        """
+        with self._lock:
+            queued, self._queued = self._queued, []
+            self._last_persist = time.monotonic()
+        if not queued and not force_alert:
+            return None
+        now = now or (queued[-1][2] if queued else datetime.now())
+        alert = []
+
+        def mutate(state):
+            for order_id, sales, sold_at in queued:
+                self._count(state, order_id, sales, sold_at)
+            pending = state.get("pending")
+            last_sent = state.get("lastAlertAt")
+            if pending and (force_alert or not last_sent or
+                            (now - datetime.fromisoformat(last_sent)).total_seconds() >= self.coalesce_seconds):
+                alert.append(self._describe(pending))
+                state["pending"] = {}
+                state["lastAlertAt"] = now.isoformat()
+
+        try:
+            self._store.update(mutate)
+        except Exception:
+            # Keep the orders for the next write
+            with self._lock:
+                self._queued[:0] = queued
+            raise
+        if alert:
+            self._notify(alert[0])
+            return alert[0]
+        return None
+
+    def _count(self, state, order_id, sales, now):
+        today = now.date()
+        oldest = (today - timedelta(days=self.window_days - 1)).isoformat()
+        orders = state.setdefault("orders", {})
+        for counted in [o for o, day in orders.items() if day < oldest]:
+            del orders[counted]
+        if order_id is not None:
+            if order_id in orders:
+                return
+            orders[order_id] = today.isoformat()
+
+        items = state.setdefault("items", {})
+        pending = state.setdefault("pending", {})
+        for item_id, name, quantity, stock in sales:
+            counters = items.setdefault(item_id, {"name": name, "since": today.isoformat(), "days": {}, "level": OK})
+            days = counters["days"]
+            days[today.isoformat()] = days.get(today.isoformat(), 0) + quantity
+            for day in [day for day in days if day < oldest]:
+                del days[day]
+
+            velocity = self._velocity(counters, today)
+            days_left = stock / velocity if velocity else None
+            level = self._level(stock, days_left)
+            if level > counters["level"]:
+                pending[item_id] = {
+                    "name": name,
+                    "level": level,
+                    "stock": stock,
+                    "velocity": round(velocity, 2),
+                    "daysLeft": None if days_left is None else round(days_left, 1)
+                }
+            counters["level"] = level
+
+    def flush(self, now=None):
+        """Write the queued orders and send any held alerts now, ignoring the coalescing period"""
+        return self.persist(force_alert=True, now=now)
+
+    def projection(self, item_id, stock, today=None):
+        """Return (units sold per day, projected days to stockout or None)"""
+        self.persist()
+        counters = self._store.load().get("items", {}).get(item_id)
+        if counters is None:
+            return 0.0, None
+        velocity = self._velocity(counters, today or datetime.now().date())
+        return velocity, (stock / velocity if velocity else None)
+
+    @staticmethod
+    def _describe(pending):
+        lines = []
+        for alert in sorted(pending.values(), key=lambda a: -a["level"]):
+            line = f"{alert['name']}: {LEVEL_LABELS[alert['level']]} ({alert['stock']} left, {alert['velocity']}/day"
+            if alert["daysLeft"] is not None and alert["stock"] > 0:
+                line += f", ~{alert['daysLeft']} days to stockout"
+            lines.append(line + ")")
+        return "Merchandise stock alert - " + "; ".join(lines)
@@ -0,0 +1,201 @@
+"""Module for holding merchandise stock while a checkout is being paid."""
+
+import os
+import threading
+import time
+import uuid
+from utils.json_store import JsonStore
+from utils.timer_wheel import TimerWheel
+
+MERCHANDISE_FILE = "data/merchandise.json"
+STOCK_DIR = "data/stock"
+RESERVATION_TTL = 15 * 60  # seconds a checkout may hold stock before paying
+COMMIT_RECORD_TTL = 30 * 24 * 60 * 60  # seconds a committed reservation is remembered
+
+
+class StockReservationService:
+    """Per-item stock counters with reservations that expire.
+
+    Every item has its own counter file holding the stock on hand and the
+    reservations against it, so checkouts of different items never wait on
+    each other and never lock the catalog. Reserving checks and records the
+    hold under that item's lock; committing takes the stock once the order
+    is paid, releasing gives it back. Holds this process created are
+    released by a timer wheel when they expire, and every process also
+    drops expired holds it finds in a counter, so a crashed checkout can't
+    keep stock forever.
+
+    Committed reservations are remembered for a while, so committing one
+    again - as a recovered unit of work does - takes nothing more.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, stock_dir=STOCK_DIR, catalog_file=MERCHANDISE_FILE, ttl_seconds=RESERVATION_TTL):
+        """Initialize the service.
+
+        Args:
+            stock_dir (str): Directory holding one counter file per item.
+            catalog_file (str): Catalog that seeds new counters with its stock.
+            ttl_seconds (int): How long a reservation holds stock.
+        """
+        self.stock_dir = stock_dir
+        self.catalog_file = catalog_file
+        self.ttl_seconds = ttl_seconds
+        self._wheel = TimerWheel(tick_seconds=1.0)
+        os.makedirs(stock_dir, exist_ok=True)
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide stock reservation service"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _counter(self, item_id):
+        return JsonStore.get(os.path.join(self.stock_dir, f"{item_id}.json"), dict, 2)
+
+    def _catalog_stock(self, item_id):
+        for item in JsonStore.get(self.catalog_file, list, 4).load():
+            if item.get("merchandiseId") == item_id:
+                return int(item.get("merchandiseStock", 0))
+        return 0
+
+    def _load_counter(self, counter, item_id, now):
+        """Return the counter's data, seeding it from the catalog and dropping expired holds"""
+        data = counter.load()
+        if "stock" not in data:
+            data.update({"merchandiseId": item_id, "stock": self._catalog_stock(item_id), "holds": {}})
+        holds = data["holds"]
+        for reservation_id in [r for r, hold in holds.items() if hold["expiresAt"] <= now]:
+            del holds[reservation_id]
+        committed = data.setdefault("committed", {})
+        for reservation_id in [r for r, at in committed.items() if at <= now - COMMIT_RECORD_TTL]:
+            del committed[reservation_id]
+        return data
+
+    def _expire(self):
+        for reservation_id in self._wheel.advance():
+            self.release(reservation_id)
+
+    @staticmethod
+    def item_of(reservation_id):
+        """Return the merchandise ID a reservation holds stock of"""
+        return reservation_id.split(":", 1)[0]
+
+    def available(self, item_id):
+        """Return the stock that is neither sold nor held"""
+        self._expire()
+        counter = self._counter(item_id)
+        with counter.lock:
+            data = self._load_counter(counter, item_id, time.time())
+            return data["stock"] - sum(hold["quantity"] for hold in data["holds"].values())
+
+    def reserve(self, item_id, quantity, order_id=None):
+        """Hold stock for a checkout.
+
+        Returns:
+            str: Reservation ID, or None if not enough stock is available
+        """
+        self._expire()
+        now = time.time()
+        counter = self._counter(item_id)
+        with counter.lock:
+            data = self._load_counter(counter, item_id, now)
+            held = sum(hold["quantity"] for hold in data["holds"].values())
+            if quantity <= 0 or data["stock"] - held < quantity:
+                return None
+            reservation_id = f"{item_id}:{uuid.uuid4()}"
+            expires_at = now + self.ttl_seconds
+            data["holds"][reservation_id] = {
+                "quantity": quantity,
+                "orderId": order_id,
+                "expiresAt": expires_at
+            }
+            counter.save(data)
+        self._wheel.schedule(reservation_id, expires_at)
+        return reservation_id
+
+    def renew(self, reservation_id, quantity):
+        """Make sure a reservation still holds its stock for a full TTL.
+
+        A live hold is extended; a hold that already expired is taken out
+        again as long as enough stock is available. Checkout renews its
+        holds right before charging, so the customer is never charged for
+        stock that is gone.
+
+        Returns:
+            bool: True if the stock is held (or was already committed)
+        """
+        self._expire()
+        now = time.time()
+        item_id = self.item_of(reservation_id)
+        counter = self._counter(item_id)
+        with counter.lock:
+            data = self._load_counter(counter, item_id, now)
+            if reservation_id in data["committed"]:
+                return True
+            hold = data["holds"].get(reservation_id)
+            if hold is None:
+                held = sum(h["quantity"] for h in data["holds"].values())
+                if quantity <= 0 or data["stock"] - held < quantity:
+                    return False
+                hold = data["holds"][reservation_id] = {"quantity": quantity, "orderId": None}
+            expires_at = now + self.ttl_seconds
+            hold["expiresAt"] = expires_at
+            counter.save(data)
+        self._wheel.schedule(reservation_id, expires_at)
+        return True
+
+    def commit(self, reservation_id, quantity=None):
+        """Take the held stock for a paid order.
+
+        If the hold already expired, the stock is taken directly as long as
+        enough is still available. A reservation already committed is not
+        taken again.
+
+        Returns:
+            bool: True if the stock was taken (now or before)
+        """
+        self._wheel.cancel(reservation_id)
+        item_id = self.item_of(reservation_id)
+        counter = self._counter(item_id)
+        with counter.lock:
+            now = time.time()
+            data = self._load_counter(counter, item_id, now)
+            if reservation_id in data["committed"]:
+                return True
+            hold = data["holds"].pop(reservation_id, None)
+            if hold:
+                quantity = hold["quantity"]
+            else:
+                held = sum(h["quantity"] for h in data["holds"].values())
+                if quantity is None or data["stock"] - held < quantity:
+                    return False
+            data["stock"] -= quantity
+            data["committed"][reservation_id] = now
+            counter.save(data)
+            stock = data["stock"]
+        self._sync_catalog(item_id, stock)
+        return True
+
+    def release(self, reservation_id):
+        """Give held stock back; returns True if the hold still existed"""
+        self._wheel.cancel(reservation_id)
+        item_id = self.item_of(reservation_id)
+        counter = self._counter(item_id)
+        with counter.lock:
+            data = self._load_counter(counter, item_id, time.time())
+            released = data["holds"].pop(reservation_id, None) is not None
+            counter.save(data)
+        return released
+
+    def _sync_catalog(self, item_id, stock):
+        # The counter is the source of truth; the catalog copy is kept for display
+        def set_stock(items):
+            for item in items:
+                if item.get("merchandiseId") == item_id:
+                    item["merchandiseStock"] = stock
+        JsonStore.get(self.catalog_file, list, 4).update(set_stock)
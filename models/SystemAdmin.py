@@ -1,10 +1,17 @@
 """Module for system administrator functionality and trip management."""
 
-import bcrypt
 from datetime import datetime, timedelta
-from utils.json_handler import load_json, save_json
+from models.AccountIndex import (
+    account_index,
+    admin_last_login_batcher,
+    verify_password
+)
 from models.Trip import Trip
-from models.enums import TripStatus
+from models.BulkReschedule import BulkReschedule
+from models.Fulfillment import FulfillmentService
+from models.StockMonitor import StockMonitor
+from models.enums import FulfillmentStatus, TripStatus
+from utils import service_time
 
 
 class SystemAdmin:
@@ -20,40 +27,36 @@ class SystemAdmin:
     @staticmethod
     def authenticate_system_admin(email, password):
         """Authenticate a system administrator."""
-        admins = load_json("data/admins.json")
-        admin_data = next(
-            (a for a in admins if a["systemAdminEmail"] == email),
-            None
-        )
-        
+        admin_data = account_index.find_admin(email)
         if not admin_data:
             return None
 
-        stored_hash = admin_data["systemAdminPassword"]
-        password_bytes = password.encode()
-        stored_hash_bytes = stored_hash.encode()
-
-        if bcrypt.checkpw(password_bytes, stored_hash_bytes):
-            admin_data["systemAdminLastLogin"] = datetime.now().isoformat()
-            save_json("data/admins.json", admins)
+        if verify_password(password, admin_data["systemAdminPassword"]):
+            login_time = datetime.now().isoformat()
+            admin_data["systemAdminLastLogin"] = login_time
+            admin_last_login_batcher.record(admin_data["systemAdminId"], login_time)
             return SystemAdmin(admin_data)
         return None
 
     def request_manage_trip(self):
         """Display trip management dashboard and handle user input."""
+        # Stock alerts still held back by coalescing are delivered on login
+        StockMonitor.shared().flush()
         while True:
             print("\n===== Admin Management Dashboard =====")
             print("1. View All Trips")
             print("2. Filter by Route")
-            print("3. Logout")
+            print("3. Merchandise Fulfillment")
+            print("4. Bulk Reschedule")
+            print("5. Logout")
             
-            choice = input("Select option (1-3): ").strip()
+            choice = input("Select option (1-5): ").strip()
             
             if choice == "1":
                 trip_date = self._get_valid_trip_date()
                 if not trip_date:
                     continue
-                trips = Trip.load_all_trips()
+                trips = Trip.load_all_trips(trip_date)
                 # Create new trip objects with the selected date
                 trips_with_date = []
                 for trip in trips:
@@ -63,26 +66,22 @@ class SystemAdmin:
                     minutes = time_part[2:]
                     
                     # Combine with the selected date
-                    try:
-                        departure_datetime = datetime.strptime(
-                            f"{trip_date} {hours}:{minutes}", 
-                            "%Y-%m-%d %H:%M"
-                        )
-                        
-                        # Create a new trip data dictionary with the correct datetime
-                        trip_data = {
-                            "tripId": trip.trip_id,
-                            "routeId": trip.route_id,
-                            "departureTime": departure_datetime.isoformat(),
-                            "tripStatus": trip.trip_status,
-                            "startStationId": trip.start_station_id
-                        }
-                        
-                        # Create a new Trip instance
-                        new_trip = Trip(trip_data)
-                        trips_with_date.append(new_trip)
-                    except ValueError:
+                    departure = service_time.parse(f"{hours}:{minutes}", trip_date)
+                    if departure is None:
                         continue
+                    
+                    # Create a new trip data dictionary with the correct datetime
+                    trip_data = {
+                        "tripId": trip.trip_id,
+                        "routeId": trip.route_id,
+                        "departureTime": service_time.format_iso(departure),
+                        "tripStatus": trip.trip_status,
+                        "startStationId": trip.start_station_id
+                    }
+                    
+                    # Create a new Trip instance
+                    new_trip = Trip(Trip.apply_reschedule(trip_data, trip_date), trip_date)
+                    trips_with_date.append(new_trip)
                 
                 print(f"\nAvailable Trips for {trip_date}:")
                 if not self.select_and_manage_trip(trips_with_date):
@@ -107,9 +106,95 @@ class SystemAdmin:
                     print("Invalid route color. Must be BLUE, RED, or GREEN.")
                     
             elif choice == "3":
+                self.request_manage_fulfillment()
+                    
+            elif choice == "4":
+                self.request_bulk_reschedule()
+                    
+            elif choice == "5":
                 return True  # Signal to logout
             else:
-                print("Invalid choice. Please enter 1, 2, or 3.")
+                print("Invalid choice. Please enter 1, 2, 3, 4, or 5.")
+
+    def request_manage_fulfillment(self):
+        """Batch queued merchandise orders into pick-lists and track collection."""
+        fulfillment = FulfillmentService.shared()
+        queued = fulfillment.enqueue_paid_orders()
+        if queued:
+            print(f"📥 Queued {queued} paid order(s) placed before fulfillment began")
+
+        while True:
+            print("\n===== Merchandise Fulfillment =====")
+            for status in FulfillmentStatus:
+                print(f"{status.value}: {fulfillment.count(status)}")
+            print("1. Create Pick-lists")
+            print("2. Mark Batch Ready for Collection")
+            print("3. Mark Order Collected")
+            print("4. Back")
+
+            choice = input("Select option (1-4): ").strip()
+
+            if choice == "1":
+                batch = fulfillment.create_pick_lists()
+                if batch:
+                    fulfillment.print_pick_lists(batch)
+                else:
+                    print("No orders waiting to be picked.")
+            elif choice == "2":
+                batch_id = input("Enter batch ID: ").strip()
+                ready = fulfillment.mark_ready(batch_id)
+                print(f"✅ {ready} order(s) ready for collection" if ready else "No picked orders in that batch.")
+            elif choice == "3":
+                order_id = input("Enter order ID: ").strip()
+                if fulfillment.mark_collected([order_id]):
+                    print("✅ Order marked as collected")
+                else:
+                    print("That order is not ready for collection.")
+            elif choice == "4":
+                return
+            else:
+                print("Invalid choice. Please enter 1, 2, 3, or 4.")
+
+    def request_bulk_reschedule(self):
+        """Shift every trip of a route after a given time by the same number of minutes."""
+        route_color = input("Enter route color (BLUE/RED/GREEN): ").strip().upper()
+        if route_color not in {"BLUE", "RED", "GREEN"}:
+            print("Invalid route color. Must be BLUE, RED, or GREEN.")
+            return
+        trip_date = self._get_valid_trip_date()
+        after = input("Shift trips departing at or after (HH:MM): ").strip()
+        try:
+            datetime.strptime(after, "%H:%M")
+            offset_minutes = int(input("Minutes to shift by (e.g. 25, or -10 to bring forward): ").strip())
+        except ValueError:
+            print("❌ Invalid time or number of minutes.")
+            return
+
+        bulk = BulkReschedule()
+        plan = bulk.plan(route_color, trip_date, after, offset_minutes)
+        if plan["skipped"]:
+            print(f"⏭️ {len(plan['skipped'])} trip(s) skipped: their new time has already passed")
+        if plan["conflicts"]:
+            print(f"\n❌ {len(plan['conflicts'])} schedule conflict(s):")
+            for conflict in plan["conflicts"]:
+                print(f"   {conflict['tripId']} at {conflict['departure']} is too close to {conflict['conflictsWith']}")
+            if input("\nDelay conflicting trips to the next free slot? (y/n): ").strip().lower() != "y":
+                print("Bulk reschedule cancelled.")
+                return
+            plan = bulk.plan(route_color, trip_date, after, offset_minutes, resolve=True)
+        if not plan["shifts"]:
+            print("No trips to reschedule.")
+            return
+
+        print(f"\nProposed changes ({len(plan['shifts'])} trip(s)):")
+        for shift in plan["shifts"]:
+            extra = f" (+{shift['extraDelayMinutes']} min to clear a conflict)" if shift["extraDelayMinutes"] else ""
+            print(f"   {shift['tripId']}: {shift['originalDeparture']} -> {shift['newDeparture']}{extra}")
+        if input("\nConfirm these changes? (y/n): ").strip().lower() != "y":
+            print("Bulk reschedule cancelled.")
+            return
+        rescheduled = bulk.apply(plan)
+        print(f"✅ {rescheduled} trip(s) rescheduled" if rescheduled else "❌ No trips were rescheduled.")
 
     def _get_valid_trip_date(self):
         """Get a valid trip date from user input (within 30 days)."""
@@ -145,9 +230,7 @@ class SystemAdmin:
             
         print("\nAvailable Trips:")
         for idx, trip in enumerate(trips, 1):
-            dep_time = trip.trip_departure_time
-            if "T" in dep_time:  # Full datetime
-                dep_time = datetime.fromisoformat(dep_time).strftime("%H:%M")
+            dep_time = "N/A" if trip.departure_minute is None else service_time.format_clock(trip.departure_minute)
             print(
                 f"{idx}. {trip.trip_id} - {dep_time} to "
                 f"{trip.trip_arrival_time} ({trip.trip_status})"
@@ -1,90 +1,76 @@
 """Module for handling trip management and operations."""
 
-from datetime import datetime, timedelta
-from utils.json_handler import load_json, save_json
+from utils.json_handler import load_json
 from models.Route import Route
 from models.Notification import Notification
 from models.enums import NotificationType
 from models.Reschedule import Reschedule
+from models.RescheduleStore import RescheduleStore
 from models.enums import TripStatus, TripBookingStatus, OrderStatus
+from models.RefundWorker import RefundWorker
+from models.BookingStore import resolve_trip_bookings
+from models.UnitOfWork import UnitOfWork
+from utils.json_store import JsonStore
+from utils import service_time
 
 class Trip:
     """A class representing a trip with management capabilities."""
 
-    def __init__(self, data):
-        """Initialize a Trip instance with standardized datetime handling."""
+    def __init__(self, data, service_date=None):
+        """Initialize a Trip instance, reading its times into epoch minutes once.
+
+        Args:
+            data (dict): Trip fields as stored or built by a loader
+            service_date (str, optional): 'YYYY-MM-DD' a bare 'HH:MM' departure
+                runs on; defaults to the date in the departure. Without either,
+                a bare 'HH:MM' time is left unset.
+        """
         self.trip_id = data["tripId"]
         self.route_id = data["routeId"]
         self.start_station_id = data.get("startStationId")
         
         # Handle departure time
         departure_time = data.get("departureTime") or data.get("tripDepartureTime", "")
-        self.trip_departure_time = self._standardize_datetime(departure_time)
-        self.original_departure = data.get("originalDeparture", self.trip_departure_time)  # Updated this line
+        self.service_date = service_date or data.get("serviceDate") or (
+            departure_time[:10] if len(departure_time) > 5 else None
+        )
+        self.departure_minute = service_time.parse(departure_time, self.service_date)
+        original_departure = service_time.parse(data.get("originalDeparture"), self.service_date)
+        self.original_departure_minute = (
+            self.departure_minute if original_departure is None else original_departure
+        )
         
         # Calculate arrival time if not provided
-        self.trip_arrival_time = self._standardize_datetime(
-            data.get("tripArrivalTime") or self._calculate_arrival_time()
-        )
+        self.arrival_minute = service_time.parse(data.get("tripArrivalTime"), self.service_date)
+        if self.arrival_minute is None and self.departure_minute is not None:
+            self.arrival_minute = self.departure_minute + self._get_route_duration()
         
         self.trip_status = data.get("tripStatus", TripStatus.SCHEDULED.value)
-        self.trip_reschedule_time = self._standardize_datetime(
-            data.get("tripRescheduleTime")
-        )
+        self.reschedule_minute = service_time.parse(data.get("tripRescheduleTime"), self.service_date)
+
+    # Times are kept as epoch minutes; these give the stored ISO form
+    @property
+    def trip_departure_time(self):
+        return service_time.format_iso(self.departure_minute)
+
+    @property
+    def trip_arrival_time(self):
+        return service_time.format_iso(self.arrival_minute)
+
+    @property
+    def original_departure(self):
+        return service_time.format_iso(self.original_departure_minute)
+
+    @property
+    def trip_reschedule_time(self):
+        return service_time.format_iso(self.reschedule_minute)
 
     def _format_datetime(self, dt_str):
         """Format datetime string for display."""
-        if not dt_str:
-            return "N/A"
-        try:
-            if "T" in dt_str:  # ISO format
-                dt = datetime.fromisoformat(dt_str.replace("Z", ""))
-                return dt.strftime("%Y-%m-%d %H:%M")
-            else:  # Just time
-                return dt_str
-        except ValueError:
-            return dt_str
-
-    def _standardize_datetime(self, dt_str):
-        """Convert any datetime string to full ISO format."""
-        if not dt_str:
-            return None
-            
-        try:
-            # Handle full ISO format
-            if "T" in dt_str:
-                return dt_str  # Already in ISO format
-                
-            # Handle date + time format (YYYY-MM-DD HH:MM)
-            if "-" in dt_str and ":" in dt_str:
-                dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-                return dt.isoformat()
-                
-            # Handle time-only format (assume current date)
-            if ":" in dt_str:
-                time_part = datetime.strptime(dt_str, "%H:%M").time()
-                dt = datetime.combine(datetime.now().date(), time_part)
-                return dt.isoformat()
-                
-            return None
-        except ValueError:
-            return None
-        
-    def _calculate_arrival_time(self):
-        """Calculate arrival time based on route and departure time."""
-        if not self.trip_departure_time:
-            return None
-            
-        try:
-            # Parse departure time (now standardized)
-            departure = datetime.fromisoformat(self.trip_departure_time)
-        except ValueError:
-            return None
-            
-        # Get route duration
-        duration = self._get_route_duration()
-        arrival = departure + timedelta(minutes=duration)
-        return arrival.isoformat()
+        minutes = service_time.parse(dt_str, self.service_date)
+        if minutes is None:
+            return dt_str or "N/A"
+        return service_time.format_display(minutes)
 
     def _get_route_duration(self):
         """Get standard duration for route based on route ID."""
@@ -95,10 +81,14 @@ class Trip:
         return 30  # default
     
     @staticmethod
-    def load_all_trips():
-        """Load all trips from the JSON file."""
+    def load_all_trips(service_date):
+        """Load all trips from the JSON file.
+
+        Args:
+            service_date (str): 'YYYY-MM-DD' to place 'HH:MM' departures on
+        """
         data = load_json("data/trips.json")
-        return [Trip(trip) for trip in data]
+        return [Trip(trip, service_date) for trip in data]
 
     @staticmethod
     def load_trips_by_route(route_color):
@@ -134,20 +124,37 @@ class Trip:
                 minutes = time_part[2:]
                 
                 # Combine with the selected date
-                try:
-                    departure_datetime = datetime.strptime(
-                        f"{trip_date} {hours}:{minutes}", 
-                        "%Y-%m-%d %H:%M"
-                    ).isoformat()
-                except ValueError:
+                departure = service_time.parse(f"{hours}:{minutes}", trip_date)
+                if departure is None:
                     continue
                 
-                trip_copy["departureTime"] = departure_datetime
+                trip_copy["departureTime"] = service_time.format_iso(departure)
                 trip_copy["startStationId"] = trip.get("startStationId", "")
-                filtered.append(trip_copy)
+                filtered.append(Trip.apply_reschedule(trip_copy, trip_date))
         
-        return [Trip(trip) for trip in filtered]
+        return [Trip(trip, trip_date) for trip in filtered]
+
+    @staticmethod
+    def apply_reschedule(trip_data, service_date):
+        """Overlay a trip's effective reschedule for a service date onto its data.
 
+        Args:
+            trip_data (dict): Trip fields with the departure it was due at on that date
+            service_date (str): 'YYYY-MM-DD' the trip was originally due to run
+
+        Returns:
+            dict: The same trip data, updated if the trip was rescheduled.
+        """
+        entry = RescheduleStore.shared().effective(trip_data["tripId"], service_date)
+        if entry:
+            trip_data.update(
+                departureTime=entry["newDeparture"],
+                tripArrivalTime=entry["newArrival"],
+                originalDeparture=entry["originalDeparture"],
+                tripStatus=TripStatus.RESCHEDULED.value,
+                tripRescheduleTime=entry["newDeparture"]
+            )
+        return trip_data
 
     def manage_trip(self):
         """Display trip management interface and handle user input."""
@@ -230,6 +237,7 @@ class Trip:
         
         old_status = self.trip_status
         self.trip_status = selected_status
+        rescheduled = False
         
         # Handle rescheduling with better error messages
         if (selected_status == TripStatus.RESCHEDULED.value or 
@@ -278,79 +286,56 @@ class Trip:
                     confirm = input("\nConfirm this change? (y/n): ").strip().lower()
                     if confirm == 'y':
                         # Store the original time before updating
-                        self.original_departure = self.trip_departure_time
-                        self.trip_departure_time = reschedule_instance.new_departure
-                        self.trip_arrival_time = reschedule_instance.new_arrival
-                        self.trip_reschedule_time = reschedule_instance.new_departure
+                        self.original_departure_minute = self.departure_minute
+                        self.departure_minute = service_time.parse(reschedule_instance.new_departure)
+                        self.arrival_minute = service_time.parse(reschedule_instance.new_arrival)
+                        self.reschedule_minute = self.departure_minute
                         self.trip_status = TripStatus.RESCHEDULED.value
                         reschedule_instance.save_reschedule()
+                        rescheduled = True
                         print("\n✅ Trip rescheduled successfully!")
                         break
                     else:
                         print("\nRescheduling cancelled by user.")
                         break
-            else:
-                if selected_status == TripStatus.RESCHEDULED.value:
-                    self.trip_status = old_status
-                    print("\n⚠️ Rescheduling cancelled - status remains unchanged.")
-                    return
-        
-        self.save_trip()
+            if not rescheduled and selected_status == TripStatus.RESCHEDULED.value:
+                self.trip_status = old_status
+                print("\n⚠️ Rescheduling cancelled - status remains unchanged.")
+                return
+
+        if rescheduled:
+            # The new times hold for this service date only and live in the reschedule
+            # store, like bulk reschedules; the shared timetable row is left alone
+            self._update_related_bookings()
+        else:
+            self.save_trip()
         self.create_and_send_notification()
 
     def reschedule_has_time_conflict(self, new_departure, new_arrival):
         """Check if new trip time conflicts with existing trips."""
-        try:
-            new_start = (
-                datetime.strptime(new_departure.replace("T", " "), "%Y-%m-%d %H:%M:%S")
-                if "T" in new_departure
-                else datetime.strptime(new_departure, "%Y-%m-%d %H:%M")
-            )
-            new_end = (
-                datetime.strptime(new_arrival.replace("T", " "), "%Y-%m-%d %H:%M:%S")
-                if "T" in new_arrival
-                else datetime.strptime(new_arrival, "%Y-%m-%d %H:%M")
-            )
-            
-            trips = Trip.load_all_trips()
-            for trip in trips:
-                if trip.route_id == self.route_id and trip.trip_id != self.trip_id:
-                    existing_start = (
-                        datetime.strptime(
-                            trip.trip_departure_time.replace("T", " "),
-                            "%Y-%m-%d %H:%M:%S"
-                        )
-                        if "T" in trip.trip_departure_time
-                        else datetime.strptime(
-                            trip.trip_departure_time,
-                            "%Y-%m-%d %H:%M"
-                        )
-                    )
-                    existing_end = (
-                        datetime.strptime(
-                            trip.trip_arrival_time.replace("T", " "),
-                            "%Y-%m-%d %H:%M:%S"
-                        )
-                        if "T" in trip.trip_arrival_time
-                        else datetime.strptime(
-                            trip.trip_arrival_time,
-                            "%Y-%m-%d %H:%M"
-                        )
-                    )
-                    
-                    buffer = timedelta(minutes=5)
-                    if ((new_start < existing_end + buffer) and 
-                        (new_end > existing_start - buffer)):
-                        print(
-                            f"Conflict with trip {trip.trip_id} "
-                            f"({existing_start} to {existing_end})"
-                        )
-                        return True
-            return False
-        except ValueError as e:
-            print(f"Error parsing datetime: {e}")
+        new_start = service_time.parse(new_departure)
+        new_end = service_time.parse(new_arrival)
+        if new_start is None or new_end is None:
+            print(f"Error parsing datetime: {new_departure} to {new_arrival}")
             return True
         
+        # Other trips are compared as they run on the day of the new departure,
+        # with any reschedule already made for that day
+        service_date = service_time.service_date(new_start)
+        for trip_data in JsonStore.get("data/trips.json", list, 2).load():
+            if trip_data["routeId"] == self.route_id and trip_data["tripId"] != self.trip_id:
+                trip = Trip(Trip.apply_reschedule(dict(trip_data), service_date), service_date)
+                if trip.departure_minute is None or trip.arrival_minute is None:
+                    continue
+                if service_time.overlaps(new_start, new_end, trip.departure_minute, trip.arrival_minute, buffer=5):
+                    print(
+                        f"Conflict with trip {trip.trip_id} "
+                        f"({service_time.format_display(trip.departure_minute)} to "
+                        f"{service_time.format_display(trip.arrival_minute)})"
+                    )
+                    return True
+        return False
+        
     def request_view_route_details(self):
         """Display details of the trip's route."""
         Route().view_route_details(self.route_id)
@@ -436,21 +421,22 @@ class Trip:
 
     def save_trip(self):
         """Save the trip data to the JSON file and update related bookings."""
-        # Save trip data (existing code)
-        data = load_json("data/trips.json")
-        for i, trip in enumerate(data):
-            if trip["tripId"] == self.trip_id:
-                data[i] = {
-                    "tripId": self.trip_id,
-                    "routeId": self.route_id,
-                    "tripDepartureTime": self.trip_departure_time,
-                    "originalDeparture": self.original_departure,  # Add this line
-                    "tripArrivalTime": self.trip_arrival_time,
-                    "tripStatus": self.trip_status,
-                    "tripRescheduleTime": self.trip_reschedule_time
-                }
-                break
-        save_json("data/trips.json", data)
+        # Written under the trips file lock, so concurrent saves don't lose each other's trips
+        def replace_trip(data):
+            for i, trip in enumerate(data):
+                if trip["tripId"] == self.trip_id:
+                    data[i] = {
+                        "tripId": self.trip_id,
+                        "routeId": self.route_id,
+                        "tripDepartureTime": self.trip_departure_time,
+                        "originalDeparture": self.original_departure,  # Add this line
+                        "tripArrivalTime": self.trip_arrival_time,
+                        "tripStatus": self.trip_status,
+                        "tripRescheduleTime": self.trip_reschedule_time
+                    }
+                    break
+
+        JsonStore.get("data/trips.json", list, 2).update(replace_trip)
         
         # Update booking status if trip is cancelled or rescheduled
         if self.trip_status in [TripStatus.CANCELLED.value, TripStatus.RESCHEDULED.value]:
@@ -459,53 +445,49 @@ class Trip:
     def _update_related_bookings(self):
         """Update status of all bookings for this trip in both orders.json and tripbookings.json."""
         try:
-            orders_data = load_json("data/orders.json")
-            tripbookings_data = load_json("data/tripbookings.json")
-            
             affected_bookings = self.get_affected_bookings()
+            unit_of_work = UnitOfWork()
+            refund_jobs = []
             
             for booking_info in affected_bookings:
                 user_id = booking_info["user_id"]
-                booking_id = booking_info["booking"]["tripBookingId"]
-                
-                # Update in orders.json
-                for order in orders_data.get(user_id, {}).get("orders", []):
-                    if "trip_bookings" in order:
-                        for booking in order["trip_bookings"]:
-                            if booking["tripBookingId"] == booking_id:
-                                # For admin-initiated cancellations
-                                booking["bookingStatus"] = TripBookingStatus.CANCELLED.value
-                                
-                                # Set order status based on cancellation timing
-                                departure_time = booking.get("departureTime", "")
-                                try:
-                                    if "T" in departure_time:
-                                        dep_datetime = datetime.fromisoformat(departure_time)
-                                    else:
-                                        dep_datetime = datetime.combine(
-                                            datetime.now().date(),
-                                            datetime.strptime(departure_time, "%H:%M").time()
-                                        )
-                                    
-                                    time_until_departure = dep_datetime - datetime.now()
-                                    
-                                    if time_until_departure > timedelta(hours=24):
-                                        order["status"] = OrderStatus.REFUND_REQUESTED.value
-                                    else:
-                                        order["status"] = OrderStatus.REFUNDED_FAIL.value
-                                except:
-                                    order["status"] = OrderStatus.REFUNDED_FAIL.value
-                                break
+                booking = booking_info["booking"]
+                order = booking_info["order"]
+
+                # Bookings the user already cancelled were refunded back then
+                if booking.get("bookingStatus") == TripBookingStatus.CANCELLED.value:
+                    continue
                 
-                # Update in tripbookings.json
-                if user_id in tripbookings_data:
-                    for booking in tripbookings_data[user_id]:
-                        if booking["tripBookingId"] == booking_id:
-                            booking["bookingStatus"] = TripBookingStatus.CANCELLED.value
-                            break
+                # Set order status based on cancellation timing; a bare 'HH:MM' is on this trip's day
+                departure = service_time.parse(booking.get("departureTime", ""), self.service_date)
+                if departure is not None and departure - service_time.now() > 24 * 60:
+                    order_status = OrderStatus.REFUND_REQUESTED.value
+                    refund_jobs.extend(RefundWorker.build_order_jobs(
+                        user_id, order, [booking], reason="trip_cancelled"
+                    ))
+                else:
+                    order_status = OrderStatus.REFUNDED_FAIL.value
+
+                # For admin-initiated cancellations
+                unit_of_work.stage("orders", "set_booking_status", {
+                    "userId": user_id,
+                    "tripBookingId": booking["tripBookingId"],
+                    "bookingStatus": TripBookingStatus.CANCELLED.value,
+                    "status": order_status
+                })
+                unit_of_work.stage("tripbookings", "set_status", {
+                    "userId": user_id,
+                    "tripBookingId": booking["tripBookingId"],
+                    "bookingStatus": TripBookingStatus.CANCELLED.value
+                })
             
-            save_json("data/orders.json", orders_data)
-            save_json("data/tripbookings.json", tripbookings_data)
+            if not unit_of_work.commit():
+                return
+
+            # Refunds are paid out by the background worker, not this admin session
+            if refund_jobs:
+                queued = RefundWorker.shared().enqueue(refund_jobs)
+                print(f"💸 {queued} refund(s) queued for processing")
             
         except Exception as e:
             print(f"Error updating booking statuses: {e}")
@@ -513,16 +495,17 @@ class Trip:
     def get_affected_bookings(self):
         """Get all bookings for this trip."""
         try:
-            orders = load_json("data/orders.json")
+            orders = JsonStore.get("data/orders.json", dict, 4).load()
             affected_bookings = []
             
             for user_id, user_data in orders.items():
                 for order in user_data.get("orders", []):
-                    for booking in order.get("trip_bookings", []):
+                    for booking in resolve_trip_bookings(order):
                         if booking.get("tripId") == self.trip_id:
                             affected_bookings.append({
                                 "user_id": user_id,
-                                "booking": booking
+                                "booking": booking,
+                                "order": order
                             })
             return affected_bookings
         except Exception as e:
@@ -1,13 +1,15 @@
 # models/TripBooking.py
 import json
 import os
-from datetime import datetime, time
+from utils import service_time
 from models.Notification import Notification
-from models.enums import NotificationType, TripBookingStatus
-from models.PointsLedger import PointsLedger
+from models.enums import NotificationType, TripBookingStatus, TripStatus
+from models.RefundWorker import RefundWorker
 from models.enums import OrderStatus
 from models.Trip import Trip
+from models.RescheduleStore import RescheduleStore
 from models.Order import Order
+from models.OrderHistory import OrderHistory
 
 class TripBooking:
     def __init__(self):
@@ -78,33 +80,32 @@ class TripBooking:
 
     def get_trip_details(self, station_id, trip_date):
         """Get trips that start from the given station on the given date"""
-        all_trips = Trip.load_all_trips()
+        try:
+            day = service_time.day_start(trip_date)
+        except ValueError:
+            return []
+        all_trips = Trip.load_all_trips(trip_date)
         matching_trips = []
         
         for trip in all_trips:
             if hasattr(trip, 'start_station_id') and trip.start_station_id == station_id:
-                if trip.trip_departure_time:
-                    if "T" in trip.trip_departure_time:
-                        time_part = datetime.fromisoformat(trip.trip_departure_time).time()
-                    else:
-                        try:
-                            time_part = datetime.strptime(trip.trip_departure_time, "%H:%M").time()
-                        except ValueError:
-                            continue
-                    
-                    try:
-                        selected_date = datetime.strptime(trip_date, "%Y-%m-%d").date()
-                        departure_datetime = datetime.combine(selected_date, time_part)
-                        departure_time = departure_datetime.isoformat()
-                    except ValueError:
-                        continue
+                if trip.departure_minute is not None:
+                    # Same time of day on the selected date, keeping the trip's duration
+                    departure = day + service_time.minute_of_day(trip.departure_minute)
+                    departure_time = service_time.format_iso(departure)
+                    arrival_time = service_time.format_iso(departure + trip.arrival_minute - trip.departure_minute)
+                    status = trip.trip_status
+                    reschedule = RescheduleStore.shared().effective(trip.trip_id, trip_date)
+                    if reschedule:
+                        departure_time, arrival_time = reschedule["newDeparture"], reschedule["newArrival"]
+                        status = TripStatus.RESCHEDULED.value
                     
                     matching_trips.append({
                         "tripId": trip.trip_id,
                         "routeId": trip.route_id,
                         "departureTime": departure_time,
-                        "arrivalTime": trip.trip_arrival_time,
-                        "status": trip.trip_status
+                        "arrivalTime": arrival_time,
+                        "status": status
                     })
         
         return matching_trips
@@ -125,143 +126,97 @@ class TripBooking:
         user_id = user["userID"]
         order = Order(user_id)
         
-        active_bookings = order.get_active_trip_bookings()
-        if not active_bookings:
-            return
-            
-        selected_booking = self._prompt_booking_selection(active_bookings)
+        selected_booking = self._prompt_booking_selection(OrderHistory(user_id))
         if not selected_booking:
             return
             
         self._execute_cancellation(order, selected_booking)
 
-    def _prompt_booking_selection(self, active_bookings):
-        """Display bookings and get user selection"""
-        print("\n🧾 Your Active Trip Bookings:")
-        
-        # Create a list of cancellable bookings
-        cancellable_bookings = []
-        
-        for i, booking in enumerate(active_bookings, 1):
-            status = booking.get("bookingStatus", "")
-            status_icon = "❌" if status == TripBookingStatus.CANCELLED.value else "✓"
-            
-            # Display all bookings
-            print(f"{i}. {status_icon} Booking ID: {booking['tripBookingId']}")
-            print(f"   Trip ID: {booking['tripId']}")
-            print(f"   From: {booking['fromStationId']} → To: {booking['toStationId']}")
-            print(f"   Status: {status}")
-            
-            # Only add to cancellable list if not cancelled
-            if status != TripBookingStatus.CANCELLED.value:
-                cancellable_bookings.append((i, booking))
-
-        if not cancellable_bookings:
-            print("\nNo cancellable bookings available.")
-            return None
-
+    def _prompt_booking_selection(self, history):
+        """Display active bookings a page at a time and get user selection"""
+        cursor = None
         while True:
-            selection = input("\nEnter booking number to cancel (or 'cancel'): ").strip()
-            if selection.lower() == 'cancel':
-                print("↩️ Returning to main menu.")
+            page, next_cursor = history.bookings_page(cursor=cursor, active_only=True)
+            if not page:
+                print("\nNo cancellable bookings available.")
                 return None
 
-            if not selection.isdigit():
-                print("❌ Please enter a valid number.")
-                continue
-
-            selected_num = int(selection)
-            
-            # Find the booking in cancellable_bookings
-            selected_booking = None
-            for num, booking in cancellable_bookings:
-                if num == selected_num:
-                    selected_booking = booking
+            print("\n🧾 Your Active Trip Bookings:")
+            for i, booking in enumerate(page, 1):
+                print(f"{i}. ✓ Booking ID: {booking['tripBookingId']}")
+                print(f"   Trip ID: {booking['tripId']}")
+                print(f"   From: {booking['fromStationId']} → To: {booking['toStationId']}")
+                print(f"   Status: {booking.get('bookingStatus', '')}")
+
+            more = ", 'n' for older bookings" if next_cursor else ""
+            while True:
+                selection = input(f"\nEnter booking number to cancel{more} (or 'cancel'): ").strip()
+                if selection.lower() == 'cancel':
+                    print("↩️ Returning to main menu.")
+                    return None
+
+                if selection.lower() == 'n' and next_cursor:
+                    cursor = next_cursor
                     break
-            
-            if not selected_booking:
-                print("❌ Cannot cancel an already cancelled booking. Please select a valid booking.")
-                continue
-                
-            confirm = input(f"\nCancel booking {selected_booking['tripBookingId']}? (y/n): ").strip().lower()
-            if confirm == 'y':
-                return selected_booking
-            elif confirm == 'n':
-                return None
-            else:
-                print("❌ Please enter 'y' or 'n'.")
 
-    def _display_booking_details(self, index, booking):
-        """Format and display booking details"""
-        try:
-            dep_time = booking.get("departureTime", "")
-            if "T" in dep_time:
-                dep_datetime = datetime.fromisoformat(dep_time)
-            else:
-                dep_datetime = datetime.combine(
-                    datetime.now().date(),
-                    datetime.strptime(dep_time, "%H:%M").time()
-                )
-            
-            status = booking.get("bookingStatus", "UNKNOWN")
-            status_icon = "❌" if status == TripBookingStatus.CANCELLED.value else "✓"
-            
-            print(f"{index}. {status_icon} Booking ID: {booking['tripBookingId']}")
-            print(f"   Trip ID: {booking['tripId']}")
-            print(f"   Date: {dep_datetime.strftime('%Y-%m-%d')}")
-            print(f"   Departure: {dep_datetime.strftime('%H:%M')}")
-            print(f"   From: {booking['fromStationId']} → To: {booking['toStationId']}")
-            print(f"   Status: {status}")
-        except ValueError:
-            print(f"{index}. [Error parsing date for booking {booking['tripBookingId']}]")
+                if not selection.isdigit() or not 1 <= int(selection) <= len(page):
+                    print("❌ Please enter a valid number.")
+                    continue
+
+                selected_booking = page[int(selection) - 1]
+                confirm = input(f"\nCancel booking {selected_booking['tripBookingId']}? (y/n): ").strip().lower()
+                if confirm == 'y':
+                    return selected_booking
+                elif confirm == 'n':
+                    return None
+                else:
+                    print("❌ Please enter 'y' or 'n'.")
 
     def _execute_cancellation(self, order, booking):
         """Execute all cancellation steps"""
         notification = Notification()
         
-        try:
-            dep_datetime = self._parse_departure_time(booking["departureTime"])
-        except ValueError:
+        departure = self._parse_departure_time(booking["departureTime"])
+        if departure is None:
             print("❌ Error parsing departure time")
             return
 
-        # Delegate status updates to Order class
-        order.cancel_trip_booking(booking["tripBookingId"], dep_datetime)
-        
+        # Delegate status updates to Order class; nothing is refunded unless they were saved
+        if not order.cancel_trip_booking(booking["tripBookingId"], departure):
+            print(f"❌ Booking {booking['tripBookingId']} could not be cancelled; no refund was requested")
+            return
+
         # Display status updates
         print(f"\n📊 Status Updates:")
         print(f"- Booking Status: {TripBookingStatus.CANCELLED.value}")
-        print(f"- Order Status: {OrderStatus.REFUNDED_FAIL.value if (dep_datetime - datetime.now()).total_seconds() <= 86400 else OrderStatus.REFUNDED.value}")
+        print(f"- Order Status: {OrderStatus.REFUNDED_FAIL.value if departure - service_time.now() <= 24 * 60 else OrderStatus.REFUND_REQUESTED.value}")
         
         # Handle refund notification
         self._handle_refund_notification(
             order._user_id,
             booking,
-            dep_datetime,
+            departure,
             notification
         )
 
     def _parse_departure_time(self, departure_time_str):
-        """Parse departure time string into datetime object"""
-        try:
-            return datetime.fromisoformat(departure_time_str)
-        except ValueError:
-            departure_time = time.fromisoformat(departure_time_str)
-            return datetime.combine(datetime.now().date(), departure_time)
+        """Parse a booking's departure time into epoch minutes, or None.
+
+        Bookings saved before departures carried a date give None until
+        'python -m utils.migrations normalize-times' dates them.
+        """
+        return service_time.parse(departure_time_str)
 
-    def _handle_refund_notification(self, user_id, booking, dep_datetime, notification):
+    def _handle_refund_notification(self, user_id, booking, departure, notification):
         """Handle refund notification based on cancellation timing"""
-        if (dep_datetime - datetime.now()).total_seconds() > 86400:
+        if departure - service_time.now() > 24 * 60:
             fare = booking.get("fare", 0)
-            PointsLedger().earn_points(user_id, int(fare))
-            
-            notification.create_notification(
-                f"Booking {booking['tripBookingId']} cancelled. Refund: {int(fare)} points",
-                NotificationType.REFUND_STATUS,
-                "user",
-                user_id
-            )
-            print(f"💸 Refund issued: RM{fare:.2f} → {int(fare)} points added")
+            # The refund worker credits the points and notifies the user
+            RefundWorker.shared().enqueue([RefundWorker.build_job(
+                user_id, booking.get("orderId"), booking,
+                points=int(fare), reason="user_cancelled"
+            )])
+            print(f"💸 Refund requested: RM{fare:.2f} → {int(fare)} points will be added shortly")
         else:
             notification.create_notification(
                 f"Booking {booking['tripBookingId']} cancelled (no refund - within 24h)",
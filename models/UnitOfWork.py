@@ -0,0 +1,369 @@
+"""Module for committing checkout changes across data files as one unit."""
+
+import json
+import os
+import uuid
+from datetime import datetime
+from models.BookingIndex import booking_index
+from models.FulfillmentStore import FULFILLMENT_FILE, add_batch, enqueue_order, set_status
+from models.IdempotencyStore import IDEMPOTENCY_FILE, put_record
+from models.Notification import NOTIFICATIONS_FILE
+from models.OrderIndex import order_index
+from models.PointsLedger import PointsLedger
+from models.ReceiptStore import ReceiptStore
+from models.RescheduleStore import RESCHEDULES_FILE, append_reschedule
+from models.StockMonitor import StockMonitor
+from models.StockReservation import StockReservationService
+from utils.json_store import CorruptStoreError, JsonStore
+
+JOURNAL_DIR = "data/journal"
+
+# store name -> (file, empty value, json indent)
+STORES = {
+    "orders": ("data/orders.json", dict, 4),
+    "tripbookings": ("data/tripbookings.json", dict, 4),
+    "notifications": (NOTIFICATIONS_FILE, list, 2),
+    "idempotency": (IDEMPOTENCY_FILE, dict, 2),
+    "fulfillment": (FULFILLMENT_FILE, dict, 2),
+    "reschedules": (RESCHEDULES_FILE, list, 4),
+}
+
+
+# store name -> index told about a store's changes once they are saved
+STORE_INDEXES = {
+    "orders": order_index,
+}
+
+
+class UnitOfWorkAborted(Exception):
+    """Raised when a staged change can no longer be applied."""
+
+
+def _append_order(orders, payload):
+    order_id = payload["order"]["order_id"]
+    if order_index.find(orders, order_id)[1] is None:
+        user_orders = orders.setdefault(payload["userId"], {"orders": []})["orders"]
+        user_orders.append(payload["order"])
+        order_index.order_added(orders, payload["userId"], len(user_orders) - 1)
+        booking_index.order_added(orders, payload["userId"], len(user_orders) - 1)
+
+
+def _append_trip_bookings(tripbookings, payload):
+    user_bookings = tripbookings.setdefault(payload["userId"], [])
+    first_pos = len(user_bookings)
+    added = set()
+    for booking in payload["bookings"]:
+        booking_id = booking["tripBookingId"]
+        if booking_id not in added and booking_index.locate_in_tripbookings(tripbookings, booking_id) is None:
+            user_bookings.append(booking)
+            added.add(booking_id)
+    booking_index.bookings_added(tripbookings, payload["userId"], first_pos)
+
+
+def _set_order_booking_status(orders, payload):
+    # Located by booking: older bookings don't record their order ID
+    order, booking = booking_index.locate_in_orders(orders, payload["tripBookingId"], payload["userId"])
+    if order is not None and "status" in payload:
+        old_status = order.get("status")
+        order["status"] = payload["status"]
+        order_index.status_changed(orders, order, old_status)
+    if booking is not None:
+        # Orders saved before bookings were normalized carry their own copy
+        booking["bookingStatus"] = payload["bookingStatus"]
+        if "departureTime" in payload:
+            booking["departureTime"] = payload["departureTime"]
+
+
+def _set_booking_status(tripbookings, payload):
+    booking = booking_index.locate_in_tripbookings(tripbookings, payload["tripBookingId"], payload["userId"])
+    if booking is not None:
+        booking["bookingStatus"] = payload["bookingStatus"]
+        if "departureTime" in payload:
+            booking["departureTime"] = payload["departureTime"]
+
+
+class _AppendRecord:
+    """Appends a record to a list store unless one with its ID is already there.
+
+    The IDs seen are kept in a set that catches up with records appended by
+    other writers since the last call, and is rebuilt when the store reloads.
+    """
+
+    def __init__(self, id_key):
+        self.id_key = id_key
+        self._records = None
+        self._ids = set()
+        self._seen = 0
+
+    def __call__(self, records, payload):
+        if records is not self._records or len(records) < self._seen:
+            self._records = records
+            self._ids = set()
+            self._seen = 0
+        self._ids.update(record.get(self.id_key) for record in records[self._seen:])
+        if payload[self.id_key] not in self._ids:
+            records.append(payload)
+            self._ids.add(payload[self.id_key])
+        self._seen = len(records)
+
+
+APPLIERS = {
+    ("orders", "append_order"): _append_order,
+    ("orders", "set_booking_status"): _set_order_booking_status,
+    ("tripbookings", "append_bookings"): _append_trip_bookings,
+    ("tripbookings", "set_status"): _set_booking_status,
+    ("notifications", "append"): _AppendRecord("notificationId"),
+    ("idempotency", "put"): put_record,
+    ("fulfillment", "enqueue"): enqueue_order,
+    ("fulfillment", "add_batch"): add_batch,
+    ("fulfillment", "set_status"): set_status,
+    ("reschedules", "append"): append_reschedule,
+}
+
+
+class UnitOfWork:
+    """Stages changes to several data stores and commits them together.
+
+    commit() first writes a write-ahead record of every staged change to the
+    journal directory, then applies the changes with one load and one save
+    per touched store, and finally removes the record. If the process dies
+    part-way, recover() re-applies the record on the next start; every
+    change is keyed by its record ID, so applying it twice is harmless.
+    """
+
+    def __init__(self, log=None):
+        """Initialize an empty unit of work.
+
+        Args:
+            log (callable, optional): Receives problem messages instead of the
+                console, and points changes are applied without printing;
+                for units of work committed off the main thread.
+        """
+        self.txn_id = str(uuid.uuid4())
+        self._changes = []
+        self._log = log
+        self.pending = False  # True once a failed commit has been left for recover()
+
+    def stage(self, store, op, payload):
+        """Stage a change to be applied on commit.
+
+        Args:
+            store (str): 'points', 'stock', 'receipts' or a key of STORES.
+            op (str): Operation name understood by the store.
+            payload (dict): JSON-serializable data for the operation.
+        """
+        special = {("receipts", "append"), ("stock", "commit")}
+        if (store, op) not in special and store != "points" and (store, op) not in APPLIERS:
+            raise ValueError(f"Unknown operation {op} for store {store}")
+        if store == "points":
+            payload = dict(payload, entryId=payload.get("entryId") or str(uuid.uuid4()))
+        self._changes.append({"store": store, "op": op, "payload": payload})
+
+    def commit(self):
+        """Write the journal record and apply every staged change.
+
+        Returns:
+            bool: False if the changes were not all applied. If nothing was
+            written, pending is False; if a store write failed after the
+            journal record was made, the record is kept, pending is True
+            and recover() finishes the commit on the next start.
+        """
+        if not self._changes:
+            return True
+
+        ledger = PointsLedger.shared()
+        record = {
+            "txnId": self.txn_id,
+            "createdAt": datetime.now().isoformat(),
+            "pointsLogOffset": ledger.log_size(),
+            "changes": self._changes
+        }
+        try:
+            journal_file = self._write_journal(record)
+        except OSError as e:
+            (self._log or print)(f"❌ Could not write transaction {self.txn_id}: {e}")
+            return False
+
+        try:
+            self._apply(record, quiet=self._log is not None)
+        except UnitOfWorkAborted as e:
+            # Raised before any store was written
+            (self._log or print)(f"❌ {e}")
+            os.remove(journal_file)
+            return False
+        except Exception as e:
+            (self._log or print)(f"❌ Transaction {self.txn_id} failed part-way and will be completed on restart: {e}")
+            self.pending = True
+            return False
+
+        os.remove(journal_file)
+        self._changes = []
+        return True
+
+    @staticmethod
+    def recover():
+        """Re-apply journal records left behind by an interrupted commit.
+
+        Returns:
+            int: Number of records recovered.
+        """
+        if not os.path.isdir(JOURNAL_DIR):
+            return 0
+
+        recovered = 0
+        for name in sorted(os.listdir(JOURNAL_DIR)):
+            if not name.endswith(".json"):
+                continue
+            journal_file = os.path.join(JOURNAL_DIR, name)
+            try:
+                with open(journal_file, "r") as f:
+                    record = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                # Torn write of the record itself: nothing was applied yet
+                os.remove(journal_file)
+                continue
+
+            try:
+                UnitOfWork._apply(record, recovering=True)
+            except UnitOfWorkAborted as e:
+                print(f"⚠️ Could not recover transaction {record['txnId']}: {e}")
+            except Exception as e:
+                # Keep the record for the next start
+                print(f"⚠️ Transaction {record['txnId']} is still pending: {e}")
+                continue
+            os.remove(journal_file)
+            recovered += 1
+        return recovered
+
+    def _write_journal(self, record):
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        journal_file = os.path.join(JOURNAL_DIR, f"{self.txn_id}.json")
+        tmp_file = f"{journal_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(record, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, journal_file)
+        return journal_file
+
+    @staticmethod
+    def _apply(record, recovering=False, quiet=False):
+        changes = record["changes"]
+        touched = []
+        for change in changes:
+            if change["store"] not in ("points", "stock", "receipts") and change["store"] not in touched:
+                touched.append(change["store"])
+
+        # Read every store up front, so an unreadable one aborts before anything is written
+        stores = {}
+        for store_name in touched:
+            file_path, default_factory, indent = STORES[store_name]
+            stores[store_name] = JsonStore.get(file_path, default_factory, indent)
+            try:
+                stores[store_name].load()
+            except CorruptStoreError as e:
+                if recovering:
+                    raise
+                raise UnitOfWorkAborted(str(e)) from e
+
+        # Stock holds are renewed first, so stock that is gone aborts before anything is written
+        stock_changes = [c for c in changes if c["store"] == "stock"]
+        if stock_changes:
+            UnitOfWork._renew_stock(stock_changes)
+
+        # Points go next: a lapsed redemption aborts before anything is written
+        points_changes = [c for c in changes if c["store"] == "points"]
+        if points_changes:
+            UnitOfWork._apply_points(points_changes, record, recovering, quiet)
+
+        # Stock is taken before the order is written, so a paid order always has its stock
+        if stock_changes:
+            UnitOfWork._apply_stock(stock_changes, quiet)
+
+        # Receipts are appended to their own log; a receipt already there is skipped
+        for change in changes:
+            if change["store"] == "receipts":
+                ReceiptStore.shared().append(change["payload"])
+
+        for store_name in touched:
+            store = stores[store_name]
+            store_changes = [c for c in changes if c["store"] == store_name]
+
+            def apply_all(data, store_changes=store_changes, store_name=store_name):
+                for change in store_changes:
+                    APPLIERS[(store_name, change["op"])](data, change["payload"])
+
+            index = STORE_INDEXES.get(store_name)
+            if index is None:
+                store.update(apply_all)
+                continue
+            # The index takes in the changes only once they are on disk
+            with store.lock:
+                try:
+                    store.update(apply_all)
+                except Exception:
+                    index.discard()
+                    raise
+                index.saved(store.load())
+
+    @staticmethod
+    def _apply_points(changes, record, recovering, quiet=False):
+        ledger = PointsLedger.shared()
+        applied = set()
+        if recovering:
+            applied = ledger.entry_ids_since(record["pointsLogOffset"])
+
+        for change in changes:
+            payload = change["payload"]
+            if payload["entryId"] in applied:
+                continue
+
+            if change["op"] == "commit_reservation":
+                committed = ledger.commit_reservation(
+                    payload["reservationId"], entry_id=payload["entryId"]
+                )
+                if not committed:
+                    # The hold lapsed while paying; take the points directly if still there
+                    committed = ledger.deduct_points(
+                        payload["userId"], payload["points"], "order", payload["orderId"],
+                        entry_id=payload["entryId"]
+                    )
+                if not committed:
+                    raise UnitOfWorkAborted("Redeemed points are no longer available for this order")
+            elif change["op"] == "earn":
+                ledger.earn_points(
+                    payload["userId"], payload["points"], "order", payload["orderId"],
+                    entry_id=payload["entryId"], quiet=quiet
+                )
+            elif change["op"] == "refund":
+                ledger.refund_points(
+                    payload["userId"], payload["points"], "booking", payload["tripBookingId"],
+                    entry_id=payload["entryId"], quiet=quiet
+                )
+            else:
+                raise ValueError(f"Unknown points operation {change['op']}")
+
+    @staticmethod
+    def _renew_stock(changes):
+        stock_service = StockReservationService.shared()
+        for change in changes:
+            payload = change["payload"]
+            if not stock_service.renew(payload["reservationId"], payload["quantity"]):
+                raise UnitOfWorkAborted(f"{payload['itemName']} is no longer in stock")
+
+    @staticmethod
+    def _apply_stock(changes, quiet=False):
+        stock_service = StockReservationService.shared()
+        sales = []
+        for change in changes:
+            payload = change["payload"]
+            if not stock_service.commit(payload["reservationId"], payload["quantity"]):
+                # Renewed moments ago; keep the record so recover() retries it
+                raise RuntimeError(f"Stock held for {payload['itemName']} was lost")
+            item_id = stock_service.item_of(payload["reservationId"])
+            sales.append((item_id, payload["itemName"], payload["quantity"], stock_service.available(item_id)))
+        try:
+            StockMonitor.shared().record_sales(sales, order_id=changes[0]["payload"]["orderId"])
+        except Exception as e:
+            if not quiet:
+                print(f"⚠️ Stock monitor error: {str(e)}")
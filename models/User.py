@@ -5,10 +5,12 @@ from models.Merchandise import Merchandise
 from models.Notification import Notification
 from models.enums import NotificationType
 from models.PointsLedger import PointsLedger
-from utils.json_handler import load_json, save_json
+from models.Receipt import Receipt
+from models.ReceiptStore import ReceiptStore
+from models.IdempotencyStore import IdempotencyStore
+from utils import service_time
 from datetime import datetime
 from datetime import timedelta
-import uuid
 
 # In User.py
 @staticmethod
@@ -17,12 +19,31 @@ def request_cancel_orders(user):
     trip_booking = TripBooking()
     trip_booking.process_cancellation(user)
 
+def request_reprint_receipt(user_id, limit=10):
+    """Let the user pick one of their recent receipts and print it again"""
+    receipts = ReceiptStore.shared().for_user(user_id)[:limit]
+    if not receipts:
+        print("\nYou have no receipts yet.")
+        return
+
+    print("\n🧾 Your Recent Receipts:")
+    for idx, receipt in enumerate(receipts, 1):
+        print(f"{idx}. {receipt['timestamp'][:16].replace('T', ' ')} - Order {receipt['order_id']} - RM{receipt['final_amount']:.2f}")
+
+    selection = input("Enter receipt number to reprint (or press Enter to go back): ").strip()
+    if selection.isdigit() and 1 <= int(selection) <= len(receipts):
+        Receipt(None).print_receipt(receipts[int(selection) - 1])
+
 def show_points_balance(user_id):
     """Display the user's current points balance"""
-    ledger = PointsLedger()
+    ledger = PointsLedger.shared()
     points = ledger.get_points(user_id)
     print(f"\n⭐ Your current points balance: {points}")
     print(f"💵 Equivalent value: RM{points:.2f}")
+    expiring = ledger.get_expiring_points(user_id)
+    if expiring:
+        expiring_points, expires_at = expiring
+        print(f"⏳ {expiring_points} points expire on {expires_at[:10]}")
 
 def show_main_menu(user):
     user_name = user["userName"]
@@ -59,9 +80,12 @@ def show_main_menu(user):
                 print("❌ No items selected. Returning to menu.")
                 continue
 
-            order = Order(user_id)
-            for itemName, quantity, price in selected_items:
-                order.request_add_merchandise(itemName, quantity, price)
+            # A retry of the same cart reuses its request key, so it can't double-charge or double-order
+            cart = [list(item) for item in selected_items]
+            idempotency = IdempotencyStore.shared()
+            order = Order(user_id, idempotency_key=idempotency.checkout_key(user_id, cart))
+            for (itemName, quantity, price), reservation_id in zip(selected_items, merch.reservation_ids):
+                order.request_add_merchandise(itemName, quantity, price, reservation_id)
 
             # Show selected items
             print("\n🧾 Selected Items:")
@@ -70,28 +94,37 @@ def show_main_menu(user):
 
             # Handle points redemption
             if not order.request_apply_points_redemption():
+                order.abandon_order()
                 continue
                 
             # Payment processing
             if not order.request_select_payment_method():
+                order.abandon_order()
                 continue
                 
             if order.request_process_payment():
-                order.submit_order()
+                if order.submit_order():
+                    idempotency.checkout_finished(user_id, cart)
 
                 order.process_merchandise_order()
                 order.request_receipt_generation()
                 
                 # Refresh points display
                 show_points_balance(user_id)
-                # Save merchandise changes
-                merch.save_merchandise()
-                merch.save_users()
+                # Stock was taken by the reservation service when the order was submitted
             else:
                 print("❌ Order cancelled due to payment failure.")
 
         elif choice == '3':
-            request_cancel_orders(user)
+            print("\n1. Cancel a Trip Booking")
+            print("2. Reprint a Receipt")
+            sub_choice = input("Enter your choice (1-2): ").strip()
+            if sub_choice == '1':
+                request_cancel_orders(user)
+            elif sub_choice == '2':
+                request_reprint_receipt(user_id)
+            else:
+                print("Invalid choice.")
             
         elif choice == '4':
             show_points_balance(user_id)
@@ -118,11 +151,7 @@ def show_main_menu(user):
             
             mark_read = input("\nMark all as read? (y/n): ").lower()
             if mark_read == 'y':
-                data = load_json("data/notifications.json")
-                for n in data:
-                    if n.get('recipientType') == 'user' and str(user_id) in n.get('recipientUserIds', []):
-                        n["notificationStatus"] = "Read"
-                save_json("data/notifications.json", data)
+                notification.mark_user_notifications_read(user_id)
                 print("All notifications marked as read.")
 
         elif choice == '6':
@@ -137,7 +166,6 @@ def request_trip_booking(user_id):
     print("🚌 Book Ticket\n")
     
     trip_booking = TripBooking()
-    order = Order(user_id)
 
     # Get date selection from user
     while True:
@@ -207,9 +235,10 @@ def request_trip_booking(user_id):
     print(f"\nAvailable Trips on {trip_date}:")
     for idx, trip in enumerate(trips, 1):
         dep_time = trip.get("departureTime", "")
-        if "T" in dep_time:  # Full datetime
+        departure = service_time.parse(dep_time)
+        if departure is not None:
             # Format as just time for display
-            dep_time = datetime.fromisoformat(dep_time).strftime("%H:%M")
+            dep_time = service_time.format_clock(departure)
         print(f"{idx}. Trip {trip['tripId']} at {dep_time}")
 
     # Select trip
@@ -240,8 +269,11 @@ def request_trip_booking(user_id):
 
     print(f"🎟️ Total for {ticket_count} ticket(s): RM{connection['fare'] * ticket_count:.2f}")
 
-    # Create order
-    order_id = str(uuid.uuid4())
+    # Create order; a retry of the same booking reuses its request key
+    cart = [trip_date, from_station, to_station, selected_trip["tripId"], selected_trip["departureTime"], ticket_count]
+    idempotency = IdempotencyStore.shared()
+    checkout_key = idempotency.checkout_key(user_id, cart)
+    order = Order(user_id, idempotency_key=checkout_key)
     order.create_order()
     order.request_add_trip_booking(
         trip_booking_obj=trip_booking,
@@ -250,7 +282,8 @@ def request_trip_booking(user_id):
         ticket_count=ticket_count,
         fare_override=connection["fare"],
         trip_date=trip_date,
-        departure_time=selected_trip["departureTime"]  # Add this line to pass the selected time
+        departure_time=selected_trip["departureTime"],  # Add this line to pass the selected time
+        idempotency_key=f"{checkout_key}:booking"
     )
 
     # Add points redemption option
@@ -260,11 +293,13 @@ def request_trip_booking(user_id):
     
     # Process payment
     if not order.request_select_payment_method():
+        order.abandon_order()
         print("❌ Payment method selection cancelled")
         return False, 0, 0  # Return failure status
         
     if order.request_process_payment():
-        order.submit_order()
+        if order.submit_order():
+            idempotency.checkout_finished(user_id, cart)
         print("\n✅ Booking confirmed!")
         order.request_receipt_generation()  # Add this line to generate receipt
         return True, connection['fare'], ticket_count  # Return success with fare and ticket count
@@ -1,7 +1,9 @@
+import hmac
 import json
 import os
 import re
 import uuid
+from models.AccountIndex import account_index
 
 USERS_FILE = 'data/users.json'
 
@@ -67,22 +69,21 @@ def signup():
 
     users[userID] = new_user
     save_users(users)
+    account_index.add_user(new_user)
 
     print(f"✅ Account created successfully for {userName}. Your user ID is {userID}")
     return new_user
 
 # In UserService.py
 def login(email=None, password=None):
-    users = load_users()
-
     if email is None:
         print("\n--- User Login ---")
         email = input("Enter your email: ").strip()
         password = input("Enter your password: ").strip()
 
-    # Search for user with matching email
-    for user in users.values():
-        if user["userEmail"] == email and user["userPassword"] == password:
+    # Look up the users with this email through the shared email index
+    for user in account_index.find_users(email):
+        if hmac.compare_digest(user["userPassword"].encode(), password.encode()):
             print(f"👋 Welcome back, {user['userName']}!")
             return user
 
@@ -4,6 +4,7 @@ class AuthenticationServiceStatus(Enum):
     SUCCESS = "Success"
     FAILED = "Failed"
     LOCKED = "Locked"
+    RATE_LIMITED = "Rate_limited"
 
 class PaymentMethod(Enum):
     CREDIT_CARD = "CREDIT_CARD"
@@ -46,4 +47,19 @@ class OrderStatus(Enum):
     REFUND_REQUESTED = "Refund_Requested"  # New status
     COMPLETED = "Completed"
     CANCELLED = "Cancelled"
-    CANCELLATION_FAIL = "Cancellation_Fail"
\ No newline at end of file
+    CANCELLATION_FAIL = "Cancellation_Fail"
+
+class PointsTransactionType(Enum):
+    OPENING = "Opening"
+    EARN = "Earn"
+    REDEEM = "Redeem"
+    REFUND = "Refund"
+    EXPIRE = "Expire"
+    RESERVE = "Reserve"
+    RELEASE = "Release"
+
+class FulfillmentStatus(Enum):
+    QUEUED = "Queued"
+    PICKED = "Picked"
+    READY = "Ready"
+    COLLECTED = "Collected"
@@ -0,0 +1,160 @@
+# utils/export.py
+"""Streaming exports of receipts and orders for finance.
+
+Run from the project root, for example:
+
+    python -m utils.export receipts --since 2025-06-01 --until 2025-06-30 -o receipts.csv
+    python -m utils.export orders --format jsonl --payment-method E_WALLET --gzip -o orders.jsonl.gz
+
+Records are read one at a time and written in chunks, so memory use does
+not grow with the size of the history.
+"""
+import argparse
+import csv
+import gzip
+import json
+import sys
+import time
+from utils.json_stream import iter_items
+
+ORDERS_FILE = "data/orders.json"
+CHUNK_ROWS = 1000
+
+RECEIPT_COLUMNS = [
+    "receipt_id", "order_id", "user_id", "timestamp", "payment_method", "payment_status",
+    "order_status", "total_amount", "points_redeemed", "final_amount", "item_count",
+]
+ORDER_COLUMNS = [
+    "order_id", "user_id", "timestamp", "status", "payment_method",
+    "total", "points_redeemed", "final_amount", "item_count", "trip_count",
+]
+
+
+def iter_receipts():
+    """Yield receipt rows, oldest first"""
+    from models.ReceiptStore import ReceiptStore
+
+    for receipt in ReceiptStore.shared().iter_receipts():
+        yield dict(receipt, item_count=len(receipt.get("items", [])))
+
+
+def iter_orders(orders_file=ORDERS_FILE):
+    """Yield order rows, streaming orders.json one user at a time"""
+    for user_id, user_data in iter_items(orders_file):
+        for order in user_data.get("orders", []):
+            trips = order.get("trip_booking_ids", order.get("trip_bookings", []))
+            yield dict(
+                order,
+                user_id=order.get("user_id") or user_id,
+                item_count=sum(item[1] for item in order.get("items", [])),
+                trip_count=len(trips)
+            )
+
+
+SOURCES = {
+    "receipts": (iter_receipts, RECEIPT_COLUMNS),
+    "orders": (iter_orders, ORDER_COLUMNS),
+}
+
+
+def _matches(row, since, until, payment_method):
+    timestamp = row.get("timestamp") or ""
+    if since and timestamp[:len(since)] < since:
+        return False
+    if until and timestamp[:len(until)] > until:
+        return False
+    if payment_method and row.get("payment_method") != payment_method:
+        return False
+    return True
+
+
+def _open_output(path, compress):
+    if path in (None, "-"):
+        if compress:
+            return gzip.open(sys.stdout.buffer, "wt", newline=""), True
+        return sys.stdout, False
+    if compress:
+        return gzip.open(path, "wt", newline=""), True
+    return open(path, "w", newline=""), True
+
+
+def export(source, output=None, fmt="csv", since=None, until=None, payment_method=None,
+           compress=False, chunk_rows=CHUNK_ROWS):
+    """Stream one store to CSV or JSON lines.
+
+    Args:
+        source (str): 'receipts' or 'orders'
+        output (str, optional): Output file; standard output if omitted or '-'
+        fmt (str): 'csv' or 'jsonl'
+        since (str, optional): Earliest timestamp, e.g. '2025-06-01'
+        until (str, optional): Latest timestamp, inclusive, e.g. '2025-06-30'
+        payment_method (str, optional): Only this PaymentMethod value
+        compress (bool): Gzip the output file
+        chunk_rows (int): Rows buffered before each write
+
+    Returns:
+        dict: Rows scanned and written, seconds taken and rows scanned per second.
+    """
+    read_rows, columns = SOURCES[source]
+    started = time.perf_counter()
+    scanned = written = 0
+    f, close = _open_output(output, compress)
+    try:
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+
+        chunk = []
+        for row in read_rows():
+            scanned += 1
+            if not _matches(row, since, until, payment_method):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                written += _write_chunk(f, writer, chunk)
+                chunk = []
+        written += _write_chunk(f, writer, chunk)
+    finally:
+        if close:
+            f.close()
+
+    seconds = time.perf_counter() - started
+    return {
+        "scanned": scanned,
+        "written": written,
+        "seconds": round(seconds, 3),
+        "rowsPerSecond": round(scanned / seconds) if seconds else scanned,
+    }
+
+
+def _write_chunk(f, writer, rows):
+    if writer is not None:
+        writer.writerows(rows)
+    else:
+        f.write("".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows))
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export receipts or orders for finance.")
+    parser.add_argument("source", choices=sorted(SOURCES))
+    parser.add_argument("-o", "--output", help="output file (default: standard output)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--since", help="earliest date or timestamp, e.g. 2025-06-01")
+    parser.add_argument("--until", help="latest date or timestamp, inclusive")
+    parser.add_argument("--payment-method", help="only this payment method, e.g. DEBIT_CARD")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output file")
+    args = parser.parse_args(argv)
+
+    report = export(
+        args.source, args.output, args.format, args.since, args.until,
+        args.payment_method, args.gzip
+    )
+    # Keep the report off standard output, which may be carrying the export
+    print(f"Exported {report['written']} of {report['scanned']} rows in {report['seconds']}s "
+          f"({report['rowsPerSecond']} rows/sec)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# utils/file_lock.py
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Re-entrant advisory lock shared by threads and processes.
+
+    The lock is held on a sidecar '<path>.lock' file so the data file itself
+    can still be replaced atomically while the lock is held.
+    """
+
+    def __init__(self, file_path):
+        self.lock_path = f"{file_path}.lock"
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._handle = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._handle = open(self.lock_path, "a+")
+                if fcntl:
+                    fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            self._handle.seek(0)
+                            msvcrt.locking(self._handle.fileno(), msvcrt.LK_NBLCK, 1)
+                            break
+                        except OSError:
+                            time.sleep(0.01)
+            except Exception:
+                if self._handle:
+                    self._handle.close()
+                    self._handle = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if fcntl:
+                    fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+                else:
+                    self._handle.seek(0)
+                    msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+            finally:
+                self._handle.close()
+                self._handle = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
@@ -0,0 +1,107 @@
+# utils/json_store.py
+import json
+import os
+import threading
+from utils.file_lock import FileLock
+
+
+class CorruptStoreError(Exception):
+    """Raised when a data file exists but can't be parsed."""
+
+
+class JsonStore:
+    """A JSON data file cached in memory and written atomically.
+
+    The cached copy is reused until the file changes on disk, so repeated
+    reads within a process cost an os.stat instead of a full parse. Writes
+    go to a temporary file that replaces the original, so a crash never
+    leaves a half-written store behind. A file that exists but can't be
+    parsed raises CorruptStoreError rather than reading as empty, so an
+    update() never overwrites it with just the new records.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, file_path, default_factory=list, indent=4):
+        self.file_path = file_path
+        self.default_factory = default_factory
+        self.indent = indent
+        self.lock = FileLock(file_path)
+        self._data = None
+        self._signature = None
+
+    @classmethod
+    def get(cls, file_path, default_factory=list, indent=4):
+        """Return the process-wide store for a file"""
+        with cls._instances_lock:
+            if file_path not in cls._instances:
+                cls._instances[file_path] = cls(file_path, default_factory, indent)
+            return cls._instances[file_path]
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+        """Return the store contents, re-reading the file only if it changed.
+
+        The returned object is the cached copy; callers that modify it must
+        call save() (or use update()) so the cache and the file agree.
+
+        Raises:
+            CorruptStoreError: The file exists but isn't valid JSON.
+        """
+        with self.lock:
+            signature = self._file_signature()
+            if self._data is None or signature != self._signature:
+                data = self.default_factory()
+                if signature is not None:
+                    try:
+                        with open(self.file_path, "r") as f:
+                            data = json.load(f)
+                    except json.JSONDecodeError as e:
+                        raise CorruptStoreError(f"{self.file_path} is not valid JSON: {e}") from e
+                self._data = data
+                self._signature = signature
+            return self._data
+
+    def save(self, data):
+        """Atomically replace the file with data"""
+        with self.lock:
+            tmp_file = f"{self.file_path}.{os.getpid()}.tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(data, f, indent=self.indent)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.file_path)
+            self._data = data
+            self._signature = self._file_signature()
+            return True
+
+    def update(self, mutate):
+        """Load, modify and save the store under its file lock.
+
+        If mutate or the save fails, the cached copy is dropped so the next
+        load() reads the file again.
+
+        Args:
+            mutate (callable): Receives the data and modifies it in place.
+
+        Returns:
+            Whatever mutate returns.
+        """
+        with self.lock:
+            data = self.load()
+            try:
+                result = mutate(data)
+                self.save(data)
+            except BaseException:
+                # The cached copy may hold changes that never reached the file
+                self._data = None
+                self._signature = None
+                raise
+            return result
@@ -0,0 +1,142 @@
+# utils/json_stream.py
+import json
+import re
+
+CHUNK_SIZE = 1 << 16
+_WHITESPACE = " \t\r\n"
+_NUMBER_START = "-0123456789"
+_NUMBER_END = re.compile(r"[\s,\]}]")
+_STRUCTURE = re.compile(r'[\[\]{}"]')
+_STRING_END = re.compile(r'["\\]')
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """A growing text buffer over a file that values are decoded from."""
+
+    def __init__(self, f, chunk_size):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, grow=False):
+        if self._eof:
+            return False
+        # While one value spans several reads, read as much again as is buffered,
+        # so the buffer grows geometrically and is copied O(log n) times
+        size = max(self._chunk_size, len(self._buffer) - self._pos) if grow else self._chunk_size
+        chunk = self._f.read(size)
+        if not chunk:
+            self._eof = True
+            return False
+        # Drop what was already consumed so the buffer only holds one value
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ('' at EOF)"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self._buffer, self._pos)
+        self._pos += 1
+
+    def _container_end(self):
+        """Read until the array or object at the read position is complete.
+
+        The scan resumes where the previous read left off, so each character
+        is looked at once however many reads the value spans.
+        """
+        depth = 0
+        offset = 0  # scanned so far, relative to the read position
+        in_string = False
+        while True:
+            pattern = _STRING_END if in_string else _STRUCTURE
+            match = pattern.search(self._buffer, self._pos + offset)
+            if match is None or (match.group() == "\\" and match.end() == len(self._buffer)):
+                # Need more input (an escape at the end needs the character after it)
+                offset = (len(self._buffer) if match is None else match.start()) - self._pos
+                if not self._fill(grow=True):
+                    raise json.JSONDecodeError("Unterminated value", self._buffer, self._pos)
+                continue
+            char = match.group()
+            offset = match.end() - self._pos
+            if in_string:
+                if char == "\\":
+                    offset += 1
+                else:
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def value(self):
+        """Decode the next JSON value, reading more of the file until it is complete"""
+        first = self.peek()
+        if first and first in "[{":
+            # Find where it ends first, so it is decoded once rather than after every read
+            self._container_end()
+        elif first and first in _NUMBER_START:
+            # A number cut off by the chunk boundary would still decode; read to its end first
+            while not _NUMBER_END.search(self._buffer, self._pos) and self._fill():
+                pass
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            self._pos = end
+            return value
+
+
+def iter_items(file_path, chunk_size=CHUNK_SIZE):
+    """Yield the members of a top-level JSON array or object one at a time.
+
+    Only the member being decoded is held in memory, so a large data file
+    can be scanned without loading all of it.
+
+    Args:
+        file_path (str): JSON file whose top level is an array or an object
+        chunk_size (int): Characters read from the file at a time
+
+    Yields:
+        Each element of an array, or (key, value) pairs of an object.
+    """
+    with open(file_path, "r") as f:
+        reader = _Reader(f, chunk_size)
+        opening = reader.peek()
+        if opening not in ("[", "{"):
+            raise ValueError(f"{file_path} does not hold a JSON array or object")
+        closing = "]" if opening == "[" else "}"
+        reader.expect(opening)
+        if reader.peek() == closing:
+            return
+        while True:
+            if opening == "{":
+                key = reader.value()
+                reader.expect(":")
+                yield key, reader.value()
+            else:
+                yield reader.value()
+            if reader.peek() == ",":
+                reader.expect(",")
+                continue
+            reader.expect(closing)
+            return
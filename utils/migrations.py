@@ -0,0 +1,291 @@
+# utils/migrations.py
+"""One-off data migrations.
+
+Run from the project root, for example:
+
+    python -m utils.migrations normalize-bookings --dry-run
+    python -m utils.migrations import-receipts
+    python -m utils.migrations compact-reschedules
+    python -m utils.migrations normalize-times --dry-run
+
+Run them while the application is stopped. normalize-bookings reads and
+rewrites both receipts.json and receipts.jsonl, so it gives the same
+result before or after import-receipts.
+"""
+import argparse
+import json
+import os
+from utils.json_store import JsonStore
+from utils import service_time
+
+CANCELLED = "Cancelled"
+
+
+def _merge_booking(kept, other):
+    """Combine two copies of one booking; a cancellation wins over any other status"""
+    merged = dict(other, **kept)
+    if other.get("bookingStatus") == CANCELLED:
+        merged["bookingStatus"] = CANCELLED
+    return merged
+
+
+def _read_receipt_log(log_file):
+    """Return every complete record of a receipt log, oldest first"""
+    if not os.path.exists(log_file):
+        return []
+    with open(log_file, "rb") as f:
+        return [json.loads(line) for line in f if line.endswith(b"\n")]
+
+
+def _rewrite_receipt_log(log_file, receipts):
+    """Replace a receipt log; its sidecar index is dropped and rebuilt from the log on next use"""
+    index_file = f"{os.path.splitext(log_file)[0]}.idx"
+    tmp_file = f"{log_file}.tmp"
+    with open(tmp_file, "wb") as f:
+        for receipt in receipts:
+            f.write((json.dumps(receipt, separators=(",", ":")) + "\n").encode())
+        f.flush()
+        os.fsync(f.fileno())
+    # Index first: a stale index over the new log would point at the wrong records
+    if os.path.exists(index_file):
+        os.remove(index_file)
+    os.replace(tmp_file, log_file)
+
+
+def normalize_bookings(data_dir="data", dry_run=False):
+    """Keep one copy of every trip booking, in tripbookings.json.
+
+    Orders and receipts - in receipts.json and in the receipts.jsonl log
+    alike - have their embedded 'trip_bookings' replaced by a
+    'trip_booking_ids' list. When copies disagree, the order's copy is
+    preferred over the booking store's, and the receipt's is only used if
+    no other copy exists; a Cancelled status in any copy is kept.
+
+    Returns:
+        dict: Counts and file sizes before and after.
+    """
+    paths = {name: os.path.join(data_dir, f"{name}.json") for name in ("orders", "tripbookings", "receipts")}
+    orders_store = JsonStore(paths["orders"], dict, 4)
+    tripbookings_store = JsonStore(paths["tripbookings"], dict, 4)
+    receipts_store = JsonStore(paths["receipts"], list, 4)
+    orders = orders_store.load()
+    tripbookings = tripbookings_store.load()
+    receipts = receipts_store.load()
+    log_file = os.path.join(data_dir, "receipts.jsonl")
+    logged = _read_receipt_log(log_file)
+    log_changed = any("trip_bookings" in receipt for receipt in logged)
+
+    sizes_before = {name: os.path.getsize(path) for name, path in paths.items() if os.path.exists(path)}
+    if os.path.exists(log_file):
+        sizes_before["receiptLog"] = os.path.getsize(log_file)
+
+    # booking ID -> (user ID, canonical copy), in first-seen order per user
+    canonical = {}
+    for user_id, bookings in tripbookings.items():
+        for booking in bookings:
+            canonical[booking["tripBookingId"]] = (user_id, booking)
+
+    embedded = 0
+    for user_id, user_data in orders.items():
+        for order in user_data.get("orders", []):
+            for booking in order.get("trip_bookings", []):
+                embedded += 1
+                booking_id = booking["tripBookingId"]
+                if booking_id in canonical:
+                    canonical[booking_id] = (canonical[booking_id][0], _merge_booking(booking, canonical[booking_id][1]))
+                else:
+                    canonical[booking_id] = (user_id, booking)
+
+    # Receipts imported into the log are newer copies of the same receipts
+    for receipt in receipts + logged:
+        for booking in receipt.get("trip_bookings", []):
+            embedded += 1
+            booking_id = booking["tripBookingId"]
+            if booking_id in canonical:
+                canonical[booking_id] = (canonical[booking_id][0], _merge_booking(canonical[booking_id][1], booking))
+            else:
+                canonical[booking_id] = (receipt.get("user_id") or booking.get("userId"), booking)
+
+    normalized_bookings = {}
+    for user_id, booking in canonical.values():
+        normalized_bookings.setdefault(user_id, []).append(booking)
+
+    for user_data in orders.values():
+        for order in user_data.get("orders", []):
+            if "trip_bookings" in order:
+                order["trip_booking_ids"] = [b["tripBookingId"] for b in order.pop("trip_bookings")]
+    for receipt in receipts + logged:
+        if "trip_bookings" in receipt:
+            receipt["trip_booking_ids"] = [b["tripBookingId"] for b in receipt.pop("trip_bookings")]
+
+    report = {
+        "bookings": len(canonical),
+        "embeddedCopiesRemoved": embedded,
+        "bytesBefore": sum(sizes_before.values()),
+    }
+    if dry_run:
+        report["bytesAfter"] = sum(
+            len(json.dumps(data, indent=4))
+            for data in (orders, normalized_bookings, receipts)
+        ) + sum(len(json.dumps(r, separators=(",", ":"))) + 1 for r in logged)
+        return report
+
+    # The booking store goes first so no order ever points at a missing booking
+    tripbookings_store.save(normalized_bookings)
+    orders_store.save(orders)
+    receipts_store.save(receipts)
+    if log_changed:
+        _rewrite_receipt_log(log_file, logged)
+    report["bytesAfter"] = sum(os.path.getsize(path) for path in paths.values())
+    if os.path.exists(log_file):
+        report["bytesAfter"] += os.path.getsize(log_file)
+    return report
+
+
+def import_receipts(data_dir="data", dry_run=False):
+    """Move receipts from receipts.json into the receipt log.
+
+    Receipts already in the log are skipped, so the import can be re-run.
+    Afterwards receipts.json is renamed to receipts.json.imported, which
+    stops the receipt store from falling back to it.
+
+    Returns:
+        dict: Counts and file sizes before and after.
+    """
+    from models.ReceiptStore import ReceiptStore
+
+    legacy_file = os.path.join(data_dir, "receipts.json")
+    log_file = os.path.join(data_dir, "receipts.jsonl")
+    receipts = JsonStore(legacy_file, list, 4).load()
+    report = {
+        "receipts": len(receipts),
+        "bytesBefore": os.path.getsize(legacy_file) if os.path.exists(legacy_file) else 0,
+    }
+    if dry_run:
+        report["bytesAfter"] = sum(len(json.dumps(r, separators=(",", ":"))) + 1 for r in receipts)
+        return report
+
+    store = ReceiptStore(log_file, legacy_file)
+    report["imported"] = sum(1 for receipt in receipts if store.append(receipt))
+    if os.path.exists(legacy_file):
+        os.replace(legacy_file, f"{legacy_file}.imported")
+    report["bytesAfter"] = os.path.getsize(log_file) if os.path.exists(log_file) else 0
+    return report
+
+
+def compact_reschedules(data_dir="data", dry_run=False):
+    """Keep only the schedule in force for each rescheduled trip and service date.
+
+    Entries are rewritten with camelCase keys and ISO times, so rows saved
+    in the older formats are normalized as well.
+
+    Returns:
+        dict: Entries before and after.
+    """
+    from models.RescheduleStore import RescheduleStore
+
+    reschedules_file = os.path.join(data_dir, "reschedules.json")
+    rows = JsonStore(reschedules_file, list, 4).load()
+    report = {"entriesBefore": len(rows)}
+    if dry_run:
+        store = RescheduleStore(reschedules_file)
+        report["entriesAfter"] = len(store.for_dates("", "9999-12-31"))
+        return report
+
+    removed = RescheduleStore(reschedules_file).compact()
+    report["entriesAfter"] = len(rows) - removed
+    return report
+
+
+TRIP_TIME_FIELDS = ("tripDepartureTime", "originalDeparture", "tripArrivalTime", "tripRescheduleTime")
+
+
+def _normalize_time(record, field, service_date, report):
+    value = record.get(field)
+    if not value:
+        return
+    normalized = service_time.normalize(value, service_date)
+    if normalized is None:
+        report["leftAsIs"] += 1
+    elif normalized != value:
+        if len(value) == 5:
+            report["dated"] += 1
+        record[field] = normalized
+        report["changed"] += 1
+
+
+def normalize_times(data_dir="data", dry_run=False):
+    """Store every trip, reschedule and booking time as 'YYYY-MM-DDTHH:MM:SS'.
+
+    'YYYY-MM-DD HH:MM' values are rewritten in full. Bookings saved with a
+    bare 'HH:MM' departure are dated by the day their order was placed,
+    the day the old code read them against; a booking whose order can't
+    be found is left as it is. The 'HH:MM' departures of the timetable in
+    trips.json are times of day, not moments, and are kept.
+
+    Returns:
+        dict: Times changed, bare times given a date, times left as they were
+        (unreadable or undatable), and reschedule rows rewritten in the current format.
+    """
+    from models.RescheduleStore import normalize_entry
+
+    stores = {
+        "trips": JsonStore(os.path.join(data_dir, "trips.json"), list, 2),
+        "reschedules": JsonStore(os.path.join(data_dir, "reschedules.json"), list, 4),
+        "orders": JsonStore(os.path.join(data_dir, "orders.json"), dict, 4),
+        "tripbookings": JsonStore(os.path.join(data_dir, "tripbookings.json"), dict, 4),
+    }
+    data = {name: store.load() for name, store in stores.items()}
+    report = {"changed": 0, "dated": 0, "leftAsIs": 0}
+
+    for trip in data["trips"]:
+        for field in TRIP_TIME_FIELDS:
+            _normalize_time(trip, field, None, report)
+
+    reschedules = [normalize_entry(row) for row in data["reschedules"]]
+    report["reschedulesRewritten"] = sum(1 for old, new in zip(data["reschedules"], reschedules) if old != new)
+    data["reschedules"][:] = reschedules
+
+    order_dates = {}
+    for user_data in data["orders"].values():
+        for order in user_data.get("orders", []):
+            order_date = (order.get("timestamp") or "")[:10] or None
+            order_dates[order.get("order_id")] = order_date
+            for booking in order.get("trip_bookings", []):
+                _normalize_time(booking, "departureTime", order_date, report)
+    for bookings in data["tripbookings"].values():
+        for booking in bookings:
+            _normalize_time(booking, "departureTime", order_dates.get(booking.get("orderId")), report)
+
+    if not dry_run:
+        for name, store in stores.items():
+            store.save(data[name])
+    return report
+
+
+MIGRATIONS = {
+    "normalize-bookings": normalize_bookings,
+    "import-receipts": import_receipts,
+    "compact-reschedules": compact_reschedules,
+    "normalize-times": normalize_times,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run a data migration.",
+        epilog="Run migrations while the application is stopped. normalize-bookings handles both "
+               "receipts.json and receipts.jsonl, so it may run before or after import-receipts."
+    )
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    parser.add_argument("--data-dir", default="data", help="directory holding the JSON data files")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args(argv)
+
+    report = MIGRATIONS[args.migration](data_dir=args.data_dir, dry_run=args.dry_run)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+# utils/reconcile.py
+"""Cross-check orders against receipts and trip bookings.
+
+Run from the project root, for example:
+
+    python -m utils.reconcile
+    python -m utils.reconcile --repair
+
+Receipts are hashed on order_id and orders are streamed past them, so the
+job is linear in the number of records. When the receipt log is too big to
+hash in memory, both sides are first split into partitions by order_id on
+disk and joined one partition at a time.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import uuid
+import zlib
+from datetime import datetime
+from utils.json_stream import iter_items
+
+ORDERS_FILE = "data/orders.json"
+PARTITION_BYTES = 64 * 1024 * 1024  # receipt bytes hashed per partition
+REPAIR_BATCH = 500
+SAMPLE_SIZE = 20
+AMOUNT_TOLERANCE = 0.005
+
+REFUNDED_STATUSES = ("Refunded", "Refund_Requested")
+# order status -> payment status of a reissued receipt; any other status was paid
+PAYMENT_STATUSES = {"Pending": "PENDING", "Refunded": "REFUNDED", "Refund_Requested": "REFUND_REQUESTED"}
+CANCELLED = "Cancelled"
+ISSUES = ("missingReceipts", "orphanReceipts", "amountMismatches", "paymentMethodMismatches", "bookingDrift")
+
+
+def _receipt_rows():
+    """Yield (order_id, receipt projection); later receipts of an order supersede earlier ones"""
+    from models.ReceiptStore import ReceiptStore
+
+    for receipt in ReceiptStore.shared().iter_receipts():
+        yield receipt["order_id"], {
+            "receipt_id": receipt["receipt_id"],
+            "final_amount": receipt.get("final_amount"),
+            "payment_method": receipt.get("payment_method"),
+        }
+
+
+def _order_rows(orders_file):
+    for user_id, user_data in iter_items(orders_file):
+        for order in user_data.get("orders", []):
+            if order.get("order_id"):
+                yield order["order_id"], dict(order, user_id=order.get("user_id") or user_id)
+
+
+def _partition(rows, partitions, work_dir, side):
+    """Spread (key, value) rows over partition files by a stable hash of the key"""
+    paths = [os.path.join(work_dir, f"{side}-{p}.jsonl") for p in range(partitions)]
+    files = [open(path, "w") for path in paths]
+    try:
+        for key, value in rows:
+            files[zlib.crc32(key.encode()) % partitions].write(json.dumps([key, value]) + "\n")
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+
+def _read_partition(path):
+    with open(path) as f:
+        for line in f:
+            key, value = json.loads(line)
+            yield key, value
+
+
+class Reconciler:
+    """Hash join of receipts and orders that records issues and stages repairs."""
+
+    def __init__(self, repair=False, sample_size=SAMPLE_SIZE):
+        from models.BookingStore import BookingStore
+
+        self.repair = repair
+        self.sample_size = sample_size
+        self._bookings = BookingStore.shared()
+        self._unit_of_work = None
+        self._staged = 0
+        self.report = {"orders": 0, "receipts": 0, "repaired": 0}
+        self.report.update({issue: 0 for issue in ISSUES})
+        self.samples = {issue: [] for issue in ISSUES}
+
+    def _record(self, issue, sample):
+        self.report[issue] += 1
+        if len(self.samples[issue]) < self.sample_size:
+            self.samples[issue].append(sample)
+
+    def join(self, receipt_rows, order_rows):
+        """Match one set of receipts (hashed) with the orders streamed past them"""
+        receipts = {}
+        for order_id, receipt in receipt_rows:
+            self.report["receipts"] += 1
+            receipts[order_id] = receipt
+
+        for order_id, order in order_rows:
+            self.report["orders"] += 1
+            receipt = receipts.pop(order_id, None)
+            self._check_order(order, receipt)
+
+        for order_id, receipt in receipts.items():
+            self._record("orphanReceipts", {"order_id": order_id, "receipt_id": receipt["receipt_id"]})
+
+    def _check_order(self, order, receipt):
+        order_id = order["order_id"]
+        if receipt is None:
+            self._record("missingReceipts", {"order_id": order_id, "user_id": order["user_id"]})
+            self._stage_receipt(order, None)
+        else:
+            amount_off = abs(float(order.get("final_amount") or 0) - float(receipt["final_amount"] or 0)) > AMOUNT_TOLERANCE
+            method_off = order.get("payment_method") != receipt["payment_method"]
+            if amount_off:
+                self._record("amountMismatches", {
+                    "order_id": order_id, "order": order.get("final_amount"), "receipt": receipt["final_amount"]
+                })
+            if method_off:
+                self._record("paymentMethodMismatches", {
+                    "order_id": order_id, "order": order.get("payment_method"), "receipt": receipt["payment_method"]
+                })
+            if amount_off or method_off:
+                self._stage_receipt(order, receipt["receipt_id"])
+        self._check_bookings(order)
+
+    def _check_bookings(self, order):
+        # Copies embedded in older orders may disagree with the booking store
+        embedded = {b["tripBookingId"]: b.get("bookingStatus") for b in order.get("trip_bookings", [])}
+        booking_ids = order.get("trip_booking_ids") or list(embedded)
+        for booking_id in booking_ids:
+            stored = self._bookings.get(booking_id)
+            stored_status = stored.get("bookingStatus") if stored else None
+            statuses = {stored_status, embedded.get(booking_id, stored_status)}
+            cancelled = CANCELLED in statuses or order.get("status") in REFUNDED_STATUSES
+            if len(statuses) > 1 or (cancelled and stored_status != CANCELLED):
+                self._record("bookingDrift", {
+                    "order_id": order["order_id"], "tripBookingId": booking_id,
+                    "orderStatus": order.get("status"), "bookingStatuses": sorted(s or "missing" for s in statuses)
+                })
+                if cancelled:
+                    # A cancellation recorded anywhere wins, as in the booking migration
+                    self._stage_cancellation(order, booking_id)
+
+    def _stage(self, store, op, payload):
+        from models.UnitOfWork import UnitOfWork
+
+        if self._unit_of_work is None:
+            self._unit_of_work = UnitOfWork()
+        self._unit_of_work.stage(store, op, payload)
+
+    def _staged_one(self):
+        self._staged += 1
+        self.report["repaired"] += 1
+        if self._staged >= REPAIR_BATCH:
+            self.flush()
+
+    def _stage_receipt(self, order, superseded_id):
+        if not self.repair:
+            return
+        receipt = _receipt_from_order(order)
+        if superseded_id:
+            receipt["supersedes"] = superseded_id
+        self._stage("receipts", "append", receipt)
+        self._staged_one()
+
+    def _stage_cancellation(self, order, booking_id):
+        if not self.repair:
+            return
+        self._stage("orders", "set_booking_status", {
+            "userId": order["user_id"],
+            "orderId": order["order_id"],
+            "tripBookingId": booking_id,
+            "status": order.get("status"),
+            "bookingStatus": CANCELLED
+        })
+        self._stage("tripbookings", "set_status", {
+            "userId": order["user_id"],
+            "tripBookingId": booking_id,
+            "bookingStatus": CANCELLED
+        })
+        self._staged_one()
+
+    def flush(self):
+        """Commit the repairs staged so far"""
+        if self._unit_of_work is not None:
+            self._unit_of_work.commit()
+        self._unit_of_work = None
+        self._staged = 0
+
+
+def _receipt_from_order(order):
+    """Build the receipt an order should have, keyed so a re-run reissues the same one"""
+    from models.BookingStore import resolve_trip_bookings
+
+    key = f"reconcile:{order['order_id']}:{order.get('final_amount')}:{order.get('payment_method')}"
+    items = [
+        {"type": "merchandise", "description": name, "quantity": quantity, "price": price, "total": quantity * price}
+        for name, quantity, price in order.get("items", [])
+    ]
+    bookings = resolve_trip_bookings(order)
+    items.extend(
+        {
+            "type": "trip",
+            "description": f"Trip from {b['fromStationId']} to {b['toStationId']}",
+            "quantity": b.get("ticketCount"),
+            "price": b.get("fare"),
+            "total": b.get("totalFare")
+        }
+        for b in bookings
+    )
+    return {
+        "receipt_id": str(uuid.uuid5(uuid.NAMESPACE_URL, key)),
+        "order_id": order["order_id"],
+        "user_id": order["user_id"],
+        "timestamp": datetime.now().isoformat(),
+        "items": items,
+        "trip_booking_ids": [b["tripBookingId"] for b in bookings],
+        "total_amount": order.get("total"),
+        "final_amount": order.get("final_amount"),
+        "payment_method": order.get("payment_method"),
+        "payment_status": PAYMENT_STATUSES.get(order.get("status"), "PAID"),
+        "order_status": order.get("status"),
+        "points_redeemed": order.get("points_redeemed", 0),
+        "reconciled": True
+    }
+
+
+def reconcile(orders_file=ORDERS_FILE, repair=False, partitions=None):
+    """Report (and optionally repair) disagreements between orders, receipts and bookings.
+
+    Args:
+        orders_file (str): Orders to check
+        repair (bool): Reissue missing or wrong receipts and apply recorded cancellations
+        partitions (int, optional): Number of on-disk partitions; sized from the receipt log and
+            any receipts.json not yet imported into it if omitted
+
+    Returns:
+        tuple: (report dict of counts, dict of sample records per issue)
+    """
+    from models.ReceiptStore import ReceiptStore
+
+    if partitions is None:
+        store = ReceiptStore.shared()
+        receipts_size = sum(
+            os.path.getsize(path) for path in (store.log_file, store.legacy_file) if os.path.exists(path)
+        )
+        partitions = max(1, -(-receipts_size // PARTITION_BYTES))
+
+    reconciler = Reconciler(repair)
+    if partitions == 1:
+        reconciler.join(_receipt_rows(), _order_rows(orders_file))
+    else:
+        work_dir = tempfile.mkdtemp(prefix="reconcile-")
+        try:
+            receipt_parts = _partition(_receipt_rows(), partitions, work_dir, "receipts")
+            order_parts = _partition(_order_rows(orders_file), partitions, work_dir, "orders")
+            for receipt_part, order_part in zip(receipt_parts, order_parts):
+                reconciler.join(_read_partition(receipt_part), _read_partition(order_part))
+        finally:
+            shutil.rmtree(work_dir)
+    reconciler.flush()
+    reconciler.report["partitions"] = partitions
+    return reconciler.report, reconciler.samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile orders with receipts and trip bookings.")
+    parser.add_argument("--repair", action="store_true", help="reissue receipts and apply recorded cancellations")
+    parser.add_argument("--partitions", type=int, help="split the join into this many on-disk partitions")
+    parser.add_argument("--samples", action="store_true", help="print example records for each issue")
+    args = parser.parse_args(argv)
+
+    report, samples = reconcile(repair=args.repair, partitions=args.partitions)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    if args.samples:
+        for issue, records in samples.items():
+            for record in records:
+                print(f"{issue}: {json.dumps(record)}")
+
+
+if __name__ == "__main__":
+    main()
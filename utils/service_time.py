@@ -0,0 +1,156 @@
+# utils/service_time.py
+"""Trip times as whole minutes since 1970-01-01 00:00 local time.
+
+Data files hold times as 'YYYY-MM-DDTHH:MM:SS'; older rows may still use
+'YYYY-MM-DD HH:MM' or a bare 'HH:MM' until
+'python -m utils.migrations normalize-times' has been run. parse() reads
+any of them once, where a record is loaded, and the rest of the code
+compares and adds plain integers. A bare 'HH:MM' has no date of its own
+and is only read against the service date it belongs to.
+
+The same few hundred strings ('08:00', '08:10', ...) and minutes come up
+again and again, so parse(), day_start() and the format_*() functions
+remember their recent results in bounded LRU caches. cache_stats() reports
+how often each was answered from its cache.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+MINUTES_PER_DAY = 24 * 60
+PARSE_CACHE_SIZE = 4096    # distinct (value, service date) pairs remembered
+FORMAT_CACHE_SIZE = 4096   # distinct minutes remembered per display format
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _day_start(service_date):
+    """Return the minute a 'YYYY-MM-DD' service date begins"""
+    return (date(int(service_date[:4]), int(service_date[5:7]), int(service_date[8:10])).toordinal()
+            - _EPOCH_ORDINAL) * MINUTES_PER_DAY
+
+
+def _parse(value, service_date=None):
+    """Return a time as epoch minutes, or None if it can't be read.
+
+    Args:
+        value (str): 'YYYY-MM-DDTHH:MM[:SS]', 'YYYY-MM-DD HH:MM[:SS]' or 'HH:MM'
+        service_date (str, optional): 'YYYY-MM-DD' a bare 'HH:MM' falls on
+    """
+    if not value:
+        return None
+    try:
+        if len(value) >= 16 and value[4] == "-" and value[10] in "T ":
+            day, clock = day_start(value[:10]), value[11:16]
+        elif len(value) == 5 and service_date:
+            day, clock = day_start(service_date), value
+        else:
+            return None
+        hours, minutes = int(clock[:2]), int(clock[3:])
+    except ValueError:
+        return None
+    if clock[2] != ":" or not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return day + hours * 60 + minutes
+
+
+def to_datetime(minutes):
+    """Return epoch minutes as a datetime"""
+    days, minute_of_day = divmod(minutes, MINUTES_PER_DAY)
+    day = date.fromordinal(days + _EPOCH_ORDINAL)
+    return datetime(day.year, day.month, day.day, minute_of_day // 60, minute_of_day % 60)
+
+
+def from_datetime(moment):
+    """Return a datetime as epoch minutes, dropping seconds"""
+    return (moment.toordinal() - _EPOCH_ORDINAL) * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+def now():
+    """Return the current time as epoch minutes"""
+    return from_datetime(datetime.now())
+
+
+def today():
+    """Return today's service date as 'YYYY-MM-DD'"""
+    return date.today().isoformat()
+
+
+def service_date(minutes):
+    """Return the 'YYYY-MM-DD' date a time falls on"""
+    return date.fromordinal(minutes // MINUTES_PER_DAY + _EPOCH_ORDINAL).isoformat()
+
+
+def minute_of_day(minutes):
+    """Return minutes since midnight of the day a time falls on"""
+    return minutes % MINUTES_PER_DAY
+
+
+def _format_iso(minutes):
+    """Return a time as 'YYYY-MM-DDTHH:MM:SS', the form it is stored in"""
+    return None if minutes is None else to_datetime(minutes).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _format_display(minutes):
+    """Return a time as 'YYYY-MM-DD HH:MM'"""
+    return "N/A" if minutes is None else to_datetime(minutes).strftime("%Y-%m-%d %H:%M")
+
+
+def _format_clock(minutes):
+    """Return a time as 'HH:MM'"""
+    minute = minutes % MINUTES_PER_DAY
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def normalize(value, service_date=None):
+    """Return a stored time in the canonical 'YYYY-MM-DDTHH:MM:SS' form, or None"""
+    return format_iso(parse(value, service_date))
+
+
+def overlaps(start, end, other_start, other_end, buffer=0):
+    """Return True if [start, end) comes within buffer minutes of [other_start, other_end)"""
+    return start < other_end + buffer and end > other_start - buffer
+
+
+_CACHED = {}
+
+
+def configure(parse_cache_size=PARSE_CACHE_SIZE, format_cache_size=FORMAT_CACHE_SIZE):
+    """Set the cache sizes, starting with empty caches; a size of 0 turns caching off.
+
+    Callers use the functions through the module (service_time.parse),
+    so they pick up the new caches straight away.
+    """
+    global day_start, parse, format_iso, format_display, format_clock
+    day_start = lru_cache(maxsize=parse_cache_size)(_day_start)
+    parse = lru_cache(maxsize=parse_cache_size)(_parse)
+    format_iso = lru_cache(maxsize=format_cache_size)(_format_iso)
+    format_display = lru_cache(maxsize=format_cache_size)(_format_display)
+    format_clock = lru_cache(maxsize=format_cache_size)(_format_clock)
+    _CACHED.update(
+        day_start=day_start, parse=parse, format_iso=format_iso,
+        format_display=format_display, format_clock=format_clock
+    )
+
+
+def cache_stats():
+    """Return hits, misses, hit rate and size of each cache, by function name"""
+    stats = {}
+    for name, cached in _CACHED.items():
+        info = cached.cache_info()
+        lookups = info.hits + info.misses
+        stats[name] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "hitRate": round(info.hits / lookups, 3) if lookups else 0.0,
+            "size": info.currsize,
+            "maxSize": info.maxsize
+        }
+    return stats
+
+
+def clear_caches():
+    """Empty every cache and reset its statistics"""
+    for cached in _CACHED.values():
+        cached.cache_clear()
+
+
+configure()
@@ -0,0 +1,70 @@
+# utils/timer_wheel.py
+import math
+import threading
+import time
+
+
+class TimerWheel:
+    """A hashed timing wheel for many short-lived deadlines.
+
+    Each deadline is rounded up to a tick and dropped in slot
+    tick % slots, so scheduling and cancelling are O(1). advance() visits
+    only the slots for the ticks that have passed since the last call and
+    returns the keys whose deadline has arrived.
+    """
+
+    def __init__(self, tick_seconds=1.0, slots=512, clock=time.time):
+        self.tick_seconds = tick_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._slots = [{} for _ in range(slots)]
+        self._slot_of = {}
+        self._current_tick = self._tick(clock())
+
+    def _tick(self, timestamp):
+        return math.ceil(timestamp / self.tick_seconds)
+
+    def schedule(self, key, deadline):
+        """Schedule key to expire at the epoch time deadline, replacing any earlier schedule"""
+        with self._lock:
+            self._remove(key)
+            tick = max(self._tick(deadline), self._current_tick + 1)
+            slot = tick % len(self._slots)
+            self._slots[slot][key] = tick
+            self._slot_of[key] = slot
+
+    def cancel(self, key):
+        """Forget a key; returns True if it was scheduled"""
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key):
+        slot = self._slot_of.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+
+    def advance(self, now=None):
+        """Move the wheel to now and return the keys that expired"""
+        now_tick = self._tick(self._clock() if now is None else now)
+        expired = []
+        with self._lock:
+            if now_tick <= self._current_tick:
+                return expired
+            # After a long pause one full turn covers every slot
+            ticks = range(self._current_tick + 1, now_tick + 1)
+            if len(ticks) > len(self._slots):
+                ticks = range(now_tick - len(self._slots) + 1, now_tick + 1)
+            for tick in ticks:
+                slot = self._slots[tick % len(self._slots)]
+                due = [key for key, key_tick in slot.items() if key_tick <= now_tick]
+                for key in due:
+                    del slot[key]
+                    del self._slot_of[key]
+                expired.extend(due)
+            self._current_tick = now_tick
+        return expired
+
+    def __len__(self):
+        return len(self._slot_of)